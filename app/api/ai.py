@@ -1,7 +1,12 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import List
+import json
 from ..db import database, schemas
 from ..services.ml_service import weather_service
 from ..services.genai_service import genai_service
+from ..services.executors import ml_executor
+from ..services.weather_features import CONTEXT_FEATURES, load_context
 from datetime import datetime
 
 router = APIRouter(
@@ -9,28 +14,109 @@ router = APIRouter(
     tags=["AI Services"]
 )
 
+# Location joined with its row in the latest_readings projection
+LATEST_STATE_QUERY = """
+    SELECT l.name, r.* FROM locations l
+    LEFT JOIN latest_readings r ON r.location_id = l.id
+    WHERE l.id = ?
+"""
+
+# Model inputs from the latest_readings projection
+LATEST_FEATURES_QUERY = "SELECT aqi, pm25 FROM latest_readings WHERE location_id = ? AND record_id IS NOT NULL"
+
+def _batch_features_query(location_ids=None):
+    """Latest complete readings of every location, or of just `location_ids`."""
+    query = "SELECT location_id, aqi, pm25 FROM latest_readings WHERE record_id IS NOT NULL AND aqi IS NOT NULL AND pm25 IS NOT NULL"
+    if location_ids is None:
+        return query, ()
+    return query + f" AND location_id IN ({', '.join('?' for _ in location_ids)})", tuple(location_ids)
+
+def _event_stream(meta: dict, chunks):
+    """Server-Sent Events response: one `meta` event, text chunks as they arrive, then `done`."""
+    async def events():
+        yield f"event: meta\ndata: {json.dumps(meta)}\n\n"
+        async for chunk in chunks:
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Declared before /predict_weather/{location_id} so "batch" isn't parsed as an id
+@router.post("/predict_weather/batch", response_model=List[schemas.WeatherPrediction])
+async def predict_weather_batch(request: schemas.WeatherBatchRequest = None):
+    # Latest readings for all (or the selected) locations in one read
+    location_ids = request.location_ids if request is not None else None
+    if location_ids is not None and not location_ids:
+        return []
+    rows = await database.fetch_rows(*_batch_features_query(location_ids))
+    if not rows:
+        return []
+
+    now = datetime.now()
+    location_ids = [row['location_id'] for row in rows]
+    # Recent-history features per location; missing ones are imputed by the model
+    context = await load_context(location_ids)
+    result = await ml_executor.run(
+        weather_service.predict_batch,
+        aqi=[row['aqi'] for row in rows],
+        pm25=[row['pm25'] for row in rows],
+        month=now.month,
+        hour=now.hour,
+        **{
+            name: [context.get(location_id, {}).get(name, float("nan")) for location_id in location_ids]
+            for name in CONTEXT_FEATURES
+        }
+    )
+    params = list(zip(
+        location_ids,
+        result['predicted_temp'].tolist(),
+        result['predicted_humidity'].tolist(),
+        result['condition'].tolist()
+    ))
+
+    insert_query = """
+        INSERT INTO weather_predictions (location_id, predicted_temp, predicted_humidity, condition)
+        VALUES (?, ?, ?, ?)
+    """
+    async with database.pool.writer() as db:
+        # Rows above the current max id are ours: the writer holds the write lock
+        async with db.execute("SELECT COALESCE(MAX(id), 0) FROM weather_predictions") as cursor:
+            (last_id,) = await cursor.fetchone()
+        await db.executemany(insert_query, params)
+        async with db.execute("SELECT * FROM weather_predictions WHERE id > ? ORDER BY id", (last_id,)) as cursor:
+            new_preds = await cursor.fetchall()
+
+    return [dict(pred) for pred in new_preds]
+
 @router.post("/predict_weather/{location_id}", response_model=schemas.WeatherPrediction)
 async def predict_weather(location_id: int):
-    # Get latest pollution record for this location
-    query = "SELECT * FROM pollution_records WHERE location_id = ? ORDER BY timestamp DESC LIMIT 1"
-    record = await database.fetch_one(query, (location_id,))
+    # Get latest pollution reading for this location
+    record = await database.fetch_one(LATEST_FEATURES_QUERY, (location_id,))
     
     if not record:
         raise HTTPException(status_code=404, detail="No pollution records found for this location to base prediction on.")
     
     # Extract features for ML model
     now = datetime.now()
-    prediction_result = weather_service.predict(
+    context = await load_context([location_id])
+    prediction_result = await ml_executor.run(
+        weather_service.predict,
         aqi=record['aqi'],
         pm25=record['pm25'],
         month=now.month,
-        hour=now.hour
+        hour=now.hour,
+        **context.get(location_id, {})
     )
     
     # Save prediction to DB
     insert_query = """
         INSERT INTO weather_predictions (location_id, predicted_temp, predicted_humidity, condition)
         VALUES (?, ?, ?, ?)
+        RETURNING *
     """
     params = (
         location_id, 
@@ -39,77 +125,128 @@ async def predict_weather(location_id: int):
         prediction_result['condition']
     )
     
-    async with database.aiosqlite.connect(database.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(insert_query, params)
-        await db.commit()
-        last_id = cursor.lastrowid
-        
-        async with db.execute("SELECT * FROM weather_predictions WHERE id = ?", (last_id,)) as cursor:
-            new_pred = await cursor.fetchone()
-            
+    new_pred = await database.execute_returning(insert_query, params)
     return dict(new_pred) if new_pred else {}
 
 @router.get("/analyze/{location_id}")
-async def analyze_pollution(location_id: int):
-    # Get location details
-    loc_query = "SELECT * FROM locations WHERE id = ?"
-    location = await database.fetch_one(loc_query, (location_id,))
-    if not location:
-        raise HTTPException(status_code=404, detail="Location not found")
-        
-    # Get latest pollution record
-    poll_query = "SELECT * FROM pollution_records WHERE location_id = ? ORDER BY timestamp DESC LIMIT 1"
-    record = await database.fetch_one(poll_query, (location_id,))
-    
+async def analyze_pollution(location_id: int, stream: bool = False):
+    # Get location details and its latest reading in one lookup
+    record = await database.fetch_one(LATEST_STATE_QUERY, (location_id,))
     if not record:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    if record['record_id'] is None:
         raise HTTPException(status_code=404, detail="No pollution data found for analysis.")
         
+    if stream:
+        chunks = genai_service.analyze_pollution_stream(
+            location_name=record['name'],
+            aqi=record['aqi'],
+            pm25=record['pm25'],
+            pm10=record['pm10']
+        )
+        meta = {"location": record['name'], "timestamp": record['timestamp'], "aqi": record['aqi']}
+        return _event_stream(meta, chunks)
+
     analysis = await genai_service.analyze_pollution(
-        location_name=location['name'],
+        location_name=record['name'],
         aqi=record['aqi'],
         pm25=record['pm25'],
         pm10=record['pm10']
     )
     
     return {
-        "location": location['name'],
+        "location": record['name'],
         "timestamp": record['timestamp'],
         "aqi": record['aqi'],
         "analysis": analysis
     }
 
 @router.get("/advice/{location_id}")
-async def get_ai_advice(location_id: int):
-    # Get location details
-    loc_query = "SELECT * FROM locations WHERE id = ?"
-    location = await database.fetch_one(loc_query, (location_id,))
-    if not location:
-        raise HTTPException(status_code=404, detail="Location not found")
-        
-    # Get latest pollution record
-    poll_query = "SELECT * FROM pollution_records WHERE location_id = ? ORDER BY timestamp DESC LIMIT 1"
-    record = await database.fetch_one(poll_query, (location_id,))
-    
+async def get_ai_advice(location_id: int, stream: bool = False):
+    # Location, latest reading and latest weather prediction in one lookup
+    record = await database.fetch_one(LATEST_STATE_QUERY, (location_id,))
     if not record:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    if record['record_id'] is None:
         raise HTTPException(status_code=404, detail="No pollution data found for generating advice.")
         
-    # Get latest weather prediction (if available)
-    weather_query = "SELECT * FROM weather_predictions WHERE location_id = ? ORDER BY timestamp DESC LIMIT 1"
-    weather = await database.fetch_one(weather_query, (location_id,))
-    
-    condition = weather['condition'] if weather else None
+    condition = record['condition']
     
+    if stream:
+        chunks = genai_service.get_advice_stream(
+            location_name=record['name'],
+            aqi=record['aqi'],
+            weather_condition=condition
+        )
+        meta = {
+            "location": record['name'],
+            "timestamp": record['timestamp'],
+            "aqi": record['aqi'],
+            "weather_condition": condition
+        }
+        return _event_stream(meta, chunks)
+
     advice = await genai_service.get_advice(
-        location_name=location['name'],
+        location_name=record['name'],
         aqi=record['aqi'],
         weather_condition=condition
     )
     
     return {
-        "location": location['name'],
+        "location": record['name'],
         "timestamp": record['timestamp'],
         "aqi": record['aqi'],
         "weather_condition": condition,
         "advice": advice
     }
+
+@router.get("/dashboard/{location_id}")
+async def get_dashboard(location_id: int):
+    """Everything the dashboard shows for one location in a single round trip."""
+    # One lookup for location, latest reading and latest stored prediction
+    record = await database.fetch_one(LATEST_STATE_QUERY, (location_id,))
+    if not record:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    if record['record_id'] is None:
+        raise HTTPException(status_code=404, detail="No pollution data found for this location.")
+
+    # Fresh weather prediction from the latest reading (not persisted)
+    now = datetime.now()
+    context = await load_context([location_id])
+    weather = await ml_executor.run(
+        weather_service.predict,
+        aqi=record['aqi'],
+        pm25=record['pm25'],
+        month=now.month,
+        hour=now.hour,
+        **context.get(location_id, {})
+    )
+
+    # Analysis and advice from a single structured Gemini generation
+    insights = await genai_service.get_dashboard_insights(
+        location_name=record['name'],
+        aqi=record['aqi'],
+        pm25=record['pm25'],
+        pm10=record['pm10'],
+        weather_condition=weather['condition']
+    )
+
+    return {
+        "location_id": location_id,
+        "location": record['name'],
+        "latest": {
+            "id": record['record_id'],
+            "aqi": record['aqi'],
+            "pm25": record['pm25'],
+            "pm10": record['pm10'],
+            "co": record['co'],
+            "no2": record['no2'],
+            "timestamp": record['timestamp']
+        },
+        "weather": weather,
+        "analysis": insights['analysis'],
+        "advice": insights['advice']
+    }
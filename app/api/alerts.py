@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List
+from ..db import database, schemas
+from ..services.alert_service import RULES_QUERY, alert_engine
+from ..services.location_registry import location_registry
+
+router = APIRouter(
+    prefix="/alerts",
+    tags=["Alerts"]
+)
+
+RULE_QUERY = "SELECT * FROM alert_rules WHERE id = ?"
+
+@router.post("/rules", response_model=schemas.AlertRule)
+async def create_alert_rule(rule: schemas.AlertRuleCreate):
+    if rule.location_id is not None and not await location_registry.exists(rule.location_id):
+        raise HTTPException(status_code=404, detail="Location not found")
+    if rule.sink not in alert_engine.sink_names:
+        raise HTTPException(status_code=400, detail=f"Unknown sink, expected one of: {', '.join(alert_engine.sink_names)}")
+    if rule.sink == "webhook":
+        webhook = alert_engine.sink("webhook")
+        if not (rule.target or webhook.url):
+            raise HTTPException(status_code=400, detail="Webhook rules need a `target` URL")
+        error = webhook.target_error(rule.target) if rule.target else None
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+    clear_threshold = rule.threshold if rule.clear_threshold is None else rule.clear_threshold
+    if clear_threshold > rule.threshold:
+        raise HTTPException(status_code=400, detail="`clear_threshold` must not be above `threshold`")
+
+    query = """
+        INSERT INTO alert_rules (name, location_id, metric, condition, threshold, clear_threshold,
+                                 window_size, cooldown_seconds, sink, target)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING *
+    """
+    params = (rule.name, rule.location_id, rule.metric, rule.condition, rule.threshold, clear_threshold,
+              rule.window_size, rule.cooldown_seconds, rule.sink, rule.target)
+    row = await database.execute_returning(query, params)
+    alert_engine.add_rule(row)
+    return dict(row)
+
+@router.get("/rules", response_model=List[schemas.AlertRule])
+async def read_alert_rules():
+    rows = await database.fetch_rows(RULES_QUERY)
+    return [dict(row) for row in rows]
+
+@router.get("/rules/{rule_id}", response_model=schemas.AlertRule)
+async def read_alert_rule(rule_id: int):
+    row = await database.fetch_one(RULE_QUERY, (rule_id,))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return dict(row)
+
+@router.delete("/rules/{rule_id}")
+async def delete_alert_rule(rule_id: int):
+    await database.execute_query("DELETE FROM alert_rules WHERE id = ?", (rule_id,))
+    alert_engine.remove_rule(rule_id)
+    return {"message": "Alert rule deleted successfully"}
+
+@router.get("/recent", response_model=List[schemas.Alert])
+async def read_recent_alerts(limit: int = Query(50, ge=1, le=1000)):
+    """Alerts raised by the evaluating worker, newest first (the last ALERT_HISTORY_SIZE are kept)."""
+    return await alert_engine.recent(limit)
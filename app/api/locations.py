@@ -1,12 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import List
 from ..db import database, schemas
+from ..services.alert_service import alert_engine
+from ..services.location_registry import location_registry
+from ..services.resource_versions import resource_versions
+from ..utils.names import normalize_name
 
 router = APIRouter(
     prefix="/locations",
     tags=["Locations"]
 )
 
+LOCATION_QUERY = "SELECT * FROM locations WHERE id = ?"
+
+# Full-text prefix match over name, city and country, best rank first
+SEARCH_QUERY = """
+    SELECT l.* FROM locations_fts
+    JOIN locations l ON l.id = locations_fts.rowid
+    WHERE locations_fts MATCH ?
+    ORDER BY rank LIMIT ?
+"""
+
+def _by_ids_query(count: int) -> str:
+    return f"SELECT * FROM locations WHERE id IN ({', '.join('?' for _ in range(count))})"
+
 @router.post("/", response_model=schemas.Location)
 async def create_location(location: schemas.LocationCreate):
     query = """
@@ -15,23 +32,87 @@ async def create_location(location: schemas.LocationCreate):
     """
     params = (location.name, location.city, location.country, location.latitude, location.longitude)
     
-    async with database.aiosqlite.connect(database.DB_PATH) as db:
-        cursor = await db.execute(query, params)
-        await db.commit()
-        last_id = cursor.lastrowid
-        
+    last_id = await database.execute_query(query, params)
+    # The insert trigger bumped the locations version
+    await resource_versions.load()
+    location_registry.add(last_id, location.latitude, location.longitude)
+    await location_registry.add_aliases(last_id, location.name, location.city)
     return {**location.dict(), "id": last_id}
 
 @router.get("/", response_model=List[schemas.Location])
-async def read_locations():
+async def read_locations(request: Request, response: Response):
+    # Answered from the in-memory version before any query when the client's copy is current
+    headers = resource_versions.headers("locations")
+    if resource_versions.is_fresh(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     query = "SELECT * FROM locations"
     rows = await database.fetch_rows(query)
     return [dict(row) for row in rows]
 
+MAX_NEARBY_RESULTS = 1000
+
+async def _with_distances(matches):
+    # Full rows for (location_id, distance_km) pairs, keeping their order
+    if not matches:
+        return []
+    rows = await database.fetch_rows(
+        _by_ids_query(len(matches)), tuple(location_id for location_id, _ in matches)
+    )
+    by_id = {row['id']: row for row in rows}
+    return [
+        {**dict(by_id[location_id]), "distance_km": round(distance, 3)}
+        for location_id, distance in matches if location_id in by_id
+    ]
+
+@router.get("/search", response_model=List[schemas.Location])
+async def search_locations(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100)):
+    """Prefix search over name, city and country, falling back to close misspellings."""
+    tokens = normalize_name(q).split()
+    if not tokens:
+        # Nothing we recognize as a word; let the FTS tokenizer have its say
+        tokens = [q.strip().replace('"', '""')]
+        if not tokens[0]:
+            return []
+    # Every token must match as a word prefix; tokens hold no quotes, so quoting is safe
+    match = " ".join(f'"{token}"*' for token in tokens)
+    rows = await database.fetch_rows(SEARCH_QUERY, (match, limit))
+    if rows:
+        return [dict(row) for row in rows]
+
+    location_ids = await location_registry.fuzzy(q, limit)
+    if not location_ids:
+        return []
+    rows = await database.fetch_rows(_by_ids_query(len(location_ids)), tuple(location_ids))
+    by_id = {row['id']: dict(row) for row in rows}
+    return [by_id[location_id] for location_id in location_ids if location_id in by_id]
+
+@router.get("/nearest", response_model=List[schemas.NearbyLocation])
+async def read_nearest_locations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=MAX_NEARBY_RESULTS),
+):
+    matches = await location_registry.nearest(lat, lon, k)
+    return await _with_distances(matches)
+
+@router.get("/within", response_model=List[schemas.NearbyLocation])
+async def read_locations_within(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=20000),
+    limit: int = Query(100, ge=1, le=MAX_NEARBY_RESULTS),
+):
+    matches = await location_registry.within(lat, lon, radius_km, limit)
+    return await _with_distances(matches)
+
 @router.get("/{location_id}", response_model=schemas.Location)
-async def read_location(location_id: int):
-    query = "SELECT * FROM locations WHERE id = ?"
-    row = await database.fetch_one(query, (location_id,))
+async def read_location(location_id: int, request: Request, response: Response):
+    headers = resource_versions.headers("locations")
+    if resource_versions.is_fresh(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    row = await database.fetch_one(LOCATION_QUERY, (location_id,))
     if row is None:
         raise HTTPException(status_code=404, detail="Location not found")
     return dict(row)
@@ -40,4 +121,7 @@ async def read_location(location_id: int):
 async def delete_location(location_id: int):
     query = "DELETE FROM locations WHERE id = ?"
     await database.execute_query(query, (location_id,))
+    await resource_versions.load()
+    location_registry.remove(location_id)
+    alert_engine.remove_location(location_id)
     return {"message": "Location deleted successfully"}
@@ -1,6 +1,48 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime, timezone
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
 from ..db import database, schemas
+from ..services.external_pollution import external_pollution_service
+from ..services.ingest_service import ingest_service
+from ..services.location_registry import location_registry
+from ..services.refresh_scheduler import refresh_scheduler
+from ..services.spatial_index import valid_coordinates
+from ..services.rollup_service import LEVELS, rollup_service
+from ..services.archive_service import PYARROW_AVAILABLE, archive_service
+from ..services.pubsub import TooManySubscribersError, reading_bus
+from ..services.resource_versions import resource_versions
+from ..utils import columns
+
+RECORD_FIELDS = ("id", "location_id", "aqi", "pm25", "pm10", "co", "no2", "temperature", "humidity", "timestamp")
+RECORD_COLUMNS = ", ".join(RECORD_FIELDS)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 500
+MAX_BULK_ROWS = 50000
+# Bulk bodies are read as they arrive and refused past this size, before parsing finishes
+MAX_BULK_BYTES = int(os.getenv("MAX_BULK_BYTES", str(32 * 1024 * 1024)))
+# Points returned by one format=columns/arrow request when no limit is given
+MAX_SERIES_POINTS = int(os.getenv("MAX_SERIES_POINTS", "200000"))
+# Idle SSE streams get a comment line this often so proxies keep them open
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Every location with its row in the latest_readings projection, never the history table
+LATEST_QUERY = """
+    SELECT l.id AS location_id, l.name, l.city, l.country, l.latitude, l.longitude,
+           r.record_id, r.aqi, r.pm25, r.pm10, r.co, r.no2, r.timestamp,
+           r.predicted_temp, r.predicted_humidity, r.condition, r.prediction_timestamp
+    FROM locations l
+    LEFT JOIN latest_readings r ON r.location_id = l.id
+    ORDER BY l.id
+"""
 
 router = APIRouter(
     prefix="/pollution",
@@ -10,85 +52,413 @@ router = APIRouter(
 @router.post("/", response_model=schemas.PollutionRecord)
 async def create_pollution_record(record: schemas.PollutionRecordCreate):
     # Check if location exists
-    loc_query = "SELECT id FROM locations WHERE id = ?"
-    loc = await database.fetch_one(loc_query, (record.location_id,))
-    if not loc:
+    if not await location_registry.exists(record.location_id):
         raise HTTPException(status_code=404, detail="Location not found")
     
-    query = """
-        INSERT INTO pollution_records (location_id, aqi, pm25, pm10, co, no2)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """
-    params = (record.location_id, record.aqi, record.pm25, record.pm10, record.co, record.no2)
-    
-    async with database.aiosqlite.connect(database.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(query, params)
-        await db.commit()
-        last_id = cursor.lastrowid
-        
-        async with db.execute("SELECT * FROM pollution_records WHERE id = ?", (last_id,)) as cursor:
-            new_record = await cursor.fetchone()
-            
+    new_record = await ingest_service.insert_record(record)
     return dict(new_record) if new_record else {}
 
-@router.get("/", response_model=List[schemas.PollutionRecord])
-async def read_pollution_records(location_id: int = None):
-    if location_id:
-        query = "SELECT * FROM pollution_records WHERE location_id = ? ORDER BY timestamp DESC"
-        rows = await database.fetch_rows(query, (location_id,))
+async def _bulk_chunks(request: Request):
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_BULK_BYTES:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_BYTES} bytes per request")
+        yield chunk
+
+async def _bulk_lines(request: Request):
+    # Lines are parsed as they arrive; only the unfinished one is buffered
+    pending = b""
+    async for chunk in _bulk_chunks(request):
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+@router.post("/bulk", response_model=schemas.BulkIngestResult)
+async def bulk_create_pollution_records(request: Request):
+    """Ingest many readings at once from a JSON array or an NDJSON body.
+
+    Valid rows are written in a single transaction; invalid rows are
+    skipped and reported by their position in the input. Bodies over
+    MAX_BULK_BYTES, or NDJSON bodies over MAX_BULK_ROWS lines, are refused
+    with 413 as soon as the limit is crossed.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_BULK_BYTES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_BYTES} bytes per request")
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = []
+        async for line in _bulk_lines(request):
+            if not line.strip():
+                continue
+            if len(items) == MAX_BULK_ROWS:
+                raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} records per request")
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)
     else:
-        query = "SELECT * FROM pollution_records ORDER BY timestamp DESC"
-        rows = await database.fetch_rows(query)
+        body = b"".join([chunk async for chunk in _bulk_chunks(request)])
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of pollution records")
+        if len(items) > MAX_BULK_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} records per request")
+
+    rows, errors = await ingest_service.ingest_bulk(items)
+    return {"inserted": len(rows), "ids": [row['id'] for row in rows], "errors": errors}
+
+@router.get("/latest", response_model=List[schemas.LatestReading])
+async def read_latest_readings():
+    rows = await database.fetch_rows(LATEST_QUERY)
     return [dict(row) for row in rows]
 
-from ..services.external_pollution import external_pollution_service
+@router.get("/aggregate", response_model=schemas.AggregateResult)
+async def aggregate_pollution(
+    location_id: int,
+    bucket: Optional[str] = Query(None, pattern=f"^({'|'.join(LEVELS)})$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+):
+    """Hourly, daily or monthly aggregates served from the rollup tables.
+
+    Without `bucket`, the finest level that keeps the range under
+    AGGREGATE_MAX_POINTS buckets is used. Buckets are matched by their start.
+    """
+    db_start = _db_timestamp(start) if start is not None else None
+    db_end = _db_timestamp(end) if end is not None else None
+    if db_start and db_end and db_start > db_end:
+        raise HTTPException(status_code=400, detail="`from` must not be after `to`")
+    level = bucket or rollup_service.pick_level(start, end)
+    points = await rollup_service.aggregate(location_id, level, db_start, db_end)
+    return {"location_id": location_id, "bucket": level, "points": points}
+
+def _check_stream_capacity():
+    if reading_bus.subscriber_count >= reading_bus.max_subscribers:
+        raise TooManySubscribersError("Too many stream subscribers, try again later")
+
+@router.get("/stream")
+async def stream_pollution_records(
+    location_id: Optional[List[int]] = Query(None),
+    min_aqi: Optional[int] = Query(None, ge=0),
+):
+    """Server-Sent Events feed of new readings, one `data:` JSON record per reading.
+
+    Repeat `location_id` to follow several locations (all if omitted);
+    `min_aqi` only sends readings at or above that AQI. A slow client
+    receives the latest reading per location rather than every one.
+    """
+    try:
+        _check_stream_capacity()
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        # Subscribed inside the generator so a client that leaves before the
+        # first byte never leaves a subscription behind
+        try:
+            subscription = reading_bus.subscribe(location_id, min_aqi)
+        except TooManySubscribersError:
+            return
+        try:
+            yield ": subscribed\n\n"
+            while True:
+                payloads = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if not payloads:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield "".join(f"data: {payload}\n\n" for payload in payloads)
+        finally:
+            reading_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/stream")
+async def stream_pollution_records_ws(
+    websocket: WebSocket,
+    location_id: Optional[List[int]] = Query(None),
+    min_aqi: Optional[int] = Query(None, ge=0),
+):
+    """WebSocket variant of GET /pollution/stream: one JSON text message per reading."""
+    try:
+        _check_stream_capacity()
+        subscription = reading_bus.subscribe(location_id, min_aqi)
+    except TooManySubscribersError:
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+
+    async def send_readings():
+        while True:
+            for payload in await subscription.get():
+                await websocket.send_text(payload)
+
+    sender = None
+    try:
+        await websocket.accept()
+        sender = asyncio.create_task(send_readings())
+        # Client messages are ignored; receiving is how a disconnect is noticed
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+        reading_bus.unsubscribe(subscription)
+
+async def _read_series(location_id, since, until, after, limit, fmt, headers):
+    """Chart series: one array per field instead of one object per record.
+
+    `columns` is a JSON object of arrays; `arrow` is an Arrow IPC stream
+    with float32 measurement columns. Newest first like the JSON pages,
+    with X-Next-Cursor when the range holds more than `limit` points.
+    """
+    if fmt == "arrow" and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="format=arrow needs pyarrow on the server")
+    rows = await _fetch_history(location_id, since, until, after, limit + 1, tuples=True)
+    headers = dict(headers)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor({"timestamp": rows[-1][-1], "id": rows[-1][0]})
+    arrays = columns.to_arrays(rows, RECORD_FIELDS)
+    if fmt == "arrow":
+        return Response(columns.to_arrow_ipc(arrays), media_type=columns.ARROW_MEDIA_TYPE, headers=headers)
+    return Response(columns.to_json(arrays), media_type="application/json", headers=headers)
+
+def _db_timestamp(value: datetime) -> str:
+    # Stored timestamps are naive UTC text from CURRENT_TIMESTAMP
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def _encode_cursor(row) -> str:
+    raw = f"{row['timestamp']}|{row['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return timestamp, int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _history_page_query(location_id, since, until, after, limit):
+    """Build one keyset page of history, newest first, ordered by (timestamp, id)."""
+    clauses, params = [], []
+    if location_id is not None:
+        clauses.append("location_id = ?")
+        params.append(location_id)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(_db_timestamp(since))
+    if until is not None:
+        clauses.append("timestamp <= ?")
+        params.append(_db_timestamp(until))
+    if after is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+        SELECT {RECORD_COLUMNS} FROM pollution_records {where}
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    """
+    params.append(limit)
+    return query, tuple(params)
+
+async def _fetch_history(location_id, since, until, after, limit, tuples=False):
+    """One page of history from SQLite, merged with the Parquet archive when the range reaches it.
+
+    With `tuples`, rows are plain tuples in RECORD_FIELDS order (for columnar output).
+    """
+    query, params = _history_page_query(location_id, since, until, after, limit)
+    if tuples:
+        rows = await database.fetch_tuples(query, params)
+    else:
+        rows = [dict(row) for row in await database.fetch_rows(query, params)]
+    hot_oldest = None
+    if len(rows) == limit:
+        # A full page only needs archived rows at least as new as its last one
+        hot_oldest = rows[-1][-1] if tuples else rows[-1]['timestamp']
+    archived = await archive_service.read_history(
+        location_id,
+        _db_timestamp(since) if since is not None else None,
+        _db_timestamp(until) if until is not None else None,
+        after,
+        limit,
+        hot_oldest,
+    )
+    if archived:
+        # A crash between archiving and deleting can leave a row in both tiers
+        if tuples:
+            seen = {row[0] for row in rows}
+            rows.extend(tuple(row[field] for field in RECORD_FIELDS) for row in archived if row['id'] not in seen)
+            rows.sort(key=lambda row: (row[-1], row[0]), reverse=True)
+        else:
+            seen = {row['id'] for row in rows}
+            rows.extend(row for row in archived if row['id'] not in seen)
+            rows.sort(key=lambda row: (row['timestamp'], row['id']), reverse=True)
+        del rows[limit:]
+    return rows
+
+async def _stream_history(location_id, since, until, after, limit, fmt):
+    # Page through the keyset one batch at a time; a reader connection is only
+    # held while a batch is fetched, never while the client is consuming it.
+    remaining = limit
+    first = True
+    while remaining is None or remaining > 0:
+        batch_size = EXPORT_BATCH_SIZE if remaining is None else min(EXPORT_BATCH_SIZE, remaining)
+        rows = await _fetch_history(location_id, since, until, after, batch_size)
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if first:
+                writer.writerow(RECORD_FIELDS)
+            writer.writerows(tuple(row[field] for field in RECORD_FIELDS) for row in rows)
+            chunk = buffer.getvalue()
+        else:
+            chunk = "".join(json.dumps(row) + "\n" for row in rows)
+        first = False
+        if chunk:
+            yield chunk
+        if len(rows) < batch_size:
+            break
+        after = (rows[-1]['timestamp'], rows[-1]['id'])
+        if remaining is not None:
+            remaining -= len(rows)
+
+@router.get("/", response_model=List[schemas.PollutionRecord])
+async def read_pollution_records(
+    request: Request,
+    response: Response,
+    location_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson|csv|columns|arrow)$"),
+):
+    after = _decode_cursor(cursor) if cursor else None
+    # Answered from the in-memory version before any query when the client's copy is current
+    headers = resource_versions.headers("pollution", format)
+    if resource_versions.is_fresh(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+
+    if format in ("columns", "arrow"):
+        return await _read_series(location_id, since, until, after, limit or MAX_SERIES_POINTS, format, headers)
+
+    if format != "json":
+        # Export mode streams the whole filtered range unless a limit is given
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            _stream_history(location_id, since, until, after, limit, format),
+            media_type=media_type,
+            headers=headers,
+        )
+
+    response.headers.update(headers)
+    page_size = limit or DEFAULT_PAGE_SIZE
+    # Fetch one extra row to know whether another page exists
+    rows = await _fetch_history(location_id, since, until, after, page_size + 1)
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+    return rows
+
+# A fetched station within this distance of a stored location is treated as that location
+LOCATION_MATCH_RADIUS_KM = float(os.getenv("LOCATION_MATCH_RADIUS_KM", "5"))
+
+async def _resolve_location(data, city_name: str, latitude=None, longitude=None) -> int:
+    """Location id for a WAQI reading: the nearest stored location to the station, else a new one."""
+    geo = data.get("geo") or [latitude, longitude]
+    lat, lon = (geo + [None, None])[:2]
+    if valid_coordinates(lat, lon):
+        matches = await location_registry.nearest(lat, lon, 1)
+        if matches and matches[0][1] <= LOCATION_MATCH_RADIUS_KM:
+            return matches[0][0]
+    else:
+        # No usable coordinates: fall back to the station's name
+        location_id = await location_registry.resolve(data.get("city", city_name))
+        if location_id is not None:
+            return location_id
+        lat, lon = 0.0, 0.0
+
+    # Create a new location automatically
+    insert_loc_query = """
+        INSERT INTO locations (name, city, country, latitude, longitude)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    params = (data.get("city", city_name), city_name, "Auto", lat, lon)
+    location_id = await database.execute_query(insert_loc_query, params)
+    await resource_versions.load()
+    location_registry.add(location_id, lat, lon)
+    return location_id
+
+def _to_record(location_id: int, data) -> schemas.PollutionRecordCreate:
+    return schemas.PollutionRecordCreate(
+        location_id=location_id,
+        aqi=data['aqi'],
+        pm25=data['pm25'],
+        pm10=data['pm10'],
+        co=data['co'],
+        no2=data['no2'],
+        temperature=data.get('temperature'),
+        humidity=data.get('humidity')
+    )
 
 @router.post("/fetch-by-city/{city_name}", response_model=schemas.PollutionRecord)
 async def fetch_pollution_by_city(city_name: str):
-    # 1. Fetch real-time data from external service
-    data = await external_pollution_service.fetch_pollution_by_city(city_name)
+    # 1. Known spellings resolve in memory; fetch a known location by its
+    #    coordinates so it shares the upstream cache entry with the scheduler
+    location_id = await location_registry.resolve(city_name)
+    coordinates = location_registry.coordinates(location_id) if location_id is not None else None
+    if coordinates:
+        data = await external_pollution_service.fetch_real_time_pollution(*coordinates)
+    else:
+        data = await external_pollution_service.fetch_pollution_by_city(city_name)
     
     if "error" in data:
         raise HTTPException(status_code=400, detail=data["error"])
     
-    # 2. Check if a location with this city exists
-    city_response_name = data.get("city", city_name)
-    loc_query = "SELECT * FROM locations WHERE city LIKE ?"
-    location = await database.fetch_one(loc_query, (f"%{city_name}%",))
-    
-    if not location:
-        # Create a new location automatically
-        insert_loc_query = """
-            INSERT INTO locations (name, city, country, latitude, longitude)
-            VALUES (?, ?, ?, ?, ?)
-        """
-        # lat/lon from the AI data if available
-        geo = data.get("geo", [0.0, 0.0])
-        params = (city_response_name, city_name, "Auto", geo[0], geo[1])
-        
-        async with database.aiosqlite.connect(database.DB_PATH) as db:
-            db.row_factory = database.aiosqlite.Row
-            cursor = await db.execute(insert_loc_query, params)
-            await db.commit()
-            location_id = cursor.lastrowid
-    else:
-        location_id = location['id']
-        
+    # 2. Otherwise match the station to a stored location by distance, creating one if needed
+    if location_id is None:
+        location_id = await _resolve_location(data, city_name)
+    await location_registry.add_aliases(location_id, city_name, data.get("city"))
+
     # 3. Save pollution record
-    query = """
-        INSERT INTO pollution_records (location_id, aqi, pm25, pm10, co, no2)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """
-    params = (location_id, data['aqi'], data['pm25'], data['pm10'], data['co'], data['no2'])
-    
-    async with database.aiosqlite.connect(database.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(query, params)
-        await db.commit()
-        last_id = cursor.lastrowid
-        
-        async with db.execute("SELECT * FROM pollution_records WHERE id = ?", (last_id,)) as cursor:
-            new_record = await cursor.fetchone()
-            
+    new_record = await ingest_service.insert_record(_to_record(location_id, data))
     return dict(new_record) if new_record else {}
+
+@router.post("/fetch-by-geo", response_model=schemas.PollutionRecord)
+async def fetch_pollution_by_geo(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+):
+    """Fetch the reading for the WAQI station nearest to a point and store it."""
+    data = await external_pollution_service.fetch_real_time_pollution(lat, lon)
+    if "error" in data:
+        raise HTTPException(status_code=400, detail=data["error"])
+
+    location_id = await _resolve_location(data, data.get("city", f"{lat:.3f},{lon:.3f}"), lat, lon)
+    await location_registry.add_aliases(location_id, data.get("city"))
+    new_record = await ingest_service.insert_record(_to_record(location_id, data))
+    return dict(new_record) if new_record else {}
+
+@router.post("/fetch-real/{location_id}", response_model=schemas.PollutionRecord)
+async def fetch_real_time_pollution(location_id: int):
+    # On-demand refresh of one location; the background scheduler keeps the rest current
+    result = await refresh_scheduler.refresh_location(location_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+    if isinstance(result, dict) and "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return dict(result)
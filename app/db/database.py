@@ -1,27 +1,248 @@
 import aiosqlite
+import asyncio
 import os
+import random
+import sqlite3
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from typing import List, Optional
+from ..utils.metrics import registry
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "../../data/pollution_monitor.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), "../../data/pollution_monitor.db"))
 
-async def get_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+# Number of read-only connections kept open next to the single writer
+READER_COUNT = int(os.getenv("DB_READERS", "4"))
+
+# How long a connection waits on another process's lock before SQLITE_BUSY
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Extra attempts (with jittered backoff) to start a write transaction that
+# still hit SQLITE_BUSY after the busy timeout, e.g. under multiple workers
+WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "3"))
+
+# Applied to every pooled connection right after it is opened
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+)
+
+# Per-connection prepared statement cache (sqlite3 reuses compiled statements)
+STATEMENT_CACHE_SIZE = 256
+
+# Timed inside reader()/writer() so every query is covered without an extra
+# coroutine layer per call; the pool is only used from the event loop.
+# Connection waits are exported from stats() rather than a second histogram
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_seconds", "Time a pooled connection is held per read or write transaction", ("kind",),
+    loop_only=True,
+)
+_QUERY = {kind: DB_QUERY_SECONDS.labels(kind) for kind in ("reader", "writer")}
+
+
+class ConnectionPool:
+    """App-scoped SQLite pool: one serialized writer and N reader connections.
+
+    Opened in the FastAPI lifespan and closed at shutdown. Every connection
+    lives for the whole process, so its aiosqlite worker thread and its
+    prepared statement cache are reused across requests. Readers are handed
+    out first come, first served: a released reader goes straight to the
+    longest waiting request, so a burst above the pool size can't starve one.
+    """
+
+    def __init__(self, path: str, readers: int = READER_COUNT):
+        self.path = path
+        self.reader_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._idle_readers: List[aiosqlite.Connection] = []
+        self._reader_waiters: deque = deque()
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+        self._stats = {
+            "reader_acquires": 0,
+            "reader_waits": 0,
+            "reader_wait_seconds": 0.0,
+            "reader_max_wait_seconds": 0.0,
+            "writer_acquires": 0,
+            "writer_waits": 0,
+            "writer_wait_seconds": 0.0,
+            "writer_max_wait_seconds": 0.0,
+            "writer_busy_retries": 0,
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(
+            self.path,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
         db.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await db.execute(pragma)
+        return db
+
+    async def open(self):
+        async with self._open_lock:
+            if self.is_open:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            writer = await self._connect()
+            self._write_lock = asyncio.Lock()
+            self._all_readers = [await self._connect() for _ in range(self.reader_count)]
+            self._idle_readers = list(self._all_readers)
+            self._reader_waiters = deque()
+            self._writer = writer
+
+    async def close(self):
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            writer, self._writer = self._writer, None
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers = []
+            self._idle_readers = []
+            await writer.close()
+
+    def _record_wait(self, kind: str, waited: float):
+        self._stats[f"{kind}_acquires"] += 1
+        if waited > 0.0005:
+            self._stats[f"{kind}_waits"] += 1
+        self._stats[f"{kind}_wait_seconds"] += waited
+        if waited > self._stats[f"{kind}_max_wait_seconds"]:
+            self._stats[f"{kind}_max_wait_seconds"] = waited
+
+    @asynccontextmanager
+    async def reader(self):
+        if not self.is_open:
+            await self.open()
+        started = time.perf_counter()
+        conn = await self._acquire_reader()
+        acquired = time.perf_counter()
+        self._record_wait("reader", acquired - started)
+        try:
+            yield conn
+        finally:
+            self._release_reader(conn)
+            _QUERY["reader"].observe(time.perf_counter() - acquired)
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        # Idle readers only exist while nobody is waiting (see _release_reader)
+        if self._idle_readers:
+            return self._idle_readers.pop()
+        waiter = asyncio.get_running_loop().create_future()
+        self._reader_waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                try:
+                    self._reader_waiters.remove(waiter)
+                except ValueError:
+                    pass
+            else:
+                # Handed a reader just as the request was cancelled; pass it on
+                self._release_reader(waiter.result())
+            raise
+
+    def _release_reader(self, conn: aiosqlite.Connection):
+        while self._reader_waiters:
+            waiter = self._reader_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(conn)
+                return
+        self._idle_readers.append(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Yield the writer connection inside a BEGIN IMMEDIATE transaction.
+
+        Commits when the block exits normally and rolls back on error.
+        """
+        if not self.is_open:
+            await self.open()
+        started = time.perf_counter()
+        async with self._write_lock:
+            self._record_wait("writer", time.perf_counter() - started)
+            db = self._writer
+            await self._begin_immediate(db)
+            started = time.perf_counter()
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            else:
+                await db.commit()
+            finally:
+                _QUERY["writer"].observe(time.perf_counter() - started)
+
+    async def _begin_immediate(self, db: aiosqlite.Connection):
+        # Other worker processes share the database file, so the write lock can
+        # stay taken past busy_timeout; back off and retry rather than fail
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                await db.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                busy = "locked" in str(e) or "busy" in str(e)
+                if not busy or attempt == WRITE_RETRIES:
+                    raise
+                self._stats["writer_busy_retries"] += 1
+                await asyncio.sleep(random.uniform(0.05, 0.2) * 2 ** attempt)
+
+    def stats(self) -> dict:
+        readers_idle = len(self._idle_readers)
+        return {
+            **self._stats,
+            "open": self.is_open,
+            "readers_total": self.reader_count,
+            "readers_in_use": self.reader_count - readers_idle if self.is_open else 0,
+            "writer_busy": bool(self._write_lock and self._write_lock.locked()),
+        }
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+async def get_db():
+    async with pool.reader() as db:
         yield db
 
 async def execute_query(query: str, params: tuple = ()):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(query, params)
-        await db.commit()
+    async with pool.writer() as db:
+        cursor = await db.execute(query, params)
+        last_id = cursor.lastrowid
+        await cursor.close()
+        return last_id
+
+async def execute_returning(query: str, params: tuple = ()):
+    """Run a write statement ending in RETURNING and return the first row."""
+    async with pool.writer() as db:
+        async with db.execute(query, params) as cursor:
+            return await cursor.fetchone()
 
 async def fetch_rows(query: str, params: tuple = ()):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         async with db.execute(query, params) as cursor:
             return await cursor.fetchall()
 
+async def fetch_tuples(query: str, params: tuple = ()):
+    """Like fetch_rows, but rows are plain tuples (no Row objects) for bulk columnar reads."""
+    async with pool.reader() as db:
+        async with db.execute(query, params) as cursor:
+            cursor.row_factory = None
+            return await cursor.fetchall()
+
 async def fetch_one(query: str, params: tuple = ()):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         async with db.execute(query, params) as cursor:
             return await cursor.fetchone()
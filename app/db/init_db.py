@@ -1,15 +1,23 @@
+import logging
 import sqlite3
 import os
+from contextlib import contextmanager
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "../../data/pollution_monitor.db")
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
 
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), "../../data/pollution_monitor.db"))
 
-    # Create Locations table
-    cursor.execute('''
+# Versioned schema migrations. Each entry is (version, description, statements)
+# and is applied exactly once; the applied version is tracked in PRAGMA user_version.
+# Never edit a migration that has shipped - append a new one instead.
+MIGRATIONS = [
+    (1, "base tables", [
+        '''
         CREATE TABLE IF NOT EXISTS locations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -18,10 +26,8 @@ def init_db():
             latitude REAL,
             longitude REAL
         )
-    ''')
-
-    # Create PollutionRecords table
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS pollution_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             location_id INTEGER NOT NULL,
@@ -33,10 +39,8 @@ def init_db():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (location_id) REFERENCES locations (id)
         )
-    ''')
-
-    # Create WeatherPredictions table
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS weather_predictions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             location_id INTEGER NOT NULL,
@@ -46,11 +50,361 @@ def init_db():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (location_id) REFERENCES locations (id)
         )
-    ''')
+        ''',
+    ]),
+    (2, "time-series indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_pollution_location_ts ON pollution_records (location_id, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_pollution_ts ON pollution_records (timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_weather_location_ts ON weather_predictions (location_id, timestamp DESC)",
+    ]),
+    (3, "latest_readings projection", [
+        '''
+        CREATE TABLE IF NOT EXISTS latest_readings (
+            location_id INTEGER PRIMARY KEY,
+            record_id INTEGER,
+            aqi INTEGER,
+            pm25 REAL,
+            pm10 REAL,
+            co REAL,
+            no2 REAL,
+            timestamp DATETIME,
+            prediction_id INTEGER,
+            predicted_temp REAL,
+            predicted_humidity REAL,
+            condition TEXT,
+            prediction_timestamp DATETIME,
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+        ''',
+        # Triggers keep the projection current inside the inserting transaction
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_pollution_latest AFTER INSERT ON pollution_records
+        BEGIN
+            INSERT INTO latest_readings (location_id, record_id, aqi, pm25, pm10, co, no2, timestamp)
+            VALUES (NEW.location_id, NEW.id, NEW.aqi, NEW.pm25, NEW.pm10, NEW.co, NEW.no2, NEW.timestamp)
+            ON CONFLICT (location_id) DO UPDATE SET
+                record_id = excluded.record_id,
+                aqi = excluded.aqi,
+                pm25 = excluded.pm25,
+                pm10 = excluded.pm10,
+                co = excluded.co,
+                no2 = excluded.no2,
+                timestamp = excluded.timestamp
+            WHERE latest_readings.timestamp IS NULL OR excluded.timestamp >= latest_readings.timestamp;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_weather_latest AFTER INSERT ON weather_predictions
+        BEGIN
+            INSERT INTO latest_readings (location_id, prediction_id, predicted_temp, predicted_humidity, condition, prediction_timestamp)
+            VALUES (NEW.location_id, NEW.id, NEW.predicted_temp, NEW.predicted_humidity, NEW.condition, NEW.timestamp)
+            ON CONFLICT (location_id) DO UPDATE SET
+                prediction_id = excluded.prediction_id,
+                predicted_temp = excluded.predicted_temp,
+                predicted_humidity = excluded.predicted_humidity,
+                condition = excluded.condition,
+                prediction_timestamp = excluded.prediction_timestamp
+            WHERE latest_readings.prediction_timestamp IS NULL OR excluded.prediction_timestamp >= latest_readings.prediction_timestamp;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_location_latest_delete AFTER DELETE ON locations
+        BEGIN
+            DELETE FROM latest_readings WHERE location_id = OLD.id;
+        END
+        ''',
+        # Backfill from existing history
+        '''
+        INSERT OR REPLACE INTO latest_readings (location_id, record_id, aqi, pm25, pm10, co, no2, timestamp)
+        SELECT location_id, id, aqi, pm25, pm10, co, no2, timestamp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY location_id ORDER BY timestamp DESC, id DESC) AS rn
+            FROM pollution_records
+        ) WHERE rn = 1
+        ''',
+        '''
+        INSERT INTO latest_readings (location_id, prediction_id, predicted_temp, predicted_humidity, condition, prediction_timestamp)
+        SELECT location_id, id, predicted_temp, predicted_humidity, condition, timestamp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY location_id ORDER BY timestamp DESC, id DESC) AS rn
+            FROM weather_predictions
+        ) WHERE rn = 1
+        ON CONFLICT (location_id) DO UPDATE SET
+            prediction_id = excluded.prediction_id,
+            predicted_temp = excluded.predicted_temp,
+            predicted_humidity = excluded.predicted_humidity,
+            condition = excluded.condition,
+            prediction_timestamp = excluded.prediction_timestamp
+        ''',
+    ]),
+    (4, "keyset pagination indexes", [
+        # Include id so (timestamp, id) keyset pages need no tie-break sort
+        "DROP INDEX IF EXISTS idx_pollution_location_ts",
+        "DROP INDEX IF EXISTS idx_pollution_ts",
+        "CREATE INDEX IF NOT EXISTS idx_pollution_location_ts_id ON pollution_records (location_id, timestamp DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_pollution_ts_id ON pollution_records (timestamp DESC, id DESC)",
+    ]),
+    (5, "genai response cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS genai_cache (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            response TEXT NOT NULL,
+            latency_seconds REAL NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_genai_cache_expires ON genai_cache (expires_at)",
+    ]),
+    (6, "pollution rollups", [
+        # One row per (level, location, bucket); level is 'hour', 'day' or 'month'.
+        # Sums/counts/extrema merge incrementally, so only new records are ever rolled up.
+        '''
+        CREATE TABLE IF NOT EXISTS pollution_rollups (
+            level TEXT NOT NULL,
+            location_id INTEGER NOT NULL,
+            bucket_start TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            aqi_count INTEGER NOT NULL, aqi_sum REAL NOT NULL, aqi_min REAL, aqi_max REAL,
+            pm25_count INTEGER NOT NULL, pm25_sum REAL NOT NULL, pm25_min REAL, pm25_max REAL,
+            pm10_count INTEGER NOT NULL, pm10_sum REAL NOT NULL, pm10_min REAL, pm10_max REAL,
+            co_count INTEGER NOT NULL, co_sum REAL NOT NULL, co_min REAL, co_max REAL,
+            no2_count INTEGER NOT NULL, no2_sum REAL NOT NULL, no2_min REAL, no2_max REAL,
+            PRIMARY KEY (location_id, level, bucket_start)
+        ) WITHOUT ROWID
+        ''',
+        # AQI histogram (bins of 10) per bucket, for approximate percentiles
+        '''
+        CREATE TABLE IF NOT EXISTS pollution_rollup_aqi_hist (
+            level TEXT NOT NULL,
+            location_id INTEGER NOT NULL,
+            bucket_start TEXT NOT NULL,
+            bin INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (location_id, level, bucket_start, bin)
+        ) WITHOUT ROWID
+        ''',
+        # Highest pollution_records.id already folded into the rollups; the
+        # app catches up from 0 on first start, which backfills existing history
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_record_id INTEGER NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO rollup_state (name, last_record_id) VALUES ('pollution', 0)",
+    ]),
+    (7, "pollution archive state", [
+        # Newest timestamp moved to the Parquet archive; history reads for
+        # ranges starting after it never touch the archive. NULL until the first run
+        '''
+        CREATE TABLE IF NOT EXISTS archive_state (
+            name TEXT PRIMARY KEY,
+            archived_through TEXT,
+            archived_rows INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO archive_state (name, archived_through, archived_rows) VALUES ('pollution', NULL, 0)",
+    ]),
+    (8, "location aliases and full-text search", [
+        # Normalized names (see app/utils/names.py) that resolve to one location.
+        # Several locations may share a city, so uniqueness lives here rather
+        # than on locations; existing locations are aliased by the app on load.
+        '''
+        CREATE TABLE IF NOT EXISTS location_aliases (
+            alias TEXT PRIMARY KEY,
+            location_id INTEGER NOT NULL,
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_location_aliases_location ON location_aliases (location_id)",
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS locations_fts USING fts5(
+            name, city, country,
+            content='locations', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_locations_fts_insert AFTER INSERT ON locations
+        BEGIN
+            INSERT INTO locations_fts (rowid, name, city, country) VALUES (NEW.id, NEW.name, NEW.city, NEW.country);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_locations_fts_update AFTER UPDATE ON locations
+        BEGIN
+            INSERT INTO locations_fts (locations_fts, rowid, name, city, country)
+            VALUES ('delete', OLD.id, OLD.name, OLD.city, OLD.country);
+            INSERT INTO locations_fts (rowid, name, city, country) VALUES (NEW.id, NEW.name, NEW.city, NEW.country);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_locations_fts_delete AFTER DELETE ON locations
+        BEGIN
+            INSERT INTO locations_fts (locations_fts, rowid, name, city, country)
+            VALUES ('delete', OLD.id, OLD.name, OLD.city, OLD.country);
+            DELETE FROM location_aliases WHERE location_id = OLD.id;
+        END
+        ''',
+        "INSERT INTO locations_fts (locations_fts) VALUES ('rebuild')",
+    ]),
+    (9, "weather observations and model registry", [
+        # Temperature/humidity reported with each reading; the weather model's targets
+        "ALTER TABLE pollution_records ADD COLUMN temperature REAL",
+        "ALTER TABLE pollution_records ADD COLUMN humidity REAL",
+        # Every accepted weather model; the highest version is the live one
+        '''
+        CREATE TABLE IF NOT EXISTS weather_models (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            feature_names TEXT NOT NULL,
+            coefficients TEXT NOT NULL,
+            intercept TEXT NOT NULL,
+            feature_means TEXT NOT NULL,
+            train_rows INTEGER NOT NULL,
+            holdout_rows INTEGER NOT NULL,
+            holdout_rmse_temp REAL,
+            holdout_rmse_humidity REAL
+        )
+        ''',
+        # Sufficient statistics accumulated so far and the last pollution record they include
+        '''
+        CREATE TABLE IF NOT EXISTS weather_training_state (
+            name TEXT PRIMARY KEY,
+            last_record_id INTEGER NOT NULL,
+            state TEXT
+        )
+        ''',
+        "INSERT OR IGNORE INTO weather_training_state (name, last_record_id, state) VALUES ('weather', 0, NULL)",
+    ]),
+    (10, "alert rules", [
+        # Evaluated in memory on every insert (see app/services/alert_service.py);
+        # a NULL location_id applies the rule to every location
+        '''
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            location_id INTEGER,
+            metric TEXT NOT NULL,
+            condition TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            clear_threshold REAL NOT NULL,
+            window_size INTEGER NOT NULL DEFAULT 1,
+            cooldown_seconds REAL NOT NULL DEFAULT 0,
+            sink TEXT NOT NULL DEFAULT 'log',
+            target TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_location_alert_rules_delete AFTER DELETE ON locations
+        BEGIN
+            DELETE FROM alert_rules WHERE location_id = OLD.id;
+        END
+        ''',
+    ]),
+    (11, "resource versions", [
+        # Change counters behind the ETag/Last-Modified headers of the read
+        # endpoints (see app/services/resource_versions.py). Location writes
+        # bump theirs by trigger; pollution_records is bumped once per batch
+        # by IngestService instead, as a per-row trigger would slow bulk ingest.
+        '''
+        CREATE TABLE IF NOT EXISTS resource_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            modified_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO resource_versions (name, version) VALUES ('locations', 1), ('pollution', 1)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_locations_version_insert AFTER INSERT ON locations
+        BEGIN
+            UPDATE resource_versions SET version = version + 1, modified_at = CURRENT_TIMESTAMP WHERE name = 'locations';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_locations_version_update AFTER UPDATE ON locations
+        BEGIN
+            UPDATE resource_versions SET version = version + 1, modified_at = CURRENT_TIMESTAMP WHERE name = 'locations';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_locations_version_delete AFTER DELETE ON locations
+        BEGIN
+            UPDATE resource_versions SET version = version + 1, modified_at = CURRENT_TIMESTAMP WHERE name = 'locations';
+        END
+        ''',
+    ]),
+    (12, "alert history", [
+        # Alerts raised by the evaluating (leader) worker, so every worker can
+        # answer GET /alerts/recent; trimmed to ALERT_HISTORY_SIZE rows
+        '''
+        CREATE TABLE IF NOT EXISTS alert_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_id INTEGER NOT NULL,
+            rule_name TEXT NOT NULL,
+            location_id INTEGER NOT NULL,
+            record_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            condition TEXT NOT NULL,
+            state TEXT NOT NULL,
+            value REAL NOT NULL,
+            threshold REAL NOT NULL,
+            timestamp DATETIME NOT NULL
+        )
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
 
-    conn.commit()
-    conn.close()
-    print(f"Database initialized at {DB_PATH}")
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not accept bound parameters
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Applied migration %s: %s", version, description)
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on `path` (created if missing) for the block."""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def init_db():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    # Every worker runs this at startup; the lock makes the rest wait for the
+    # first one's migrations instead of racing it
+    with file_lock(f"{DB_PATH}.lock"):
+        conn = sqlite3.connect(DB_PATH, isolation_level=None, timeout=30)
+        try:
+            # WAL is persistent, so pooled connections never have to switch modes concurrently
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = migrate(conn)
+        finally:
+            conn.close()
+    logger.info("Database initialized at %s (schema version %s)", DB_PATH, version)
+    return version
 
 if __name__ == "__main__":
-    init_db()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(f"Database at {DB_PATH} is at schema version {init_db()}")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # Location Schemas
 class LocationBase(BaseModel):
@@ -19,6 +19,9 @@ class Location(LocationBase):
     class Config:
         from_attributes = True
 
+class NearbyLocation(Location):
+    distance_km: float
+
 # Pollution Schemas
 class PollutionRecordBase(BaseModel):
     location_id: int
@@ -27,6 +30,9 @@ class PollutionRecordBase(BaseModel):
     pm10: Optional[float] = None
     co: Optional[float] = None
     no2: Optional[float] = None
+    # Weather observed alongside the reading (WAQI `t`/`h`); ML training targets
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
 
 class PollutionRecordCreate(PollutionRecordBase):
     pass
@@ -38,6 +44,82 @@ class PollutionRecord(PollutionRecordBase):
     class Config:
         from_attributes = True
 
+class BulkIngestError(BaseModel):
+    index: int
+    error: str
+
+class BulkIngestResult(BaseModel):
+    inserted: int
+    ids: List[int]
+    errors: List[BulkIngestError]
+
+class AggregatePoint(BaseModel):
+    bucket_start: datetime
+    samples: int
+    aqi_avg: Optional[float] = None
+    aqi_min: Optional[float] = None
+    aqi_max: Optional[float] = None
+    aqi_p50: Optional[float] = None
+    aqi_p95: Optional[float] = None
+    pm25_avg: Optional[float] = None
+    pm25_min: Optional[float] = None
+    pm25_max: Optional[float] = None
+    pm10_avg: Optional[float] = None
+    pm10_min: Optional[float] = None
+    pm10_max: Optional[float] = None
+    co_avg: Optional[float] = None
+    co_min: Optional[float] = None
+    co_max: Optional[float] = None
+    no2_avg: Optional[float] = None
+    no2_min: Optional[float] = None
+    no2_max: Optional[float] = None
+
+class AggregateResult(BaseModel):
+    location_id: int
+    bucket: str
+    points: List[AggregatePoint]
+
+# Alert Schemas
+class AlertRuleBase(BaseModel):
+    name: str
+    # None applies the rule to every location
+    location_id: Optional[int] = None
+    metric: str = Field("aqi", pattern="^(aqi|pm25|pm10|co|no2)$")
+    # "above": rolling mean of the last window_size readings >= threshold;
+    # "rise": that mean minus the one of the window_size readings before it >= threshold
+    condition: str = Field("above", pattern="^(above|rise)$")
+    threshold: float
+    # Resolves once the level drops below this (defaults to threshold)
+    clear_threshold: Optional[float] = None
+    window_size: int = Field(1, ge=1, le=1000)
+    cooldown_seconds: float = Field(3600, ge=0)
+    sink: str = "log"
+    # Webhook URL for the "webhook" sink
+    target: Optional[str] = None
+
+class AlertRuleCreate(AlertRuleBase):
+    pass
+
+class AlertRule(AlertRuleBase):
+    id: int
+    clear_threshold: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class Alert(BaseModel):
+    rule_id: int
+    rule_name: str
+    location_id: int
+    record_id: int
+    metric: str
+    condition: str
+    state: str
+    value: float
+    threshold: float
+    timestamp: datetime
+
 # Weather Prediction Schemas
 class WeatherPredictionBase(BaseModel):
     location_id: int
@@ -45,9 +127,33 @@ class WeatherPredictionBase(BaseModel):
     predicted_humidity: float
     condition: str
 
+class WeatherBatchRequest(BaseModel):
+    # None predicts for every location that has a reading
+    location_ids: Optional[List[int]] = None
+
 class WeatherPrediction(WeatherPredictionBase):
     id: int
     timestamp: datetime
 
     class Config:
         from_attributes = True
+
+# Latest State Schemas
+class LatestReading(BaseModel):
+    location_id: int
+    name: str
+    city: str
+    country: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    record_id: Optional[int] = None
+    aqi: Optional[int] = None
+    pm25: Optional[float] = None
+    pm10: Optional[float] = None
+    co: Optional[float] = None
+    no2: Optional[float] = None
+    timestamp: Optional[datetime] = None
+    predicted_temp: Optional[float] = None
+    predicted_humidity: Optional[float] = None
+    condition: Optional[str] = None
+    prediction_timestamp: Optional[datetime] = None
@@ -1,27 +1,79 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from .api import locations, pollution, ai
-from .db import init_db
+from fastapi import FastAPI, HTTPException, Response
+from .api import locations, pollution, ai, alerts
+from .db import init_db, database
+from .services.external_pollution import external_pollution_service
+from .services.refresh_scheduler import refresh_scheduler
+from .services.executors import archive_executor, genai_executor, ml_executor
+from .services.genai_cache import genai_cache
+from .services.rollup_service import rollup_service
+from .services.archive_service import archive_service
+from .services.weather_trainer import weather_trainer
+from .services.ml_service import weather_service
+from .services.leader import leader_election
+from .services.pubsub import reading_bus
+from .services.alert_service import alert_engine
+from .services.resource_versions import resource_versions
+from .services.loop_monitor import loop_monitor
 from .utils.errors import global_exception_handler, http_exception_handler
+from .utils.log_config import configure_logging
+from .utils.metrics import CONTENT_TYPE, MetricsMiddleware, registry
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (queued; file and console writes happen off the event loop)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+def _log_warmup_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Weather model warm-up failed: {task.exception()}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Every worker migrates at startup; a file lock lets the first one do the work
+    init_db.init_db()
+    loop_monitor.start()
+    # Open the shared SQLite connection pool and WAQI client once for the whole process
+    await database.pool.open()
+    # Roll up anything written before the rollup tables existed (or by an older build)
+    await rollup_service.catch_up()
+    # Serve the newest trained weather model version; otherwise load the
+    # bootstrap model file on the ML pool instead of delaying startup
+    if await weather_trainer.load_latest() is None:
+        warmup = asyncio.create_task(ml_executor.run(weather_service.warm))
+        warmup.add_done_callback(_log_warmup_failure)
+    await external_pollution_service.start()
+    # ETags of read endpoints come from these in-memory versions
+    await resource_versions.load()
+    resource_versions.start()
+    # Background jobs, and alert evaluation over every worker's readings, run
+    # in one worker only; every worker follows its model updates
+    leader_election.start(refresh_scheduler, archive_service, weather_trainer, alert_engine)
+    weather_trainer.start_sync()
+    # Every worker tails readings written by the others for its stream subscribers
+    reading_bus.start()
+    yield
+    await reading_bus.stop()
+    await resource_versions.stop()
+    await weather_trainer.stop_sync()
+    await leader_election.stop()
+    await external_pollution_service.aclose()
+    genai_executor.shutdown()
+    ml_executor.shutdown()
+    archive_executor.shutdown()
+    await database.pool.close()
+    await loop_monitor.stop()
+
 app = FastAPI(
     title="AI Pollution Monitor API",
     description="REST API for monitoring pollution levels and predicting weather trends using AI.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -33,6 +85,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses for clients that accept gzip (SSE streams are left alone).
+# Level 3 is ~15x cheaper than the default 9 on multi-MB series for a similar size
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=3)
+
+# Outermost, so latency covers compression and CORS as well as the handler
+app.add_middleware(MetricsMiddleware)
+
 # Register Exception Handlers
 app.add_exception_handler(Exception, global_exception_handler)
 app.add_exception_handler(HTTPException, http_exception_handler)
@@ -41,15 +100,83 @@ app.add_exception_handler(HTTPException, http_exception_handler)
 app.include_router(locations.router)
 app.include_router(pollution.router)
 app.include_router(ai.router)
-
-# Mount Static Files
-app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
+app.include_router(alerts.router)
 
 @app.get("/api/health")
 async def health():
     return {"status": "ok"}
 
+@app.get("/api/db/stats")
+async def db_stats():
+    return database.pool.stats()
+
+@app.get("/api/waqi/stats")
+async def waqi_stats():
+    return external_pollution_service.stats()
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    return refresh_scheduler.stats()
+
+@app.get("/api/executors/stats")
+async def executor_stats():
+    return {"genai": genai_executor.stats(), "ml": ml_executor.stats(), "archive": archive_executor.stats()}
+
+@app.get("/api/archive/stats")
+async def archive_stats():
+    return archive_service.stats()
+
+@app.get("/api/ml/stats")
+async def ml_stats():
+    return weather_trainer.stats()
+
+@app.get("/api/leader/stats")
+async def leader_stats():
+    return leader_election.stats()
+
+@app.get("/api/stream/stats")
+async def stream_stats():
+    return reading_bus.stats()
+
+@app.get("/api/alerts/stats")
+async def alerts_stats():
+    return alert_engine.stats()
+
+@app.get("/api/cache/stats")
+async def http_cache_stats():
+    return resource_versions.stats()
+
+@app.get("/api/genai/cache/stats")
+async def genai_cache_stats():
+    return genai_cache.stats()
+
+@app.get("/api/loop/stats")
+async def loop_stats():
+    return loop_monitor.stats()
+
+# The stats endpoints above, exported as gauges alongside the request/query histograms
+for prefix, stats in (
+    ("db_pool", database.pool.stats),
+    ("waqi", external_pollution_service.stats),
+    ("scheduler", refresh_scheduler.stats),
+    ("archive", archive_service.stats),
+    ("ml_trainer", weather_trainer.stats),
+    ("leader", leader_election.stats),
+    ("stream", reading_bus.stats),
+    ("alerts", alert_engine.stats),
+    ("http_cache", resource_versions.stats),
+    ("genai_cache", genai_cache.stats),
+    ("event_loop", loop_monitor.stats),
+):
+    registry.register_stats(prefix, stats)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+# Mount Static Files (last, so the catch-all mount doesn't shadow API routes)
+app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
+
 if __name__ == "__main__":
-    # Ensure DB is initialized before starting
-    init_db.init_db()
+    # Development server (auto-reload); see app/server.py for production
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
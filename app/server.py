@@ -0,0 +1,38 @@
+"""Production entry point: N uvicorn worker processes sharing one database.
+
+    python -m app.server --workers 4 --port 8000
+
+Each worker runs the app lifespan (migrations under a file lock, its own
+connection pool); background jobs run in whichever worker wins the leader
+election (see app/services/leader.py).
+"""
+import argparse
+import os
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Same variable gunicorn/uvicorn deployments conventionally use
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers),
+        proxy_headers=True,
+        # Per-request access lines cost throughput; app logging is unaffected
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
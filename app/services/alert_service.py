@@ -0,0 +1,486 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+import httpx
+from ..db import database
+
+logger = logging.getLogger(__name__)
+
+# Alerts kept in alert_history for GET /alerts/recent
+ALERT_HISTORY_SIZE = int(os.getenv("ALERT_HISTORY_SIZE", "200"))
+# How often the evaluating worker reloads alert_rules to pick up changes made by another worker
+ALERT_RULES_SYNC_SECONDS = float(os.getenv("ALERT_RULES_SYNC_SECONDS", "30"))
+# How often the evaluating worker picks up readings written by other workers
+ALERT_POLL_SECONDS = float(os.getenv("ALERT_POLL_SECONDS", "1"))
+ALERT_POLL_BATCH = 1000
+# Default destination for the webhook sink; a rule's `target` overrides it
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+# Hosts a rule's `target` may point at (comma-separated); defaults to the
+# ALERT_WEBHOOK_URL host, so rule authors can't make the server call anything else
+ALERT_WEBHOOK_HOSTS = os.getenv("ALERT_WEBHOOK_HOSTS")
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("ALERT_WEBHOOK_TIMEOUT", "5"))
+ALERT_SINK_QUEUE_SIZE = 1000
+
+RULES_QUERY = "SELECT * FROM alert_rules ORDER BY id"
+HISTORY_FIELDS = ("rule_id", "rule_name", "location_id", "record_id", "metric", "condition", "state",
+                  "value", "threshold", "timestamp")
+RECENT_QUERY = f"SELECT {', '.join(HISTORY_FIELDS)} FROM alert_history ORDER BY id DESC LIMIT ?"
+
+
+class LogSink:
+    """Writes alerts to the application log."""
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, alert: dict):
+        self.sent += 1
+        logger.warning(
+            f"Alert {alert['state']}: rule {alert['rule_id']} ({alert['rule_name']}) location {alert['location_id']} "
+            f"{alert['metric']} ({alert['condition']}) at {alert['value']:.2f}, threshold {alert['threshold']}"
+        )
+
+    def stats(self) -> dict:
+        return {"sent": self.sent}
+
+
+class QueueSink:
+    """Bounded in-process queue of alerts for local consumers and tests (oldest dropped when full)."""
+
+    def __init__(self, maxsize: int = ALERT_SINK_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, alert: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(alert)
+        self.sent += 1
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "dropped": self.dropped, "pending": self.queue.qsize()}
+
+
+def _allowed_hosts(hosts: Optional[str], url: Optional[str]) -> Set[str]:
+    if hosts:
+        return {host.strip().lower() for host in hosts.split(",") if host.strip()}
+    if url:
+        return {httpx.URL(url).host.lower()}
+    return set()
+
+
+class WebhookSink:
+    """POSTs each alert as JSON to the rule's `target` URL (or ALERT_WEBHOOK_URL).
+
+    send() only enqueues; a background task does the HTTP calls, so a slow
+    or failing receiver never holds up an insert. Targets must be http(s)
+    URLs on an allowed host; they are checked when a rule is created and
+    again before each delivery, and redirects are not followed.
+    """
+
+    def __init__(self, url: Optional[str] = ALERT_WEBHOOK_URL, timeout: float = ALERT_WEBHOOK_TIMEOUT,
+                 maxsize: int = ALERT_SINK_QUEUE_SIZE, allowed_hosts: Optional[str] = ALERT_WEBHOOK_HOSTS):
+        self.url = url
+        self.allowed_hosts = _allowed_hosts(allowed_hosts, url)
+        self.timeout = timeout
+        self._queue: Deque[dict] = deque()
+        self.maxsize = maxsize
+        self._ready = asyncio.Event()
+        self._task = None
+        self._stats = {"sent": 0, "failed": 0, "dropped": 0}
+
+    def target_error(self, target: str) -> Optional[str]:
+        """Why a rule's `target` URL may not be used, or None if it may."""
+        try:
+            url = httpx.URL(target)
+        except (httpx.InvalidURL, TypeError, ValueError):
+            return "`target` is not a valid URL"
+        if url.scheme not in ("http", "https"):
+            return "`target` must be an http or https URL"
+        if url.host.lower() not in self.allowed_hosts:
+            return "`target` host is not allowed (see ALERT_WEBHOOK_HOSTS)"
+        return None
+
+    def send(self, alert: dict):
+        if len(self._queue) >= self.maxsize:
+            self._queue.popleft()
+            self._stats["dropped"] += 1
+        self._queue.append(alert)
+        self._ready.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=False) as client:
+            while True:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                alert = self._queue.popleft()
+                target = alert.get("target")
+                url = target or self.url
+                try:
+                    if not url:
+                        raise ValueError("no webhook URL configured")
+                    # Rules stored before the allowlist (or since narrowed) are refused here
+                    error = self.target_error(target) if target else None
+                    if error:
+                        raise ValueError(error)
+                    response = await client.post(url, json=alert)
+                    response.raise_for_status()
+                    self._stats["sent"] += 1
+                except Exception as e:
+                    self._stats["failed"] += 1
+                    logger.error(f"Alert webhook delivery failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending": len(self._queue)}
+
+
+class Rule:
+    __slots__ = ("id", "name", "location_id", "metric", "condition", "threshold", "clear_threshold",
+                 "window_size", "cooldown_seconds", "sink", "target", "signature")
+
+    def __init__(self, row):
+        for field in self.__slots__[:-1]:
+            setattr(self, field, row[field])
+        # Rolling state is kept across rule reloads only while the rule is unchanged
+        self.signature = tuple(row[field] for field in self.__slots__[:-1])
+
+
+class RuleState:
+    """Rolling window for one (rule, location): O(1) work and memory per reading.
+
+    `recent` holds the last `window` values and `prior` the `window` before
+    them, each with a running sum, so both means are available without
+    looking at history.
+    """
+
+    __slots__ = ("window", "recent", "recent_sum", "prior", "prior_sum", "firing", "notified", "last_notified")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.recent: Deque[float] = deque()
+        self.recent_sum = 0.0
+        self.prior: Deque[float] = deque()
+        self.prior_sum = 0.0
+        self.firing = False
+        # Whether the current firing episode was sent (resolutions follow it)
+        self.notified = False
+        self.last_notified = None
+
+    def push(self, value: float, track_prior: bool):
+        if len(self.recent) == self.window:
+            moved = self.recent.popleft()
+            self.recent_sum -= moved
+            if track_prior:
+                if len(self.prior) == self.window:
+                    self.prior_sum -= self.prior.popleft()
+                self.prior.append(moved)
+                self.prior_sum += moved
+        self.recent.append(value)
+        self.recent_sum += value
+
+    def level(self, condition: str) -> Optional[float]:
+        """Rolling mean ("above") or its rise over the previous window ("rise"); None until filled."""
+        if len(self.recent) < self.window:
+            return None
+        if condition == "above":
+            return self.recent_sum / self.window
+        if len(self.prior) < self.window:
+            return None
+        return (self.recent_sum - self.prior_sum) / self.window
+
+
+class AlertEngine:
+    """Evaluates alert rules against every committed reading.
+
+    Rules are held in memory, indexed by location (plus a wildcard set for
+    rules covering every location), and each (rule, location) pair keeps a
+    RuleState, so a reading costs a dict lookup and a few float operations
+    per matching rule and history is never queried. A rule fires once when
+    its level reaches `threshold` and resolves when it drops below
+    `clear_threshold` (hysteresis); while firing it stays quiet (dedup), and
+    a new firing within `cooldown_seconds` of the last notification is
+    recorded but not sent. Alerts go to the rule's sink; sinks must not
+    block (see register_sink), and are saved to alert_history.
+
+    Windows, hysteresis and cooldowns only hold if one process sees every
+    reading in order, so the engine is a leader job (see leader.py): the
+    leader evaluates its own inserts as they commit and tails
+    pollution_records for everyone else's, in id order like ReadingBus.
+    Other workers only validate rules. Windows start empty when a worker
+    takes over.
+    """
+
+    def __init__(self, sync_interval: float = ALERT_RULES_SYNC_SECONDS, history_size: int = ALERT_HISTORY_SIZE,
+                 poll_interval: float = ALERT_POLL_SECONDS):
+        self.sync_interval = sync_interval
+        self.history_size = history_size
+        self.poll_interval = poll_interval
+        self._rules: Dict[int, Rule] = {}
+        self._by_location: Dict[Optional[int], List[Rule]] = {}
+        self._states: Dict[Tuple[int, int], RuleState] = {}
+        self._sinks = {"log": LogSink(), "queue": QueueSink(), "webhook": WebhookSink()}
+        # Raised alerts not yet written to alert_history
+        self._unsaved: Deque[dict] = deque(maxlen=history_size)
+        self._task = None
+        # Highest reading id evaluated (None until this worker leads)
+        self._last_id: Optional[int] = None
+        self._synced_at = 0.0
+        self._stats = {
+            "readings_evaluated": 0,
+            "rule_checks": 0,
+            "fired": 0,
+            "resolved": 0,
+            "suppressed": 0,
+            "sink_errors": 0,
+            "tailed": 0,
+            "eval_seconds": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def sink_names(self) -> List[str]:
+        return list(self._sinks)
+
+    def sink(self, name: str):
+        return self._sinks[name]
+
+    def register_sink(self, name: str, sink):
+        """Add or replace a sink: any object with a non-blocking send(alert: dict), optionally start()/stop()/stats()."""
+        self._sinks[name] = sink
+
+    def _index(self):
+        by_location: Dict[Optional[int], List[Rule]] = {}
+        for rule in self._rules.values():
+            by_location.setdefault(rule.location_id, []).append(rule)
+        self._by_location = by_location
+        self._states = {key: state for key, state in self._states.items() if key[0] in self._rules}
+
+    def set_rules(self, rows):
+        """Replace the rule set; windows of rules that did not change are kept."""
+        rules = {}
+        for row in rows:
+            rule = Rule(row)
+            current = self._rules.get(rule.id)
+            if current is not None and current.signature != rule.signature:
+                self._states = {key: state for key, state in self._states.items() if key[0] != rule.id}
+            rules[rule.id] = rule
+        self._rules = rules
+        self._index()
+
+    def add_rule(self, row):
+        self._rules[row['id']] = Rule(row)
+        self._index()
+
+    def remove_rule(self, rule_id: int):
+        if self._rules.pop(rule_id, None) is not None:
+            self._index()
+
+    def remove_location(self, location_id: int):
+        # alert_rules rows for the location are deleted by a trigger
+        self._rules = {rule_id: rule for rule_id, rule in self._rules.items() if rule.location_id != location_id}
+        self._index()
+        self._states = {key: state for key, state in self._states.items() if key[1] != location_id}
+
+    async def load(self):
+        self.set_rules(await database.fetch_rows(RULES_QUERY))
+        self._synced_at = time.monotonic()
+
+    def publish(self, rows):
+        """Evaluate rows this worker just committed, if it is the evaluating worker (never blocks).
+
+        Only a batch directly following the last evaluated id is taken here;
+        anything else is left to the tail, so rows are evaluated once, in order.
+        """
+        if not rows or self._task is None or self._last_id is None:
+            return
+        if rows[0]['id'] != self._last_id + 1:
+            return
+        self._last_id = rows[-1]['id']
+        self.evaluate(rows)
+
+    def evaluate(self, rows):
+        """Check pollution_records rows, in id order, against the rules."""
+        by_location = self._by_location
+        if not by_location or not rows:
+            return
+        started = time.perf_counter()
+        now = time.monotonic()
+        wildcard = by_location.get(None, ())
+        states = self._states
+        checks = 0
+        for row in rows:
+            location_id = row['location_id']
+            for rules in (by_location.get(location_id, ()), wildcard):
+                for rule in rules:
+                    value = row[rule.metric]
+                    if value is None:
+                        continue
+                    checks += 1
+                    key = (rule.id, location_id)
+                    state = states.get(key)
+                    if state is None:
+                        state = states[key] = RuleState(rule.window_size)
+                    state.push(value, rule.condition == "rise")
+                    level = state.level(rule.condition)
+                    if level is None:
+                        continue
+                    if not state.firing and level >= rule.threshold:
+                        state.firing = True
+                        self._stats["fired"] += 1
+                        if state.last_notified is not None and now - state.last_notified < rule.cooldown_seconds:
+                            state.notified = False
+                            self._stats["suppressed"] += 1
+                            continue
+                        state.notified = True
+                        state.last_notified = now
+                        self._notify(rule, row, "firing", level)
+                    elif state.firing and level < rule.clear_threshold:
+                        state.firing = False
+                        self._stats["resolved"] += 1
+                        if state.notified:
+                            self._notify(rule, row, "resolved", level)
+        self._stats["readings_evaluated"] += len(rows)
+        self._stats["rule_checks"] += checks
+        self._stats["eval_seconds"] += time.perf_counter() - started
+
+    def _notify(self, rule: Rule, row, state: str, level: float):
+        alert = {
+            "rule_id": rule.id,
+            "rule_name": rule.name,
+            "location_id": row['location_id'],
+            "record_id": row['id'],
+            "metric": rule.metric,
+            "condition": rule.condition,
+            "state": state,
+            "value": level,
+            "threshold": rule.threshold if state == "firing" else rule.clear_threshold,
+            "timestamp": row['timestamp'],
+            "target": rule.target,
+        }
+        self._unsaved.append(alert)
+        sink = self._sinks.get(rule.sink)
+        try:
+            if sink is None:
+                raise KeyError(f"unknown sink {rule.sink!r}")
+            sink.send(alert)
+        except Exception as e:
+            self._stats["sink_errors"] += 1
+            logger.error(f"Alert sink {rule.sink} failed: {str(e)}")
+
+    def start(self):
+        for sink in self._sinks.values():
+            if hasattr(sink, "start"):
+                sink.start()
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._last_id = None
+        try:
+            await self._save()
+        except Exception as e:
+            logger.error(f"Saving alert history failed: {str(e)}")
+        for sink in self._sinks.values():
+            if hasattr(sink, "stop"):
+                await sink.stop()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Alert evaluation tail failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self):
+        """Evaluate readings committed by other workers, then save raised alerts."""
+        if self._last_id is None:
+            # Taking over: evaluate from "now" with the current rules
+            await self.load()
+            row = await database.fetch_one("SELECT COALESCE(MAX(id), 0) AS id FROM pollution_records")
+            self._last_id = row['id']
+            return
+        if self.sync_interval > 0 and time.monotonic() - self._synced_at >= self.sync_interval:
+            await self.load()
+        while True:
+            rows = await database.fetch_rows(
+                "SELECT * FROM pollution_records WHERE id > ? ORDER BY id LIMIT ?",
+                (self._last_id, ALERT_POLL_BATCH)
+            )
+            # Local publishes may have moved the watermark while we were reading
+            unseen = [row for row in rows if row['id'] > self._last_id]
+            if unseen:
+                self._last_id = unseen[-1]['id']
+                self._stats["tailed"] += len(unseen)
+                self.evaluate(unseen)
+            if len(rows) < ALERT_POLL_BATCH:
+                break
+        await self._save()
+
+    async def _save(self):
+        if not self._unsaved:
+            return
+        alerts = list(self._unsaved)
+        self._unsaved.clear()
+        async with database.pool.writer() as db:
+            await db.executemany(
+                f"INSERT INTO alert_history ({', '.join(HISTORY_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in HISTORY_FIELDS)})",
+                [tuple(alert[field] for field in HISTORY_FIELDS) for alert in alerts]
+            )
+            await db.execute(
+                "DELETE FROM alert_history WHERE id <= (SELECT MAX(id) FROM alert_history) - ?",
+                (self.history_size,)
+            )
+
+    async def recent(self, limit: int) -> List[dict]:
+        """Alerts raised by whichever worker evaluated them, newest first."""
+        return [dict(row) for row in await database.fetch_rows(RECENT_QUERY, (limit,))]
+
+    def stats(self) -> dict:
+        evaluated = self._stats["readings_evaluated"]
+        return {
+            **self._stats,
+            "evaluating": self.running,
+            "last_evaluated_id": self._last_id,
+            "rules": len(self._rules),
+            "windows": len(self._states),
+            "firing": sum(1 for state in self._states.values() if state.firing),
+            "eval_us_per_reading": round(self._stats["eval_seconds"] / evaluated * 1e6, 2) if evaluated else 0.0,
+            "sinks": {name: sink.stats() for name, sink in self._sinks.items() if hasattr(sink, "stats")},
+        }
+
+
+alert_engine = AlertEngine()
@@ -0,0 +1,279 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from ..db import database
+from .executors import archive_executor
+from .rollup_service import rollup_service
+
+logger = logging.getLogger(__name__)
+
+# Raw readings younger than this stay in SQLite; 0 disables archiving
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(database.DB_PATH), "archive"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Rows moved per SQLite transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+# pyarrow is optional; without it nothing is archived and reads stay SQLite-only
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+RECORD_FIELDS = ("id", "location_id", "aqi", "pm25", "pm10", "co", "no2", "temperature", "humidity", "timestamp")
+# Arrow type names per archived column; columns added later read back as null from older files
+ARCHIVE_TYPES = {
+    "id": "int64", "aqi": "int64", "pm25": "float64", "pm10": "float64", "co": "float64",
+    "no2": "float64", "temperature": "float64", "humidity": "float64", "timestamp": "string",
+}
+
+# Oldest rows past the cutoff first: (cutoff, batch size)
+BATCH_QUERY = f"""
+    SELECT {', '.join(RECORD_FIELDS)} FROM pollution_records
+    WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?
+"""
+
+
+def _archive_schema(*partition_fields):
+    import pyarrow as pa
+
+    return pa.schema(
+        [(name, ARCHIVE_TYPES[name]) for name in RECORD_FIELDS if name != "location_id"] + list(partition_fields)
+    )
+
+
+class ArchiveService:
+    """Moves raw pollution records older than the retention window to Parquet.
+
+    Files are laid out as `location_id=<id>/month=<YYYY-MM>/part-<ids>.parquet`
+    (hive partitioning), written once and never rewritten. A batch is deleted
+    from SQLite only after its files are on disk, and archive_state records the
+    newest archived timestamp so history reads know when to consult the archive.
+    Aggregates need no archive access: rollups are brought up to date before
+    any raw row leaves SQLite.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, retention_days: float = RETENTION_DAYS,
+                 interval: float = ARCHIVE_INTERVAL_SECONDS, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.root = root
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self._stats = {
+            "runs": 0,
+            "rows_archived": 0,
+            "files_written": 0,
+            "archive_reads": 0,
+            "last_run_started": None,
+            "last_run_seconds": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0 and PYARROW_AVAILABLE
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.retention_days <= 0:
+            logger.info("Archiving disabled (RETENTION_DAYS <= 0)")
+            return
+        if not PYARROW_AVAILABLE:
+            logger.warning("Archiving disabled (pyarrow is not installed)")
+            return
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Archive run failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Archive every record older than the retention window, one batch per transaction."""
+        started = time.perf_counter()
+        self._stats["runs"] += 1
+        self._stats["last_run_started"] = datetime.now(timezone.utc).isoformat()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+        # Rollups must include every row before it leaves SQLite
+        await rollup_service.catch_up()
+
+        archived = 0
+        while True:
+            rows = await database.fetch_rows(BATCH_QUERY, (cutoff, self.batch_size))
+            if not rows:
+                break
+            records = [tuple(row) for row in rows]
+            # Files first: a crash before the delete re-archives the same batch
+            # under the same file names on the next run
+            self._stats["files_written"] += await archive_executor.run(self._write_batch, records)
+
+            ids = [record[0] for record in records]
+            newest = records[-1][-1]
+            async with database.pool.writer() as db:
+                await db.execute(
+                    f"DELETE FROM pollution_records WHERE id IN ({', '.join('?' for _ in ids)})", ids
+                )
+                await db.execute(
+                    "UPDATE archive_state SET archived_through = MAX(COALESCE(archived_through, ''), ?), "
+                    "archived_rows = archived_rows + ? WHERE name = 'pollution'",
+                    (newest, len(ids))
+                )
+            archived += len(ids)
+            self._stats["rows_archived"] += len(ids)
+            if len(records) < self.batch_size:
+                break
+
+        self._stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+        if archived:
+            logger.info(f"Archived {archived} pollution records older than {cutoff}")
+        return archived
+
+    def _write_batch(self, records) -> int:
+        # Runs on the archive executor
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        partitions = {}
+        for record in records:
+            partitions.setdefault((record[1], record[-1][:7]), []).append(record)
+
+        for (location_id, month), rows in partitions.items():
+            directory = os.path.join(self.root, f"location_id={location_id}", f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            columns = dict(zip(RECORD_FIELDS, zip(*rows)))
+            del columns["location_id"]
+            table = pa.table(
+                {name: pa.array(values, pa.type_for_alias(ARCHIVE_TYPES[name])) for name, values in columns.items()},
+                schema=_archive_schema(),
+            )
+            ids = columns["id"]
+            path = os.path.join(directory, f"part-{min(ids)}-{max(ids)}.parquet")
+            # Dot-prefixed temp files are ignored by dataset discovery
+            temp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+            pq.write_table(table, temp_path, compression="zstd")
+            os.replace(temp_path, path)
+        return len(partitions)
+
+    def _months(self, location_id) -> list:
+        """Archived files grouped by month partition, newest month first."""
+        if location_id is not None:
+            locations = [os.path.join(self.root, f"location_id={location_id}")]
+        elif os.path.isdir(self.root):
+            locations = [entry.path for entry in os.scandir(self.root)
+                         if entry.is_dir() and entry.name.startswith("location_id=")]
+        else:
+            locations = []
+        months = {}
+        for location in locations:
+            if not os.path.isdir(location):
+                continue
+            for entry in os.scandir(location):
+                if not (entry.is_dir() and entry.name.startswith("month=")):
+                    continue
+                # Dot-prefixed temp files are skipped, as dataset discovery would
+                files = [part.path for part in os.scandir(entry.path)
+                         if part.name.endswith(".parquet") and not part.name.startswith(".")]
+                months.setdefault(entry.name[len("month="):], []).extend(files)
+        return sorted(months.items(), reverse=True)
+
+    def _read(self, location_id, since, until, after, limit, floor=None) -> list:
+        # Runs on the archive executor
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        partition_fields = [("location_id", pa.int64()), ("month", pa.string())]
+        partitioning = ds.partitioning(pa.schema(partition_fields), flavor="hive")
+        schema = _archive_schema(*partition_fields)
+        filesystem = fs.LocalFileSystem(use_mmap=True)
+
+        timestamp, record_id = ds.field("timestamp"), ds.field("id")
+        conditions = []
+        if since is not None:
+            conditions.append(timestamp >= since)
+        if floor is not None:
+            # Older archived rows would sort below a full hot page
+            conditions.append(timestamp >= floor)
+        if until is not None:
+            conditions.append(timestamp <= until)
+        if after is not None:
+            conditions.append((timestamp < after[0]) | ((timestamp == after[0]) & (record_id < after[1])))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        # Months outside these bounds are never opened
+        oldest = max((bound[:7] for bound in (since, floor) if bound is not None), default=None)
+        newest = min((bound[:7] for bound in (until, after and after[0]) if bound), default=None)
+
+        # A month holds exactly the rows whose timestamp starts with it, so
+        # visiting months newest first yields rows in page order: only the
+        # months a page reaches are scanned and sorted, never the whole archive
+        rows = []
+        for month, files in self._months(location_id):
+            if newest is not None and month > newest:
+                continue
+            if oldest is not None and month < oldest:
+                break
+            if not files:
+                continue
+            dataset = ds.dataset(files, format="parquet", partitioning=partitioning, partition_base_dir=self.root,
+                                 schema=schema, filesystem=filesystem)
+            table = dataset.scanner(columns=list(RECORD_FIELDS), filter=expression).to_table()
+            if table.num_rows == 0:
+                continue
+            order = pc.sort_indices(table, [("timestamp", "descending"), ("id", "descending")])
+            rows += table.take(order[:limit - len(rows)]).to_pylist()
+            if len(rows) >= limit:
+                break
+        return [{field: row[field] for field in RECORD_FIELDS} for row in rows]
+
+    async def read_history(self, location_id: Optional[int], since: Optional[str], until: Optional[str],
+                           after: Optional[tuple], limit: int, hot_oldest: Optional[str] = None) -> list:
+        """Archived records matching a history query, newest first; [] when the range is all hot.
+
+        `hot_oldest` is the timestamp of the oldest row of a full page already
+        read from SQLite: archived rows older than it can't make the page.
+        """
+        if not PYARROW_AVAILABLE:
+            return []
+        state = await database.fetch_one("SELECT archived_through FROM archive_state WHERE name = 'pollution'")
+        newest_archived = state['archived_through'] if state else None
+        if newest_archived is None:
+            return []
+        if since is not None and since > newest_archived:
+            return []
+        if hot_oldest is not None and hot_oldest > newest_archived:
+            return []
+        self._stats["archive_reads"] += 1
+        return await archive_executor.run(self._read, location_id, since, until, after, limit, hot_oldest)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "running": self.running,
+            "retention_days": self.retention_days,
+            "root": self.root,
+        }
+
+
+archive_service = ArchiveService()
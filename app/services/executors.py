@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusyError(RuntimeError):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool for blocking calls made from async code.
+
+    Keeps blocking work (Gemini SDK calls, sklearn predictions) off the event
+    loop. Submissions beyond `max_queue` waiting jobs are rejected instead of
+    piling up, every call has a timeout, and jobs whose caller gave up before
+    they started are never run.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = None
+        self._pending = set()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "run_seconds": 0.0,
+        }
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-exec")
+        return self._pool
+
+    def _call(self, job, fn, args, kwargs):
+        # Runs in the worker thread
+        self._pending.discard(job)
+        started = time.perf_counter()
+        waited = started - job[1]
+        with self._lock:
+            self._active += 1
+            self._stats["wait_seconds"] += waited
+            if waited > self._stats["max_wait_seconds"]:
+                self._stats["max_wait_seconds"] = waited
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._stats["run_seconds"] += time.perf_counter() - started
+
+    async def run(self, fn, *args, timeout: float = None, **kwargs):
+        if len(self._pending) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise ExecutorBusyError(f"{self.name} executor queue is full")
+
+        loop = asyncio.get_running_loop()
+        job = (object(), time.perf_counter())
+        self._pending.add(job)
+        self._stats["submitted"] += 1
+        future = loop.run_in_executor(self._get_pool(), functools.partial(self._call, job, fn, args, kwargs))
+        try:
+            result = await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            # Jobs cancelled before a worker picked them up never run
+            self._pending.discard(job)
+        self._stats["completed"] += 1
+        return result
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "max_workers": self.max_workers,
+            "queue_depth": len(self._pending),
+            "active": self._active,
+        }
+
+
+# Network-bound Gemini calls: many threads, generous timeout
+genai_executor = BoundedExecutor(
+    "genai",
+    max_workers=int(os.getenv("GENAI_WORKERS", "8")),
+    max_queue=int(os.getenv("GENAI_MAX_QUEUE", "64")),
+    timeout=float(os.getenv("GENAI_TIMEOUT_SECONDS", "30")),
+)
+
+# CPU-bound model work: one thread per core
+ml_executor = BoundedExecutor(
+    "ml",
+    max_workers=int(os.getenv("ML_WORKERS", str(os.cpu_count() or 2))),
+    max_queue=int(os.getenv("ML_MAX_QUEUE", "256")),
+    timeout=float(os.getenv("ML_TIMEOUT_SECONDS", "10")),
+)
+
+# Parquet archive reads/writes: file I/O plus Arrow compute
+archive_executor = BoundedExecutor(
+    "archive",
+    max_workers=int(os.getenv("ARCHIVE_WORKERS", "2")),
+    max_queue=int(os.getenv("ARCHIVE_MAX_QUEUE", "64")),
+    timeout=float(os.getenv("ARCHIVE_TIMEOUT_SECONDS", "120")),
+)
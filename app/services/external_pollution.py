@@ -1,80 +1,175 @@
+import asyncio
 import httpx
+import importlib.util
 import os
+import random
+import time
 from dotenv import load_dotenv
+from ..utils.metrics import registry
 
 load_dotenv(override=True)
 
 WAQI_TOKEN = os.getenv("WAQI_TOKEN")
+WAQI_BASE_URL = os.getenv("WAQI_BASE_URL", "https://api.waqi.info")
+
+# WAQI stations publish roughly hourly; serve cached readings inside this window
+WAQI_CACHE_TTL = float(os.getenv("WAQI_CACHE_TTL", "900"))
+WAQI_CACHE_MAX_ENTRIES = 2048
+WAQI_MAX_RETRIES = 3
+WAQI_BACKOFF_BASE = 0.5
+# Decimal places kept of geo lookups (~100 m); the rounded point is both the
+# cache key and what is requested, so every caller in a cell gets the same answer
+WAQI_GEO_PRECISION = 3
+
+# HTTP/2 needs the optional `h2` package (installed by httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# One observation per upstream attempt (retries included)
+WAQI_REQUEST_SECONDS = registry.histogram("waqi_request_seconds", "WAQI upstream request time", ("outcome",))
+
 
 class ExternalPollutionService:
-    async def fetch_real_time_pollution(self, lat: float, lon: float):
-        if not WAQI_TOKEN:
-            return {
-                "error": "WAQI_TOKEN not configured. Please set it in .env.",
-                "aqi": 50, # Mock data
-                "pm25": 12.5,
-                "pm10": 20.0,
-                "co": 0.4,
-                "no2": 15.0
-            }
+    """Client for the WAQI feed API.
 
-        url = f"https://api.waqi.info/feed/geo:{lat};{lon}/?token={WAQI_TOKEN}"
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url)
-                data = response.json()
-                
-                if data.get("status") == "ok":
-                    iaqi = data["data"]["iaqi"]
-                    return {
-                        "aqi": data["data"]["aqi"],
-                        "pm25": iaqi.get("pm25", {}).get("v", 0),
-                        "pm10": iaqi.get("pm10", {}).get("v", 0),
-                        "co": iaqi.get("co", {}).get("v", 0),
-                        "no2": iaqi.get("no2", {}).get("v", 0),
-                        "city": data["data"]["city"]["name"],
-                        "geo": data["data"]["city"]["geo"]
-                    }
-                else:
-                    return {"error": f"API Error: {data.get('data')}"}
-            except Exception as e:
-                return {"error": f"Connection Error: {str(e)}"}
+    One pooled keep-alive client is shared by all callers (opened and closed
+    by the app lifespan). Concurrent requests for the same city or geo key
+    share a single in-flight upstream call, and successful results are kept in
+    a TTL cache so repeated refreshes don't spend WAQI quota.
+    """
 
-    async def fetch_pollution_by_city(self, city_name: str):
-        if not WAQI_TOKEN:
+    def __init__(self, base_url: str = WAQI_BASE_URL, token: str = WAQI_TOKEN, cache_ttl: float = WAQI_CACHE_TTL):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.cache_ttl = cache_ttl
+        self._client = None
+        self._cache = {}
+        self._inflight = {}
+        self._stats = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "coalesced": 0,
+            "upstream_calls": 0,
+            "retries": 0,
+            "errors": 0,
+        }
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0),
+            )
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def _mock(self, **extra):
+        return {
+            "error": "WAQI_TOKEN not configured. Please set it in .env.",
+            "aqi": 50, # Mock data
+            "pm25": 12.5,
+            "pm10": 20.0,
+            "co": 0.4,
+            "no2": 15.0,
+            **extra
+        }
+
+    def _parse(self, data):
+        if data.get("status") == "ok":
+            iaqi = data["data"]["iaqi"]
             return {
-                "error": "WAQI_TOKEN not configured. Please set it in .env.",
-                "aqi": 50, # Mock data
-                "pm25": 12.5,
-                "pm10": 20.0,
-                "co": 0.4,
-                "no2": 15.0,
-                "city": city_name,
-                "geo": [0, 0]
+                "aqi": data["data"]["aqi"],
+                "pm25": iaqi.get("pm25", {}).get("v", 0),
+                "pm10": iaqi.get("pm10", {}).get("v", 0),
+                "co": iaqi.get("co", {}).get("v", 0),
+                "no2": iaqi.get("no2", {}).get("v", 0),
+                "temperature": iaqi.get("t", {}).get("v"),
+                "humidity": iaqi.get("h", {}).get("v"),
+                "city": data["data"]["city"]["name"],
+                "geo": data["data"]["city"]["geo"],
+                "time": data["data"].get("time", {}).get("iso")
             }
+        return {"error": f"API Error: {data.get('data')}"}
 
-        url = f"https://api.waqi.info/feed/{city_name}/?token={WAQI_TOKEN}"
-        
-        async with httpx.AsyncClient() as client:
+    async def _request(self, path: str):
+        await self.start()
+        url = f"{self.base_url}/feed/{path}/"
+        for attempt in range(WAQI_MAX_RETRIES + 1):
+            self._stats["upstream_calls"] += 1
+            started = time.perf_counter()
+            outcome = "error"
             try:
-                response = await client.get(url)
-                data = response.json()
-                
-                if data.get("status") == "ok":
-                    iaqi = data["data"]["iaqi"]
-                    return {
-                        "aqi": data["data"]["aqi"],
-                        "pm25": iaqi.get("pm25", {}).get("v", 0),
-                        "pm10": iaqi.get("pm10", {}).get("v", 0),
-                        "co": iaqi.get("co", {}).get("v", 0),
-                        "no2": iaqi.get("no2", {}).get("v", 0),
-                        "city": data["data"]["city"]["name"],
-                        "geo": data["data"]["city"]["geo"]
-                    }
-                else:
-                    return {"error": f"API Error: {data.get('data')}"}
+                response = await self._client.get(url, params={"token": self.token})
+                retryable = response.status_code == 429 or response.status_code >= 500
+                if not retryable:
+                    outcome = "ok" if response.status_code < 400 else "client_error"
+                    return self._parse(response.json())
+                outcome = "retryable"
+                error = {"error": f"API Error: HTTP {response.status_code}"}
+            except httpx.TransportError as e:
+                error = {"error": f"Connection Error: {str(e)}"}
             except Exception as e:
                 return {"error": f"Connection Error: {str(e)}"}
+            finally:
+                WAQI_REQUEST_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+            if attempt < WAQI_MAX_RETRIES:
+                self._stats["retries"] += 1
+                # Exponential backoff with full jitter
+                await asyncio.sleep(WAQI_BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5))
+        return error
+
+    async def _fetch(self, key: str, path: str):
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._stats["cache_hits"] += 1
+            return dict(cached[1])
+        self._stats["cache_misses"] += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(path))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        else:
+            self._stats["coalesced"] += 1
+
+        # Shield so one caller's cancellation doesn't abort the shared request
+        result = await asyncio.shield(task)
+        if "error" in result:
+            self._stats["errors"] += 1
+        else:
+            self._store(key, result)
+        return dict(result)
+
+    def _store(self, key, result):
+        if key not in self._cache and len(self._cache) >= WAQI_CACHE_MAX_ENTRIES:
+            # Drop the entry closest to expiry
+            oldest = min(self._cache, key=lambda k: self._cache[k][0])
+            del self._cache[oldest]
+        self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+
+    def invalidate(self, key: str = None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def stats(self) -> dict:
+        return {**self._stats, "cache_entries": len(self._cache), "inflight": len(self._inflight)}
+
+    async def fetch_real_time_pollution(self, lat: float, lon: float):
+        if not self.token:
+            return self._mock()
+        point = f"geo:{round(lat, WAQI_GEO_PRECISION)};{round(lon, WAQI_GEO_PRECISION)}"
+        return await self._fetch(point, point)
+
+    async def fetch_pollution_by_city(self, city_name: str):
+        if not self.token:
+            return self._mock(city=city_name, geo=[0, 0])
+        return await self._fetch(f"city:{city_name.strip().lower()}", city_name)
 
 external_pollution_service = ExternalPollutionService()
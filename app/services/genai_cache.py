@@ -0,0 +1,130 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from ..db import database
+
+GENAI_CACHE_TTL = float(os.getenv("GENAI_CACHE_TTL", "3600"))
+GENAI_CACHE_MEMORY_ITEMS = int(os.getenv("GENAI_CACHE_MEMORY_ITEMS", "512"))
+GENAI_CACHE_MAX_ROWS = int(os.getenv("GENAI_CACHE_MAX_ROWS", "10000"))
+# Expired/overflow rows are pruned from SQLite once every this many writes
+PRUNE_EVERY_WRITES = 100
+
+# Bump when prompt templates change so old responses stop matching
+PROMPT_VERSION = "1"
+
+
+def aqi_category(aqi) -> str:
+    if aqi is None:
+        return "unknown"
+    if aqi <= 50:
+        return "good"
+    if aqi <= 100:
+        return "moderate"
+    if aqi <= 150:
+        return "sensitive"
+    if aqi <= 200:
+        return "unhealthy"
+    if aqi <= 300:
+        return "very-unhealthy"
+    return "hazardous"
+
+
+def bucket(value, size) -> str:
+    return "none" if value is None else str(int(value // size))
+
+
+def make_key(kind: str, *parts) -> str:
+    raw = "|".join([PROMPT_VERSION, kind, *(str(part).strip().lower() for part in parts)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class GenAICache:
+    """Two-tier cache of generated GenAI text.
+
+    An in-process LRU answers repeat requests without I/O; the genai_cache
+    SQLite table keeps responses across restarts and between workers. Both
+    tiers honour the same TTL.
+    """
+
+    def __init__(self, ttl: float = GENAI_CACHE_TTL, memory_items: int = GENAI_CACHE_MEMORY_ITEMS,
+                 max_rows: int = GENAI_CACHE_MAX_ROWS):
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self._memory = OrderedDict()
+        self._writes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "saved_seconds": 0.0,
+        }
+
+    def _remember(self, key, expires_at, response, latency):
+        self._memory[key] = (expires_at, response, latency)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                self._stats["saved_seconds"] += entry[2]
+                return entry[1]
+            del self._memory[key]
+
+        row = await database.fetch_one(
+            "SELECT response, latency_seconds, expires_at FROM genai_cache WHERE key = ? AND expires_at > ?",
+            (key, now)
+        )
+        if row:
+            self._remember(key, row['expires_at'], row['response'], row['latency_seconds'])
+            self._stats["db_hits"] += 1
+            self._stats["saved_seconds"] += row['latency_seconds']
+            return row['response']
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, kind: str, response: str, latency: float):
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, expires_at, response, latency)
+        self._stats["stores"] += 1
+        self._writes += 1
+        prune = self._writes % PRUNE_EVERY_WRITES == 0
+        async with database.pool.writer() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO genai_cache (key, kind, response, latency_seconds, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, response, latency, now, expires_at)
+            )
+            if prune:
+                await db.execute("DELETE FROM genai_cache WHERE expires_at <= ?", (now,))
+                # Keep only the newest max_rows entries
+                await db.execute(
+                    "DELETE FROM genai_cache WHERE key IN ("
+                    "SELECT key FROM genai_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,)
+                )
+
+    def stats(self) -> dict:
+        hits = self._stats["memory_hits"] + self._stats["db_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "saved_seconds": round(self._stats["saved_seconds"], 3),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "miss_ratio": round(self._stats["misses"] / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+genai_cache = GenAICache()
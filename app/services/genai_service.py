@@ -1,28 +1,179 @@
-import google.generativeai as genai
+import asyncio
+import json
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from ..utils.metrics import registry
+from .executors import genai_executor, ExecutorBusyError
+from .genai_cache import genai_cache, make_key, aqi_category, bucket
 
 load_dotenv(override=True)
 
-# Configure Gemini
+logger = logging.getLogger(__name__)
+
+# Gemini is configured on first use (see GenAIService._get_model)
 api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key.strip())
+
+NOT_CONFIGURED = "GenAI integration is not configured. Please set GEMINI_API_KEY in .env."
+
+# Upstream generations only; cache hits and joined in-flight calls are not observed
+GENAI_REQUEST_SECONDS = registry.histogram(
+    "genai_request_seconds", "Gemini generation time", ("kind", "outcome"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+
+# Structured output for the combined dashboard call
+DASHBOARD_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "analysis": {"type": "string"},
+            "advice": {"type": "string"},
+        },
+        "required": ["analysis", "advice"],
+    },
+}
+
+
+class _Flight:
+    """One in-progress generation that any number of callers can follow.
+
+    Chunks are kept so late joiners replay the text produced so far before
+    receiving new chunks live.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.error = None
+        self.done = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def push(self, text):
+        if text:
+            self.chunks.append(text)
+            self._notify()
+
+    def finish(self, error=None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def follow(self):
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if self.error:
+                    yield self.error
+                return
+            await changed.wait()
+
+    async def result(self):
+        # Shield the shared task: one caller giving up must not cancel it for others
+        await asyncio.shield(self.task)
+        return self.error if self.error else "".join(self.chunks)
+
 
 class GenAIService:
     def __init__(self):
         # Using gemini-flash-latest which was confirmed to be available for this key
         # If it fails, we fall back to alternatives in the generate methods.
         self.model_name = 'gemini-flash-latest'
-        self.model = genai.GenerativeModel(self.model_name)
+        self._model = None
+        self._model_lock = threading.Lock()
+        # One shared generation per cache key while it is running
+        self._inflight = {}
+        self._coalesced = 0
 
     def _get_model(self):
-        return self.model
+        # The SDK takes about a second to import, so it is loaded by the first
+        # generation (on a GenAI worker thread) rather than at app startup
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
 
-    async def analyze_pollution(self, location_name, aqi, pm25, pm10):
-        if not api_key:
-            return "GenAI integration is not configured. Please set GEMINI_API_KEY in .env."
+                    genai.configure(api_key=api_key.strip())
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _stream_model(self, prompt, on_chunk, generation_config=None):
+        # Runs in a worker thread; hands each chunk over as Gemini produces it
+        kwargs = {"generation_config": generation_config} if generation_config else {}
+        for chunk in self._get_model().generate_content(prompt, stream=True, **kwargs):
+            on_chunk(chunk.text)
+
+    async def _produce(self, kind, key, prompt, flight, generation_config=None):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            # The SDK call blocks, so run it on the bounded GenAI thread pool
+            await genai_executor.run(
+                self._stream_model,
+                prompt,
+                lambda text: loop.call_soon_threadsafe(flight.push, text),
+                generation_config
+            )
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            flight.finish("GenAI request timed out. Please try again.")
+        except ExecutorBusyError:
+            outcome = "busy"
+            flight.finish("GenAI service is busy. Please try again shortly.")
+        except Exception as e:
+            flight.finish(f"Error communicating with GenAI: {str(e)}")
+        else:
+            outcome = "ok"
+            GENAI_REQUEST_SECONDS.labels(kind, outcome).observe(time.perf_counter() - started)
+            flight.finish()
+            # Only successful generations are cached
+            try:
+                await genai_cache.set(key, kind, "".join(flight.chunks), time.perf_counter() - started)
+            except Exception as e:
+                logger.warning(f"Could not cache GenAI response: {str(e)}")
+        finally:
+            if outcome != "ok":
+                GENAI_REQUEST_SECONDS.labels(kind, outcome).observe(time.perf_counter() - started)
+            self._inflight.pop(key, None)
+
+    def _join(self, kind, key, prompt, generation_config=None):
+        """Return the in-flight generation for key, starting one if needed."""
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._inflight[key] = flight
+            flight.task = asyncio.create_task(self._produce(kind, key, prompt, flight, generation_config))
+        else:
+            self._coalesced += 1
+        return flight
+
+    async def _generate(self, kind, key, prompt, generation_config=None):
+        cached = await genai_cache.get(key)
+        if cached is not None:
+            return cached
+        return await self._join(kind, key, prompt, generation_config).result()
 
+    async def _generate_stream(self, kind, key, prompt):
+        cached = await genai_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        async for chunk in self._join(kind, key, prompt).follow():
+            yield chunk
+
+    def _analysis_request(self, location_name, aqi, pm25, pm10):
         prompt = f"""
         Analyze the following pollution data for {location_name}:
         - AQI: {aqi}
@@ -36,17 +187,11 @@ class GenAIService:
         
         Keep it professional and informative.
         """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error communicating with GenAI: {str(e)}"
-
-    async def get_advice(self, location_name, aqi, weather_condition=None):
-        if not api_key:
-            return "GenAI integration is not configured. Please set GEMINI_API_KEY in .env."
+        # Keyed on bucketed inputs so small fluctuations reuse the same analysis
+        key = make_key("analyze", location_name, aqi_category(aqi), bucket(pm25, 25), bucket(pm10, 50))
+        return key, prompt
 
+    def _advice_request(self, location_name, aqi, weather_condition):
         prompt = f"""
         Give practical and actionable advice for citizens in {location_name} based on the following:
         - Current AQI: {aqi}
@@ -59,11 +204,73 @@ class GenAIService:
         
         Keep it concise and friendly.
         """
-        
+        key = make_key("advice", location_name, aqi_category(aqi), weather_condition)
+        return key, prompt
+
+    async def analyze_pollution(self, location_name, aqi, pm25, pm10):
+        if not api_key:
+            return NOT_CONFIGURED
+
+        key, prompt = self._analysis_request(location_name, aqi, pm25, pm10)
+        return await self._generate("analyze", key, prompt)
+
+    async def analyze_pollution_stream(self, location_name, aqi, pm25, pm10):
+        if not api_key:
+            yield NOT_CONFIGURED
+            return
+
+        key, prompt = self._analysis_request(location_name, aqi, pm25, pm10)
+        async for chunk in self._generate_stream("analyze", key, prompt):
+            yield chunk
+
+    async def get_advice(self, location_name, aqi, weather_condition=None):
+        if not api_key:
+            return NOT_CONFIGURED
+
+        key, prompt = self._advice_request(location_name, aqi, weather_condition)
+        return await self._generate("advice", key, prompt)
+
+    async def get_advice_stream(self, location_name, aqi, weather_condition=None):
+        if not api_key:
+            yield NOT_CONFIGURED
+            return
+
+        key, prompt = self._advice_request(location_name, aqi, weather_condition)
+        async for chunk in self._generate_stream("advice", key, prompt):
+            yield chunk
+
+    async def get_dashboard_insights(self, location_name, aqi, pm25, pm10, weather_condition=None):
+        """Analysis and advice from one structured (JSON schema) generation."""
+        if not api_key:
+            return {"analysis": NOT_CONFIGURED, "advice": NOT_CONFIGURED}
+
+        prompt = f"""
+        You are an air quality assistant. Using the data below for {location_name}:
+        - AQI: {aqi}
+        - PM2.5: {pm25} µg/m³
+        - PM10: {pm10} µg/m³
+        - Weather Condition: {weather_condition if weather_condition else "Unknown"}
+
+        Produce two texts:
+        "analysis": a concise, professional analysis with 1. Health impact summary,
+        2. Recommendations for citizens (e.g., masks, outdoor activities), and
+        3. One policy suggestion for local authorities to reduce this pollution.
+        "advice": concise, friendly, practical advice with 1. Actionable Health Advice
+        (for elderly, children, and general public), 2. Outdoor Activity Advice, and
+        3. Simple Household Advice to reduce exposure.
+        """
+        key = make_key(
+            "dashboard", location_name, aqi_category(aqi), bucket(pm25, 25), bucket(pm10, 50), weather_condition
+        )
+        text = await self._generate("dashboard", key, prompt, DASHBOARD_GENERATION_CONFIG)
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error communicating with GenAI: {str(e)}"
+            data = json.loads(text)
+            return {"analysis": str(data["analysis"]), "advice": str(data["advice"])}
+        except (ValueError, KeyError, TypeError):
+            # Not JSON: an error message from _produce
+            return {"analysis": text, "advice": text}
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "coalesced": self._coalesced}
 
 genai_service = GenAIService()
@@ -0,0 +1,89 @@
+from typing import List, Tuple
+from pydantic import ValidationError
+from ..db import database, schemas
+from .alert_service import alert_engine
+from .location_registry import location_registry
+from .pubsub import reading_bus
+from .resource_versions import resource_versions
+from .rollup_service import rollup_service
+
+INSERT_RECORD_QUERY = """
+    INSERT INTO pollution_records (location_id, aqi, pm25, pm10, co, no2, temperature, humidity)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Location ids checked per query when a bulk upload names ids not cached yet
+LOOKUP_CHUNK_SIZE = 500
+
+class IngestService:
+    """Single write path for pollution readings.
+
+    Every insert (single POST, city fetch, bulk upload) goes through
+    insert_records, which writes a whole batch in one transaction, then
+    hands it to the alert engine and publishes it to stream subscribers.
+    """
+
+    async def insert_records(self, records: List[schemas.PollutionRecordCreate]):
+        if not records:
+            return []
+        params = [(r.location_id, r.aqi, r.pm25, r.pm10, r.co, r.no2, r.temperature, r.humidity) for r in records]
+        async with database.pool.writer() as db:
+            # The writer holds the write lock, so every id above the current
+            # maximum belongs to this batch. sqlite3's executemany discards
+            # RETURNING rows, hence the range read instead.
+            async with db.execute("SELECT COALESCE(MAX(id), 0) FROM pollution_records") as cursor:
+                (last_id,) = await cursor.fetchone()
+            await db.executemany(INSERT_RECORD_QUERY, params)
+            async with db.execute("SELECT * FROM pollution_records WHERE id > ? ORDER BY id", (last_id,)) as cursor:
+                rows = await cursor.fetchall()
+            # Same transaction, so aggregates are never behind the raw table
+            await rollup_service.apply(db)
+            version = await resource_versions.bump(db, "pollution")
+        resource_versions.applied("pollution", version)
+        alert_engine.publish(rows)
+        reading_bus.publish(rows)
+        return rows
+
+    async def insert_record(self, record: schemas.PollutionRecordCreate):
+        rows = await self.insert_records([record])
+        return rows[0]
+
+    async def ingest_bulk(self, items: list) -> Tuple[list, List[dict]]:
+        """Validate raw items and insert the valid ones; returns (rows, per-item errors)."""
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            if isinstance(item, Exception):
+                errors.append({"index": index, "error": f"Malformed JSON: {item}"})
+                continue
+            try:
+                valid.append((index, schemas.PollutionRecordCreate.model_validate(item)))
+            except ValidationError as e:
+                message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                errors.append({"index": index, "error": message})
+
+        known = await location_registry.known_ids()
+        unknown = {record.location_id for _, record in valid} - known
+        # Ids created by another process since the cache was loaded; chunked
+        # to stay under SQLite's bound-variable limit
+        pending = sorted(unknown)
+        for start in range(0, len(pending), LOOKUP_CHUNK_SIZE):
+            chunk = pending[start:start + LOOKUP_CHUNK_SIZE]
+            rows = await database.fetch_rows(
+                f"SELECT id, latitude, longitude FROM locations WHERE id IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk)
+            )
+            for row in rows:
+                location_registry.add(row['id'], row['latitude'], row['longitude'], created=False)
+                unknown.discard(row['id'])
+
+        records = []
+        for index, record in valid:
+            if record.location_id in unknown:
+                errors.append({"index": index, "error": "Location not found"})
+            else:
+                records.append(record)
+        errors.sort(key=lambda err: err["index"])
+
+        rows = await self.insert_records(records)
+        return rows, errors
+
+ingest_service = IngestService()
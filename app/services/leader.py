@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+from ..db import database
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", f"{database.DB_PATH}.leader")
+# How often a follower checks whether the leader has gone away
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "15"))
+
+
+class LeaderElection:
+    """Picks the one worker process that runs background jobs.
+
+    All workers share a database, so scheduled refreshes, archiving and
+    retraining must only run once. Whichever process holds an exclusive
+    flock on LEADER_LOCK_PATH starts the jobs; the OS releases the lock when
+    that process exits, and followers retry every LEADER_RETRY_SECONDS so
+    another worker takes over.
+    """
+
+    def __init__(self, path: str = LEADER_LOCK_PATH, retry_interval: float = LEADER_RETRY_SECONDS):
+        self.path = path
+        self.retry_interval = retry_interval
+        self._jobs = ()
+        self._file = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"elected": 0, "attempts": 0}
+
+    @property
+    def is_leader(self) -> bool:
+        return self._file is not None
+
+    def _try_acquire(self) -> bool:
+        self._stats["attempts"] += 1
+        f = open(self.path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self._file = f
+        return True
+
+    def _lead(self):
+        self._stats["elected"] += 1
+        logger.info(f"Worker {os.getpid()} elected leader; starting background jobs")
+        for job in self._jobs:
+            job.start()
+
+    def start(self, *jobs):
+        """Start `jobs` (objects with start()/async stop()) here if this process wins the election."""
+        self._jobs = jobs
+        if self._try_acquire():
+            self._lead()
+        elif self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                if self._try_acquire():
+                    self._lead()
+                    return
+            except Exception as e:
+                logger.error(f"Leader election failed: {str(e)}")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.is_leader:
+            for job in reversed(self._jobs):
+                await job.stop()
+            f, self._file = self._file, None
+            f.close()
+
+    def stats(self) -> dict:
+        return {**self._stats, "leader": self.is_leader, "pid": os.getpid(), "lock_path": self.path}
+
+
+leader_election = LeaderElection()
@@ -0,0 +1,186 @@
+import difflib
+from typing import Dict, List, Optional, Set, Tuple
+from ..db import database
+from ..utils.names import name_aliases, normalize_name
+from .resource_versions import resource_versions
+from .spatial_index import SpatialIndex, valid_coordinates
+
+
+class LocationRegistry:
+    """In-process cache of known location ids, coordinates and name aliases.
+
+    Loaded from the database on first use and updated by the location write
+    paths, so validating a location id on ingest does not cost a query,
+    nearest-location lookups are served from an in-memory spatial index, and
+    a city name resolves to its location with one dict lookup.
+
+    Locations written by other workers show up through the "locations"
+    resource version, which every worker re-reads each sync interval: when
+    it moves past the version the caches were built at (other than by this
+    worker's own write) they are dropped and rebuilt on next use.
+    """
+
+    def __init__(self):
+        self._ids: Optional[Set[int]] = None
+        self._spatial: Optional[SpatialIndex] = None
+        self._aliases: Optional[Dict[str, int]] = None
+        # "locations" resource version the caches reflect
+        self._version: Optional[int] = None
+
+    def _check_version(self):
+        if self._version != resource_versions.version("locations"):
+            self.invalidate()
+
+    def _applied_write(self):
+        # Our own write moved the version by one: keep the caches (the caller
+        # patches them) unless another process wrote in between
+        version = resource_versions.version("locations")
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self.invalidate()
+
+    async def _load(self):
+        # Taken before reading, so a write landing during the load triggers another
+        self._version = resource_versions.version("locations")
+        rows = await database.fetch_rows("SELECT id, latitude, longitude FROM locations")
+        self._ids = {row['id'] for row in rows}
+        self._spatial = SpatialIndex({
+            row['id']: (row['latitude'], row['longitude'])
+            for row in rows if valid_coordinates(row['latitude'], row['longitude'])
+        })
+        await self._load_aliases()
+
+    async def _load_aliases(self):
+        async with database.pool.writer() as db:
+            # Alias locations created before aliases existed; lowest id claims a shared alias
+            async with db.execute(
+                "SELECT id, name, city FROM locations "
+                "WHERE id NOT IN (SELECT location_id FROM location_aliases) ORDER BY id"
+            ) as cursor:
+                missing = await cursor.fetchall()
+            if missing:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO location_aliases (alias, location_id) VALUES (?, ?)",
+                    [(alias, row['id']) for row in missing for alias in name_aliases(row['name'], row['city'])]
+                )
+            async with db.execute("SELECT alias, location_id FROM location_aliases") as cursor:
+                self._aliases = {row['alias']: row['location_id'] for row in await cursor.fetchall()}
+
+    async def known_ids(self) -> Set[int]:
+        self._check_version()
+        if self._ids is None:
+            await self._load()
+        return self._ids
+
+    async def spatial(self) -> SpatialIndex:
+        self._check_version()
+        if self._spatial is None:
+            await self._load()
+        return self._spatial
+
+    async def exists(self, location_id: int) -> bool:
+        ids = await self.known_ids()
+        if location_id in ids:
+            return True
+        # A miss may be a location created by another process; confirm once
+        row = await database.fetch_one("SELECT id, latitude, longitude FROM locations WHERE id = ?", (location_id,))
+        if row:
+            self.add(location_id, row['latitude'], row['longitude'], created=False)
+            return True
+        return False
+
+    def add(self, location_id: int, latitude: Optional[float] = None, longitude: Optional[float] = None,
+            created: bool = True):
+        """Cache a location; `created` when this worker just inserted it (and reloaded resource_versions)."""
+        if created:
+            self._applied_write()
+        if self._ids is not None:
+            self._ids.add(location_id)
+        if self._spatial is not None and valid_coordinates(latitude, longitude):
+            self._spatial.add(location_id, latitude, longitude)
+
+    def remove(self, location_id: int):
+        """Forget a location this worker just deleted (after reloading resource_versions)."""
+        self._applied_write()
+        if self._ids is not None:
+            self._ids.discard(location_id)
+        if self._spatial is not None:
+            self._spatial.remove(location_id)
+        if self._aliases is not None:
+            for alias in [alias for alias, owner in self._aliases.items() if owner == location_id]:
+                del self._aliases[alias]
+
+    def invalidate(self):
+        self._ids = None
+        self._spatial = None
+        self._aliases = None
+        self._version = None
+
+    async def resolve(self, name: str) -> Optional[int]:
+        """Location id for a place name in any spelling variant seen before, or None."""
+        alias = normalize_name(name)
+        if not alias:
+            return None
+        self._check_version()
+        if self._aliases is None:
+            await self._load()
+        location_id = self._aliases.get(alias)
+        if location_id is None:
+            # A miss may be an alias added by another process; confirm once
+            row = await database.fetch_one("SELECT location_id FROM location_aliases WHERE alias = ?", (alias,))
+            if row:
+                location_id = self._aliases[alias] = row['location_id']
+        return location_id
+
+    async def add_aliases(self, location_id: int, *names: str):
+        """Record names (e.g. a query and WAQI's city.name) as aliases of a location; existing aliases win."""
+        aliases = [alias for alias in name_aliases(*names) if alias not in (self._aliases or {})]
+        if not aliases:
+            return
+        placeholders = ", ".join("?" for _ in aliases)
+        async with database.pool.writer() as db:
+            await db.executemany(
+                "INSERT OR IGNORE INTO location_aliases (alias, location_id) VALUES (?, ?)",
+                [(alias, location_id) for alias in aliases]
+            )
+            async with db.execute(
+                f"SELECT alias, location_id FROM location_aliases WHERE alias IN ({placeholders})", aliases
+            ) as cursor:
+                rows = await cursor.fetchall()
+        if self._aliases is not None:
+            self._aliases.update((row['alias'], row['location_id']) for row in rows)
+
+    async def fuzzy(self, name: str, limit: int = 10) -> List[int]:
+        """Ids of locations whose aliases are close misspellings of name, best first."""
+        alias = normalize_name(name)
+        if not alias:
+            return []
+        self._check_version()
+        if self._aliases is None:
+            await self._load()
+        # Only compare against aliases sharing the first letter to keep this cheap
+        candidates = [known for known in self._aliases if known[0] == alias[0]]
+        ids = []
+        for match in difflib.get_close_matches(alias, candidates, n=limit * 2, cutoff=0.75):
+            location_id = self._aliases[match]
+            if location_id not in ids:
+                ids.append(location_id)
+        return ids[:limit]
+
+    def coordinates(self, location_id: int) -> Optional[Tuple[float, float]]:
+        self._check_version()
+        if self._spatial is None:
+            return None
+        return self._spatial.coordinates(location_id)
+
+    async def nearest(self, latitude: float, longitude: float, k: int = 1):
+        """Up to k (location_id, distance_km) pairs, closest first."""
+        return (await self.spatial()).nearest(latitude, longitude, k)
+
+    async def within(self, latitude: float, longitude: float, radius_km: float, limit: Optional[int] = None):
+        """(location_id, distance_km) pairs within radius_km, closest first."""
+        return (await self.spatial()).within(latitude, longitude, radius_km, limit)
+
+
+location_registry = LocationRegistry()
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+from ..utils.metrics import registry
+
+# How often the event loop is sampled for scheduling lag (0 disables)
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.5"))
+
+LOOP_LAG_SECONDS = registry.gauge("event_loop_lag_seconds", "Most recent event loop scheduling lag")
+LOOP_LAG_HISTOGRAM = registry.histogram(
+    "event_loop_lag_distribution_seconds", "Event loop scheduling lag samples",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+class EventLoopMonitor:
+    """Measures how late the event loop runs a sleep that should wake every `interval`.
+
+    Anything blocking the loop (sync I/O, heavy CPU in a handler) shows up as
+    lag, which delays every in-flight request by the same amount.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL):
+        self.interval = interval
+        self._task = None
+        self._stats = {"samples": 0, "max_lag_seconds": 0.0, "last_lag_seconds": 0.0}
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        gauge, histogram = LOOP_LAG_SECONDS.labels(), LOOP_LAG_HISTOGRAM.labels()
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            gauge.set(lag)
+            histogram.observe(lag)
+            self._stats["samples"] += 1
+            self._stats["last_lag_seconds"] = round(lag, 6)
+            if lag > self._stats["max_lag_seconds"]:
+                self._stats["max_lag_seconds"] = round(lag, 6)
+
+    def stats(self) -> dict:
+        return {**self._stats, "interval_seconds": self.interval}
+
+
+loop_monitor = EventLoopMonitor()
@@ -1,22 +1,115 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-import pickle
 import os
+import threading
 import numpy as np
+from ..utils.metrics import Timer, registry
+from .weather_features import seasonality
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "../../models/weather_model.pkl")
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "../../models/weather_model.npz")
+# Bumped whenever the arrays stored in a model file change
+ARTIFACT_FORMAT = 1
+
+# Features of the bootstrap model shipped in MODEL_PATH
+LEGACY_FEATURES = ("aqi", "pm25", "month", "hour")
+
+ML_PREDICT_SECONDS = registry.histogram("ml_predict_seconds", "Weather model prediction time", ("method",))
+
+class LinearWeatherModel:
+    """Linear map from named features to (temperature, humidity).
+
+    Plain coefficient arrays rather than an estimator object, so trained
+    versions can be stored as JSON and applied with one matrix product.
+    Features a caller cannot supply are filled with their training mean.
+    """
+
+    def __init__(self, feature_names, coef, intercept, feature_means=None, version=0, info=None):
+        self.feature_names = tuple(feature_names)
+        self.coef = np.asarray(coef, dtype=np.float64).reshape(2, len(self.feature_names))
+        self.intercept = np.asarray(intercept, dtype=np.float64).reshape(2)
+        self.feature_means = (np.zeros(len(self.feature_names)) if feature_means is None
+                              else np.asarray(feature_means, dtype=np.float64))
+        self.version = version
+        self.info = info or {}
+
+    def save(self, path: str):
+        """Write the model as a plain-array .npz file (atomically replacing path)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                format=np.array(ARTIFACT_FORMAT),
+                version=np.array(self.version),
+                feature_names=np.array(self.feature_names),
+                coef=self.coef,
+                intercept=self.intercept,
+                feature_means=self.feature_means,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        # allow_pickle=False: a model file can only ever contain arrays, never code
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format"]) != ARTIFACT_FORMAT:
+                raise ValueError(f"Unsupported model file format {int(data['format'])} in {path}")
+            return cls(
+                [str(name) for name in data["feature_names"]],
+                data["coef"],
+                data["intercept"],
+                data["feature_means"],
+                version=int(data["version"]),
+            )
+
+    def predict(self, features: dict):
+        shape = np.shape(features["aqi"])
+        matrix = np.column_stack([
+            np.broadcast_to(np.asarray(features.get(name, np.nan), dtype=np.float64), shape).ravel()
+            for name in self.feature_names
+        ])
+        matrix = np.where(np.isnan(matrix), self.feature_means, matrix)
+        prediction = matrix @ self.coef.T + self.intercept
+        return prediction[:, 0], prediction[:, 1]
 
 class WeatherMLService:
     def __init__(self):
-        self.model = None
-        self._load_or_train_model()
+        # Loaded on first use (or by warm() off the startup path), not at import
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self) -> LinearWeatherModel:
+        model = self._model
+        if model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load_or_train_model()
+                model = self._model
+        return model
+
+    @property
+    def loaded_model(self):
+        """The model in memory, or None before the first load (never triggers one)."""
+        return self._model
+
+    @property
+    def loaded_version(self):
+        """Version of the model in memory, or None before the first load (never triggers one)."""
+        model = self._model
+        return model.version if model is not None else None
+
+    def warm(self):
+        """Load the model now (e.g. on the ML executor at startup) so the first prediction doesn't."""
+        self.model
 
     def _load_or_train_model(self):
         if os.path.exists(MODEL_PATH):
-            with open(MODEL_PATH, 'rb') as f:
-                self.model = pickle.load(f)
-        else:
-            self._train_initial_model()
+            return LinearWeatherModel.load(MODEL_PATH)
+        return self._train_initial_model()
+
+    def swap(self, model: LinearWeatherModel):
+        # Rebinding one attribute is atomic: each prediction sees either model, never a mix.
+        # The lock only keeps a concurrent first load from overwriting the swap.
+        with self._load_lock:
+            self._model = model
 
     def _train_initial_model(self):
         # Simulate local training data
@@ -30,22 +123,25 @@ class WeatherMLService:
             'temp': np.random.uniform(15, 40, 100),
             'humidity': np.random.uniform(30, 90, 100)
         }
-        df = pd.DataFrame(data)
-        X = df[['aqi', 'pm25', 'month', 'hour']]
-        y = df[['temp', 'humidity']]
-        
-        self.model = LinearRegression()
-        self.model.fit(X, y)
+        X = np.column_stack([np.ones(100), *(data[name] for name in LEGACY_FEATURES)])
+        y = np.column_stack([data['temp'], data['humidity']])
+
+        beta = np.linalg.lstsq(X, y, rcond=None)[0]
+        model = LinearWeatherModel(LEGACY_FEATURES, beta[1:].T, beta[0])
         
         os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        with open(MODEL_PATH, 'wb') as f:
-            pickle.dump(self.model, f)
+        model.save(MODEL_PATH)
         print("Initial ML model trained and saved.")
+        return model
 
-    def predict(self, aqi, pm25, month, hour):
-        features = np.array([[aqi, pm25, month, hour]])
-        prediction = self.model.predict(features)
-        temp, humidity = prediction[0]
+    def predict(self, aqi, pm25, month, hour, **context):
+        """Predict for one reading; `context` takes optional features such as
+        aqi_mean, pm25_mean, temperature and humidity (see weather_features)."""
+        with Timer(ML_PREDICT_SECONDS.labels("predict")):
+            temps, humidities = self.model.predict({
+                **context, **seasonality(month, hour), "aqi": aqi, "pm25": pm25
+            })
+        temp, humidity = temps[0], humidities[0]
         
         # Determine condition based on temperature and humidity
         condition = "Clear"
@@ -62,4 +158,31 @@ class WeatherMLService:
             "condition": condition
         }
 
+    def predict_batch(self, aqi, pm25, month, hour, **context):
+        """Vectorized predict() over arrays of features.
+
+        Applies the fitted linear coefficients as one matrix product instead
+        of one call per row. `context` arrays (or scalars) are aligned with
+        `aqi`; NaN entries fall back to the feature's training mean. Returns
+        arrays aligned with the inputs.
+        """
+        aqi = np.asarray(aqi, dtype=np.float64)
+        context = {name: np.asarray(values, dtype=np.float64) for name, values in context.items()}
+        with Timer(ML_PREDICT_SECONDS.labels("predict_batch")):
+            temp, humidity = self.model.predict({
+                **context, **seasonality(month, hour), "aqi": aqi, "pm25": np.asarray(pm25, dtype=np.float64)
+            })
+
+        # Same precedence as predict()
+        condition = np.select(
+            [humidity > 80, temp > 35, aqi > 200],
+            ["Rainy/Humid", "Hot/Dry", "Smoggy"],
+            default="Clear"
+        )
+        return {
+            "predicted_temp": np.round(temp, 2),
+            "predicted_humidity": np.round(humidity, 2),
+            "condition": condition
+        }
+
 weather_service = WeatherMLService()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from ..db import database, schemas
+
+logger = logging.getLogger(__name__)
+
+# Undelivered readings a subscriber may hold before older ones are conflated or dropped
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+# How often readings written by other worker processes are picked up (0 disables)
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", "1"))
+STREAM_POLL_BATCH = 1000
+
+
+class TooManySubscribersError(RuntimeError):
+    pass
+
+
+class Subscription:
+    """One consumer's bounded mailbox.
+
+    publish() never waits on a consumer. Once `maxsize` readings are
+    pending, a new one replaces the oldest pending reading for the same
+    location (conflation), or else the oldest pending reading is dropped,
+    so a slow client falls behind to the latest state instead of
+    buffering without bound.
+    """
+
+    def __init__(self, location_ids: Optional[Set[int]], min_aqi: Optional[int], maxsize: int):
+        self.location_ids = location_ids
+        self.min_aqi = min_aqi
+        self.maxsize = maxsize
+        self.delivered = 0
+        self.conflated = 0
+        self.dropped = 0
+        self._pending: Deque[Tuple[int, str]] = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, location_id: int, payload: str):
+        if len(self._pending) >= self.maxsize:
+            stale = next((entry for entry in self._pending if entry[0] == location_id), None)
+            if stale is not None:
+                self._pending.remove(stale)
+                self.conflated += 1
+            else:
+                self._pending.popleft()
+                self.dropped += 1
+        self._pending.append((location_id, payload))
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> List[str]:
+        """Wait for and take every pending payload (oldest first); [] on timeout."""
+        if not self._pending:
+            self._ready.clear()
+            if timeout is None:
+                await self._ready.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+        payloads = [payload for _, payload in self._pending]
+        self._pending.clear()
+        self.delivered += len(payloads)
+        return payloads
+
+
+class ReadingBus:
+    """In-process pub/sub of new pollution readings.
+
+    IngestService publishes every batch it commits. Subscribers are indexed
+    by location (plus a wildcard set), so a reading is only offered to the
+    subscribers that asked for it, and it is serialized once however many
+    receive it. Readings committed by other worker processes are picked up
+    by tailing pollution_records past the last delivered id while anyone is
+    subscribed. Ids are committed in order (one writer at a time), so a
+    local batch that directly follows that id is sent immediately and
+    anything else is left to the tail, keeping delivery in id order.
+    """
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_SIZE, max_subscribers: int = STREAM_MAX_SUBSCRIBERS,
+                 poll_interval: float = STREAM_POLL_SECONDS):
+        self.maxsize = maxsize
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self._by_location: Dict[Optional[int], Set[Subscription]] = {}
+        self._count = 0
+        self._task = None
+        # Highest reading id delivered to subscribers (None until the tail starts)
+        self._last_id: Optional[int] = None
+        self._stats = {"published": 0, "tailed": 0, "offered": 0, "rejected_subscribers": 0}
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def subscribe(self, location_ids: Optional[Iterable[int]] = None, min_aqi: Optional[int] = None) -> Subscription:
+        """Subscribe to readings for `location_ids` (all locations if None) with AQI >= min_aqi."""
+        if self._count >= self.max_subscribers:
+            self._stats["rejected_subscribers"] += 1
+            raise TooManySubscribersError("Too many stream subscribers")
+        ids = set(location_ids) if location_ids else None
+        subscription = Subscription(ids, min_aqi, self.maxsize)
+        for key in ids or (None,):
+            self._by_location.setdefault(key, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for key in subscription.location_ids or (None,):
+            subscribers = self._by_location.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_location[key]
+        self._count -= 1
+
+    def _fan_out(self, rows):
+        for row in rows:
+            location_id = row['location_id']
+            targets = self._by_location.get(location_id, ()), self._by_location.get(None, ())
+            if not (targets[0] or targets[1]):
+                continue
+            aqi = row['aqi']
+            payload = None
+            for subscribers in targets:
+                for subscription in subscribers:
+                    if subscription.min_aqi is not None and (aqi is None or aqi < subscription.min_aqi):
+                        continue
+                    if payload is None:
+                        payload = schemas.PollutionRecord.model_validate(dict(row)).model_dump_json()
+                    subscription.offer(location_id, payload)
+                    self._stats["offered"] += 1
+
+    def publish(self, rows):
+        """Offer freshly committed pollution_records rows to matching subscribers (never blocks)."""
+        if not rows:
+            return
+        if self._task is not None and self._last_id is not None:
+            if rows[0]['id'] != self._last_id + 1:
+                # Already sent by the tail, or other workers' readings come first
+                return
+            self._last_id = rows[-1]['id']
+        self._stats["published"] += len(rows)
+        self._fan_out(rows)
+
+    def start(self):
+        if self.poll_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._last_id = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Reading stream tail failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self):
+        # Start from "now" and only read while someone is listening
+        if self._last_id is None or not self._count:
+            row = await database.fetch_one("SELECT COALESCE(MAX(id), 0) AS id FROM pollution_records")
+            self._last_id = max(row['id'], self._last_id or 0)
+            return
+        while True:
+            rows = await database.fetch_rows(
+                "SELECT * FROM pollution_records WHERE id > ? ORDER BY id LIMIT ?",
+                (self._last_id, STREAM_POLL_BATCH)
+            )
+            if not rows:
+                return
+            # Local publishes may have moved the watermark while we were reading
+            unsent = [row for row in rows if row['id'] > self._last_id]
+            if unsent:
+                self._last_id = unsent[-1]['id']
+                self._stats["tailed"] += len(unsent)
+                self._fan_out(unsent)
+            if len(rows) < STREAM_POLL_BATCH:
+                return
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "subscribers": self._count,
+            "subscribed_locations": len([key for key in self._by_location if key is not None]),
+            "tailing": self._task is not None and not self._task.done(),
+        }
+
+
+reading_bus = ReadingBus()
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import time
+from ..db import database, schemas
+from .external_pollution import external_pollution_service
+from .ingest_service import ingest_service
+from .spatial_index import valid_coordinates
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_SECONDS = float(os.getenv("REFRESH_INTERVAL_SECONDS", "900"))
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "8"))
+# Upper bound for per-location backoff after repeated failures
+MAX_BACKOFF_SECONDS = 6 * 3600
+# How long to pause all upstream calls after WAQI reports a rate limit
+RATE_LIMIT_PAUSE_SECONDS = 300
+
+
+class RefreshScheduler:
+    """Periodically refreshes every location from WAQI in the background.
+
+    Each cycle fans out over all due locations with at most `concurrency`
+    upstream calls in flight, then writes every new reading in one batch.
+    Failing locations back off exponentially; a rate-limit response pauses
+    the whole scheduler.
+    """
+
+    def __init__(self, service=external_pollution_service, interval: float = REFRESH_INTERVAL_SECONDS,
+                 concurrency: int = REFRESH_CONCURRENCY):
+        self.service = service
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self._task = None
+        self._failures = {}
+        self._next_due = {}
+        self._last_observed = {}
+        self._last_success = {}
+        self._paused_until = 0.0
+        self._stats = {
+            "cycles": 0,
+            "locations_refreshed": 0,
+            "records_written": 0,
+            "unchanged": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "last_cycle_started": None,
+            "last_cycle_seconds": 0.0,
+            "last_cycle_throughput": 0.0,
+            "lag_seconds": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.interval <= 0:
+            logger.info("Refresh scheduler disabled (REFRESH_INTERVAL_SECONDS <= 0)")
+            return
+        if not self.service.token:
+            logger.info("Refresh scheduler disabled (WAQI_TOKEN not configured)")
+            return
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        scheduled = time.monotonic()
+        while True:
+            self._stats["lag_seconds"] = round(max(0.0, time.monotonic() - scheduled), 3)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Refresh cycle failed: {str(e)}", exc_info=True)
+            scheduled += self.interval
+            await asyncio.sleep(max(0.0, scheduled - time.monotonic()))
+
+    def _is_rate_limited(self, error: str) -> bool:
+        error = error.lower()
+        return "quota" in error or "429" in error
+
+    async def _fetch(self, location):
+        lat, lon = location['latitude'], location['longitude']
+        if valid_coordinates(lat, lon):
+            return await self.service.fetch_real_time_pollution(lat, lon)
+        return await self.service.fetch_pollution_by_city(location['city'])
+
+    def _to_record(self, location_id, data):
+        """The record for a WAQI result; raises ValueError for unusable payloads (e.g. aqi "-")."""
+        return schemas.PollutionRecordCreate(
+            location_id=location_id,
+            aqi=data['aqi'],
+            pm25=data['pm25'],
+            pm10=data['pm10'],
+            co=data['co'],
+            no2=data['no2'],
+            temperature=data.get('temperature'),
+            humidity=data.get('humidity')
+        )
+
+    async def _refresh(self, location, semaphore):
+        async with semaphore:
+            if self._paused_until > time.monotonic():
+                return None
+            data = await self._fetch(location)
+
+        location_id = location['id']
+        now = time.monotonic()
+        if "error" in data:
+            if self._is_rate_limited(data["error"]):
+                self._stats["rate_limited"] += 1
+                self._paused_until = now + RATE_LIMIT_PAUSE_SECONDS
+                logger.warning(f"WAQI rate limit hit, pausing refreshes for {RATE_LIMIT_PAUSE_SECONDS}s")
+            self._fail(location_id, data["error"], now)
+            return None
+        try:
+            record = self._to_record(location_id, data)
+        except (KeyError, TypeError, ValueError) as e:
+            # Stations without data report values like aqi "-"; back off like any failure
+            self._fail(location_id, f"Unusable WAQI data: {str(e)}", now)
+            return None
+
+        self._failures.pop(location_id, None)
+        self._next_due.pop(location_id, None)
+        self._last_success[location_id] = now
+        self._stats["locations_refreshed"] += 1
+
+        # Skip readings we already stored (same station observation time)
+        observed = data.get("time")
+        if observed is not None and self._last_observed.get(location_id) == observed:
+            self._stats["unchanged"] += 1
+            return None
+        self._last_observed[location_id] = observed
+
+        return record
+
+    def _fail(self, location_id, error, now):
+        self._stats["failures"] += 1
+        failures = self._failures.get(location_id, 0) + 1
+        self._failures[location_id] = failures
+        self._next_due[location_id] = now + min(self.interval * (2 ** failures), MAX_BACKOFF_SECONDS)
+        logger.warning(f"Refresh failed for location {location_id}: {error}")
+
+    async def run_once(self):
+        started = time.monotonic()
+        self._stats["cycles"] += 1
+        self._stats["last_cycle_started"] = time.time()
+
+        locations = await database.fetch_rows("SELECT id, city, latitude, longitude FROM locations")
+        due = [loc for loc in locations if self._next_due.get(loc['id'], 0) <= started]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._refresh(loc, semaphore) for loc in due), return_exceptions=True)
+        records = []
+        for location, result in zip(due, results):
+            if isinstance(result, Exception):
+                # One location's failure never costs the others their readings
+                self._fail(location['id'], repr(result), time.monotonic())
+            elif result is not None:
+                records.append(result)
+
+        # One transaction for the whole cycle
+        if records:
+            await ingest_service.insert_records(records)
+            self._stats["records_written"] += len(records)
+
+        elapsed = time.monotonic() - started
+        self._stats["last_cycle_seconds"] = round(elapsed, 3)
+        self._stats["last_cycle_throughput"] = round(len(due) / elapsed, 2) if elapsed > 0 else 0.0
+        return len(records)
+
+    async def refresh_location(self, location_id: int):
+        """Refresh one location right now; returns the new record row or an error dict."""
+        location = await database.fetch_one(
+            "SELECT id, city, latitude, longitude FROM locations WHERE id = ?", (location_id,)
+        )
+        if not location:
+            return None
+        data = await self._fetch(location)
+        if "error" in data:
+            return {"error": data["error"]}
+        try:
+            record = self._to_record(location_id, data)
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": f"Unusable WAQI data: {str(e)}"}
+        self._last_observed[location_id] = data.get("time")
+        self._last_success[location_id] = time.monotonic()
+        return await ingest_service.insert_record(record)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        staleness = [now - ts for ts in self._last_success.values()]
+        return {
+            **self._stats,
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "concurrency": self.concurrency,
+            "backing_off": len(self._next_due),
+            "paused": self._paused_until > now,
+            "max_staleness_seconds": round(max(staleness), 1) if staleness else None,
+        }
+
+
+refresh_scheduler = RefreshScheduler()
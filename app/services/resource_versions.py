@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+from ..db import database
+
+logger = logging.getLogger(__name__)
+
+# How often every worker re-reads resource_versions to see writes made by other processes
+RESOURCE_VERSION_SYNC_SECONDS = float(os.getenv("RESOURCE_VERSION_SYNC_SECONDS", "1"))
+# Browsers always revalidate (a 304 is cheap); a shared cache such as a local
+# reverse proxy may answer repeat reads itself for this many seconds
+HTTP_CACHE_SHARED_MAX_AGE = int(os.getenv("HTTP_CACHE_SHARED_MAX_AGE", "2"))
+CACHE_CONTROL = f"public, max-age=0, s-maxage={HTTP_CACHE_SHARED_MAX_AGE}"
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+class ResourceVersions:
+    """Per-resource change counters behind ETag / Last-Modified on read endpoints.
+
+    The counters live in the resource_versions table and change in the same
+    transaction as the data. Each worker keeps a copy in memory, updated
+    right after its own writes and re-read every sync interval for writes
+    made elsewhere, so a conditional GET is answered without touching the
+    database. Headers are taken before a response's query runs: a newer
+    write can only make an ETag undershoot (a later 200), never serve stale
+    data past one sync interval.
+
+    Last-Modified has one-second resolution, so it is only sent once no
+    further write can land in the same second unseen (the second is over,
+    plus a sync interval for other workers' writes); until then clients
+    revalidate by ETag alone.
+    """
+
+    def __init__(self, sync_interval: float = RESOURCE_VERSION_SYNC_SECONDS):
+        self.sync_interval = sync_interval
+        self._versions: Dict[str, Tuple[int, datetime]] = {}
+        self._task = None
+        self._stats = {"not_modified": 0, "modified": 0, "syncs": 0}
+
+    def _set(self, name: str, version: int, modified_at):
+        if isinstance(modified_at, str):
+            modified_at = datetime.strptime(modified_at, "%Y-%m-%d %H:%M:%S")
+        self._versions[name] = (version, modified_at.replace(tzinfo=timezone.utc))
+
+    async def load(self):
+        rows = await database.fetch_rows("SELECT name, version, modified_at FROM resource_versions")
+        for row in rows:
+            self._set(row['name'], row['version'], row['modified_at'])
+
+    async def bump(self, db, name: str) -> Tuple[int, str]:
+        """Advance `name` inside the caller's write transaction; pass the result to applied() after commit."""
+        async with db.execute(
+            "UPDATE resource_versions SET version = version + 1, modified_at = CURRENT_TIMESTAMP "
+            "WHERE name = ? RETURNING version, modified_at", (name,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return tuple(row)
+
+    def applied(self, name: str, bumped: Tuple[int, str]):
+        version, modified_at = bumped
+        if name not in self._versions or version > self._versions[name][0]:
+            self._set(name, version, modified_at)
+
+    def version(self, name: str) -> Optional[int]:
+        """The counter of `name` as this worker last saw it (None until loaded)."""
+        current = self._versions.get(name)
+        return current[0] if current is not None else None
+
+    def headers(self, name: str, variant: Optional[str] = None) -> dict:
+        """ETag, Last-Modified, Cache-Control and Vary for the current state of `name` ({} until loaded).
+
+        The ETag is weak because the gzip and identity encodings of a state
+        share it. `variant` (e.g. the response format) is part of the tag,
+        so different representations never match each other.
+        """
+        current = self._versions.get(name)
+        if current is None:
+            return {}
+        version, modified_at = current
+        tag = f"{name}-{version}-{variant}" if variant else f"{name}-{version}"
+        headers = {"ETag": f'W/"{tag}"', "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        settled = modified_at + timedelta(seconds=1 + max(self.sync_interval, 0))
+        if datetime.now(timezone.utc) >= settled:
+            headers["Last-Modified"] = format_datetime(modified_at, usegmt=True)
+        return headers
+
+    def is_fresh(self, request_headers: Mapping[str, str], headers: dict) -> bool:
+        """Whether the client's cached copy matches `headers` (If-None-Match, else If-Modified-Since)."""
+        fresh = False
+        if headers:
+            if_none_match = request_headers.get("if-none-match")
+            if if_none_match is not None:
+                # Weak comparison: a W/ prefix on either side is ignored
+                tags = {_opaque(tag.strip()) for tag in if_none_match.split(",")}
+                fresh = "*" in tags or _opaque(headers["ETag"]) in tags
+            elif "if-modified-since" in request_headers and "Last-Modified" in headers:
+                try:
+                    since = parsedate_to_datetime(request_headers["if-modified-since"])
+                    fresh = since is not None and parsedate_to_datetime(headers["Last-Modified"]) <= since
+                except (TypeError, ValueError):
+                    fresh = False
+        self._stats["not_modified" if fresh else "modified"] += 1
+        return fresh
+
+    def start(self):
+        if self.sync_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.load()
+                self._stats["syncs"] += 1
+            except Exception as e:
+                logger.error(f"Resource version sync failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "versions": {name: version for name, (version, _) in self._versions.items()},
+            "sync_interval_seconds": self.sync_interval,
+        }
+
+
+resource_versions = ResourceVersions()
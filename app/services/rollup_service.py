@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+from typing import Optional
+from ..db import database
+
+METRICS = ("aqi", "pm25", "pm10", "co", "no2")
+
+# Bucket start for each rollup level, in the same text format as stored timestamps
+LEVELS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+    "month": "%Y-%m-01 00:00:00",
+}
+# Approximate bucket width, used to pick a level for a requested range
+LEVEL_SECONDS = {"hour": 3600, "day": 86400, "month": 30 * 86400}
+
+# Without an explicit bucket, use the finest level that keeps a response under this many points
+AGGREGATE_MAX_POINTS = 1000
+AQI_HIST_BIN = 10
+
+_COLUMNS = ", ".join(f"{m}_count, {m}_sum, {m}_min, {m}_max" for m in METRICS)
+_SELECT = ", ".join(f"COUNT({m}), TOTAL({m}), MIN({m}), MAX({m})" for m in METRICS)
+# Scalar MIN/MAX return NULL if either side is NULL, hence the COALESCE pairs
+_MERGE = ",\n".join(
+    f"{m}_count = {m}_count + excluded.{m}_count, "
+    f"{m}_sum = {m}_sum + excluded.{m}_sum, "
+    f"{m}_min = MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min)), "
+    f"{m}_max = MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))"
+    for m in METRICS
+)
+
+ROLLUP_QUERY = f"""
+    INSERT INTO pollution_rollups (level, location_id, bucket_start, samples, {_COLUMNS})
+    SELECT ?, location_id, strftime(?, timestamp) AS bucket_start, COUNT(*), {_SELECT}
+    FROM pollution_records
+    WHERE id > ? AND id <= ?
+    GROUP BY location_id, bucket_start
+    ON CONFLICT (location_id, level, bucket_start) DO UPDATE SET
+    samples = samples + excluded.samples,
+    {_MERGE}
+"""
+
+HIST_QUERY = f"""
+    INSERT INTO pollution_rollup_aqi_hist (level, location_id, bucket_start, bin, samples)
+    SELECT ?, location_id, strftime(?, timestamp) AS bucket_start, CAST(aqi / {AQI_HIST_BIN} AS INTEGER) AS bin, COUNT(*)
+    FROM pollution_records
+    WHERE id > ? AND id <= ? AND aqi IS NOT NULL
+    GROUP BY location_id, bucket_start, bin
+    ON CONFLICT (location_id, level, bucket_start, bin) DO UPDATE SET
+    samples = samples + excluded.samples
+"""
+
+# Reads behind GET /pollution/aggregate: (location_id, level, start, end)
+POINTS_QUERY = """
+    SELECT * FROM pollution_rollups WHERE location_id = ? AND level = ?
+    AND bucket_start >= ? AND bucket_start <= ? ORDER BY bucket_start
+"""
+HIST_POINTS_QUERY = """
+    SELECT bucket_start, bin, samples FROM pollution_rollup_aqi_hist WHERE location_id = ? AND level = ?
+    AND bucket_start >= ? AND bucket_start <= ? ORDER BY bucket_start, bin
+"""
+
+
+def _percentile(bins, total, pct):
+    """Approximate percentile from (bin, samples) pairs by interpolating inside the bin."""
+    rank = pct / 100 * total
+    seen = 0
+    for index, samples in bins:
+        if seen + samples >= rank:
+            return round((index + (rank - seen) / samples) * AQI_HIST_BIN, 1)
+        seen += samples
+    return float((bins[-1][0] + 1) * AQI_HIST_BIN)
+
+
+class RollupService:
+    """Hourly, daily and monthly pollution aggregates per location.
+
+    Counts, sums and extrema are decomposable, so new records are merged into
+    the existing buckets instead of recomputing history. A watermark on
+    pollution_records.id tracks what has already been rolled up; apply() runs
+    inside the ingest transaction so rollups never lag the raw table.
+    """
+
+    async def apply(self, db) -> int:
+        """Fold records above the watermark into every level; `db` must be the writer connection."""
+        async with db.execute("SELECT last_record_id FROM rollup_state WHERE name = 'pollution'") as cursor:
+            (last_id,) = await cursor.fetchone()
+        async with db.execute("SELECT COALESCE(MAX(id), 0) FROM pollution_records") as cursor:
+            (max_id,) = await cursor.fetchone()
+        if max_id <= last_id:
+            return 0
+        for level, fmt in LEVELS.items():
+            await db.execute(ROLLUP_QUERY, (level, fmt, last_id, max_id))
+            await db.execute(HIST_QUERY, (level, fmt, last_id, max_id))
+        await db.execute("UPDATE rollup_state SET last_record_id = ? WHERE name = 'pollution'", (max_id,))
+        return max_id - last_id
+
+    async def catch_up(self) -> int:
+        async with database.pool.writer() as db:
+            return await self.apply(db)
+
+    @staticmethod
+    def pick_level(start: Optional[datetime], end: Optional[datetime]) -> str:
+        """Finest level that keeps the range under AGGREGATE_MAX_POINTS buckets."""
+        if start is None:
+            return "day"
+        # Naive datetimes are UTC, like stored timestamps
+        start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+        end = end or datetime.now(timezone.utc)
+        end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+        span = (end - start).total_seconds()
+        for level in ("hour", "day"):
+            if span / LEVEL_SECONDS[level] <= AGGREGATE_MAX_POINTS:
+                return level
+        return "month"
+
+    async def aggregate(self, location_id: int, level: str, start: Optional[str], end: Optional[str]) -> list:
+        """Rollup points for one location; `start`/`end` are stored-format timestamps matched against bucket starts."""
+        params = (location_id, level, start or "", end or "9999-12-31 23:59:59")
+        rows = await database.fetch_rows(POINTS_QUERY, params)
+        hist_rows = await database.fetch_rows(HIST_POINTS_QUERY, params)
+        hists = {}
+        for row in hist_rows:
+            hists.setdefault(row['bucket_start'], []).append((row['bin'], row['samples']))
+
+        points = []
+        for row in rows:
+            point = {"bucket_start": row['bucket_start'], "samples": row['samples']}
+            for m in METRICS:
+                count = row[f"{m}_count"]
+                point[f"{m}_avg"] = round(row[f"{m}_sum"] / count, 2) if count else None
+                point[f"{m}_min"] = row[f"{m}_min"]
+                point[f"{m}_max"] = row[f"{m}_max"]
+            bins = hists.get(row['bucket_start'])
+            for pct in (50, 95):
+                value = _percentile(bins, row['aqi_count'], pct) if bins else None
+                # Bin interpolation can overshoot the exact extrema
+                point[f"aqi_p{pct}"] = min(max(value, row['aqi_min']), row['aqi_max']) if bins else None
+            points.append(point)
+        return points
+
+
+rollup_service = RollupService()
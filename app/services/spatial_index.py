@@ -0,0 +1,109 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Points added or removed since the last build are handled by brute force
+# until there are this many, then the tree is rebuilt
+REBUILD_THRESHOLD = 1024
+
+
+def valid_coordinates(latitude, longitude) -> bool:
+    # (0, 0) is what auto-created locations get when WAQI returns no geo
+    return latitude is not None and longitude is not None and (latitude, longitude) != (0, 0)
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpatialIndex:
+    """Nearest-neighbour and radius search over location coordinates.
+
+    A haversine BallTree holds the bulk of the points. Locations added or
+    removed since it was built sit in a small pending set (searched by brute
+    force) and a removed set (filtered out of tree results), so single
+    inserts and deletes don't pay for a rebuild.
+    """
+
+    def __init__(self, points: Optional[Dict[int, Tuple[float, float]]] = None):
+        self._points = dict(points or {})
+        self._tree = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        self._pending = {}
+        self._removed = set()
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._points)
+
+    def coordinates(self, location_id: int) -> Optional[Tuple[float, float]]:
+        return self._points.get(location_id)
+
+    def _rebuild(self):
+        self._pending.clear()
+        self._removed.clear()
+        if not self._points:
+            self._tree = None
+            self._tree_ids = np.empty(0, dtype=np.int64)
+            return
+        from sklearn.neighbors import BallTree
+
+        self._tree_ids = np.fromiter(self._points.keys(), dtype=np.int64, count=len(self._points))
+        coords = np.radians(np.array(list(self._points.values()), dtype=np.float64))
+        self._tree = BallTree(coords, metric="haversine")
+
+    def add(self, location_id: int, latitude: float, longitude: float):
+        if location_id in self._points:
+            self.remove(location_id)
+        self._points[location_id] = (latitude, longitude)
+        self._pending[location_id] = (latitude, longitude)
+        if len(self._pending) > REBUILD_THRESHOLD:
+            self._rebuild()
+
+    def remove(self, location_id: int):
+        if self._points.pop(location_id, None) is None:
+            return
+        if self._pending.pop(location_id, None) is None:
+            self._removed.add(location_id)
+            if len(self._removed) > REBUILD_THRESHOLD:
+                self._rebuild()
+
+    def _pending_distances(self, latitude, longitude):
+        if not self._pending:
+            return []
+        ids = list(self._pending)
+        lats, lons = np.array(list(self._pending.values()), dtype=np.float64).T
+        return list(zip(ids, haversine_km(latitude, longitude, lats, lons).tolist()))
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> List[Tuple[int, float]]:
+        """Up to k (location_id, distance_km) pairs, closest first."""
+        results = []
+        if self._tree is not None:
+            # Ask for extra neighbours to make up for removed points
+            count = min(k + len(self._removed), len(self._tree_ids))
+            distances, indices = self._tree.query(np.radians([[latitude, longitude]]), k=count)
+            for index, distance in zip(indices[0], distances[0]):
+                location_id = int(self._tree_ids[index])
+                if location_id not in self._removed:
+                    results.append((location_id, float(distance) * EARTH_RADIUS_KM))
+        results.extend(self._pending_distances(latitude, longitude))
+        results.sort(key=lambda item: item[1])
+        return results[:k]
+
+    def within(self, latitude: float, longitude: float, radius_km: float,
+               limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(location_id, distance_km) pairs within radius_km, closest first."""
+        results = []
+        if self._tree is not None:
+            indices, distances = self._tree.query_radius(
+                np.radians([[latitude, longitude]]), r=radius_km / EARTH_RADIUS_KM, return_distance=True
+            )
+            for index, distance in zip(indices[0], distances[0]):
+                location_id = int(self._tree_ids[index])
+                if location_id not in self._removed:
+                    results.append((location_id, float(distance) * EARTH_RADIUS_KM))
+        results.extend(item for item in self._pending_distances(latitude, longitude) if item[1] <= radius_km)
+        results.sort(key=lambda item: item[1])
+        return results[:limit] if limit is not None else results
@@ -0,0 +1,136 @@
+from typing import Dict, Iterable, List
+import numpy as np
+from ..db import database
+
+# Readings averaged into the rolling-mean features (current one included)
+ROLLING_WINDOW = 3
+
+# Everything the weather model may use. Models store the subset they were
+# fitted on, so older models keep working as features are added.
+FEATURE_NAMES = (
+    "aqi", "pm25", "month", "hour",
+    "aqi_mean", "pm25_mean",
+    "temperature", "humidity",
+    "month_sin", "month_cos", "hour_sin", "hour_cos",
+)
+
+# Last ROLLING_WINDOW readings of each location, newest first, one index
+# range scan per location
+CONTEXT_QUERY = """
+    SELECT p.location_id, p.aqi, p.pm25, p.temperature, p.humidity, p.timestamp, p.id
+    FROM locations l
+    JOIN pollution_records p ON p.id IN (
+        SELECT id FROM pollution_records
+        WHERE location_id = l.id AND id <= ?
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    )
+    WHERE l.id IN ({placeholders})
+"""
+
+
+def _float(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def seasonality(month, hour) -> Dict[str, np.ndarray]:
+    month = np.asarray(month, dtype=np.float64)
+    hour = np.asarray(hour, dtype=np.float64)
+    return {
+        "month": month,
+        "hour": hour,
+        "month_sin": np.sin(2 * np.pi * (month - 1) / 12),
+        "month_cos": np.cos(2 * np.pi * (month - 1) / 12),
+        "hour_sin": np.sin(2 * np.pi * hour / 24),
+        "hour_cos": np.cos(2 * np.pi * hour / 24),
+    }
+
+
+def _group_starts(location_ids: np.ndarray) -> np.ndarray:
+    # Index of the first row of each row's location group (rows are grouped)
+    n = len(location_ids)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = location_ids[1:] != location_ids[:-1]
+    return np.maximum.accumulate(np.where(is_start, np.arange(n), 0))
+
+
+def _rolling_mean(values: np.ndarray, starts: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the last `window` non-null values within each group, via prefix sums."""
+    n = len(values)
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    end = np.arange(n) + 1
+    begin = np.maximum(end - window, starts)
+    total, count = sums[end] - sums[begin], counts[end] - counts[begin]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def build_features(rows) -> Dict[str, np.ndarray]:
+    """Feature columns for every row of `rows`, which must be sorted by (location_id, timestamp, id).
+
+    Rows need location_id, aqi, pm25, temperature, humidity and timestamp
+    ("YYYY-MM-DD HH:MM:SS"). Also returns `location_id`, `id`, and the
+    `target_temp`/`target_humidity` of each row's next reading at the same
+    location (NaN for the newest one).
+    """
+    location_ids = np.array([row['location_id'] for row in rows], dtype=np.int64)
+    timestamps = [row['timestamp'] for row in rows]
+    aqi, pm25 = _float(row['aqi'] for row in rows), _float(row['pm25'] for row in rows)
+    temperature = _float(row['temperature'] for row in rows)
+    humidity = _float(row['humidity'] for row in rows)
+    starts = _group_starts(location_ids)
+
+    has_next = np.zeros(len(rows), dtype=bool)
+    has_next[:-1] = location_ids[1:] == location_ids[:-1]
+    next_temp = np.full(len(rows), np.nan)
+    next_humidity = np.full(len(rows), np.nan)
+    next_temp[:-1] = temperature[1:]
+    next_humidity[:-1] = humidity[1:]
+
+    features = {
+        "location_id": location_ids,
+        "id": np.array([row['id'] for row in rows], dtype=np.int64),
+        "aqi": aqi,
+        "pm25": pm25,
+        "aqi_mean": _rolling_mean(aqi, starts, ROLLING_WINDOW),
+        "pm25_mean": _rolling_mean(pm25, starts, ROLLING_WINDOW),
+        "temperature": temperature,
+        "humidity": humidity,
+        "target_temp": np.where(has_next, next_temp, np.nan),
+        "target_humidity": np.where(has_next, next_humidity, np.nan),
+        **seasonality(
+            np.array([int(ts[5:7]) for ts in timestamps], dtype=np.float64),
+            np.array([int(ts[11:13]) for ts in timestamps], dtype=np.float64),
+        ),
+    }
+    return features
+
+
+# Serving features taken from a location's recent readings (seasonality comes from the prediction time)
+CONTEXT_FEATURES = ("aqi_mean", "pm25_mean", "temperature", "humidity")
+
+
+def context_features(rows) -> Dict[int, Dict[str, float]]:
+    """CONTEXT_FEATURES per location as of its newest reading in `rows`."""
+    rows = sorted(rows, key=lambda row: (row['location_id'], row['timestamp'], row['id']))
+    if not rows:
+        return {}
+    features = build_features(rows)
+    # Last row of each group is the location's newest reading
+    location_ids = features["location_id"]
+    last = np.flatnonzero(np.append(location_ids[1:] != location_ids[:-1], True))
+    return {
+        int(location_ids[index]): {name: float(features[name][index]) for name in CONTEXT_FEATURES}
+        for index in last
+    }
+
+
+async def load_context(location_ids: Iterable[int]) -> Dict[int, Dict[str, float]]:
+    """Latest CONTEXT_FEATURES for each location that has readings."""
+    location_ids: List[int] = list(location_ids)
+    if not location_ids:
+        return {}
+    query = CONTEXT_QUERY.format(placeholders=", ".join("?" for _ in location_ids))
+    rows = await database.fetch_rows(query, (2 ** 62, ROLLING_WINDOW, *location_ids))
+    return context_features(rows)
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+import numpy as np
+from ..db import database
+from .executors import ml_executor
+from .ml_service import LinearWeatherModel, weather_service
+from .weather_features import CONTEXT_QUERY, FEATURE_NAMES, ROLLING_WINDOW, build_features
+
+logger = logging.getLogger(__name__)
+
+RETRAIN_INTERVAL_SECONDS = float(os.getenv("RETRAIN_INTERVAL_SECONDS", "3600"))
+# How often every worker checks weather_models for a version trained elsewhere
+MODEL_SYNC_SECONDS = float(os.getenv("MODEL_SYNC_SECONDS", "60"))
+# New readings processed per step; bounds memory regardless of backlog size
+TRAIN_BATCH_ROWS = int(os.getenv("TRAIN_BATCH_ROWS", "20000"))
+# Samples whose target reading id is a multiple of this are held out for validation
+HOLDOUT_EVERY = 5
+MIN_TRAIN_ROWS = int(os.getenv("MIN_TRAIN_ROWS", "50"))
+# A candidate is only accepted on holdout evidence, so at least one row
+MIN_HOLDOUT_ROWS = max(1, int(os.getenv("MIN_HOLDOUT_ROWS", "10")))
+# Relative ridge penalty; keeps the normal equations well conditioned
+RIDGE = 1e-6
+
+# Features trained models use (raw month/hour are replaced by their cyclic encoding)
+TRAIN_FEATURES = (
+    "aqi", "pm25", "aqi_mean", "pm25_mean", "temperature", "humidity",
+    "month_sin", "month_cos", "hour_sin", "hour_cos",
+)
+
+NEW_ROWS_QUERY = """
+    SELECT id, location_id, aqi, pm25, temperature, humidity, timestamp
+    FROM pollution_records WHERE id > ? ORDER BY id LIMIT ?
+"""
+
+
+class SufficientStats:
+    """Running X'X, X'y and y'y over every FEATURE_NAMES column plus an intercept.
+
+    Least squares for any feature subset, and the squared error of any linear
+    model on the accumulated rows, follow from these alone, so new rows are
+    folded in once and never revisited.
+    """
+
+    def __init__(self, xtx=None, xty=None, yty=None, rows=0):
+        size = len(FEATURE_NAMES) + 1
+        self.xtx = np.zeros((size, size)) if xtx is None else np.asarray(xtx, dtype=np.float64)
+        self.xty = np.zeros((size, 2)) if xty is None else np.asarray(xty, dtype=np.float64)
+        self.yty = np.zeros(2) if yty is None else np.asarray(yty, dtype=np.float64)
+        self.rows = rows
+
+    def update(self, X: np.ndarray, Y: np.ndarray):
+        A = np.column_stack([np.ones(len(X)), X])
+        self.xtx += A.T @ A
+        self.xty += A.T @ Y
+        self.yty += (Y ** 2).sum(axis=0)
+        self.rows += len(X)
+
+    def _indices(self, names):
+        return [0] + [1 + FEATURE_NAMES.index(name) for name in names]
+
+    def fit(self, names=TRAIN_FEATURES):
+        """(intercept, coef, feature_means) of the ridge solution on `names`."""
+        idx = self._indices(names)
+        xtx = self.xtx[np.ix_(idx, idx)]
+        penalty = RIDGE * np.trace(xtx) / len(idx) * np.eye(len(idx))
+        penalty[0, 0] = 0.0
+        beta = np.linalg.solve(xtx + penalty, self.xty[idx])
+        means = self.xtx[0, idx[1:]] / max(self.rows, 1)
+        return beta[0], beta[1:].T, means
+
+    def rmse(self, model: LinearWeatherModel):
+        """Per-target RMSE of `model` over the accumulated rows, or None if the model uses unknown features."""
+        if self.rows == 0 or not set(model.feature_names) <= set(FEATURE_NAMES):
+            return None
+        idx = self._indices(model.feature_names)
+        beta = np.vstack([model.intercept, model.coef.T])
+        xtx = self.xtx[np.ix_(idx, idx)]
+        sse = [self.yty[k] - 2 * beta[:, k] @ self.xty[idx, k] + beta[:, k] @ xtx @ beta[:, k] for k in range(2)]
+        return [float(np.sqrt(max(value, 0.0) / self.rows)) for value in sse]
+
+    def to_dict(self):
+        return {"xtx": self.xtx.tolist(), "xty": self.xty.tolist(), "yty": self.yty.tolist(), "rows": self.rows}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["xtx"], data["xty"], data["yty"], data["rows"])
+
+
+def _accumulate(rows, last_id, train: SufficientStats, holdout: SufficientStats):
+    """Fold samples whose target reading is newer than last_id into the stats (runs on the ML executor)."""
+    rows = sorted(rows, key=lambda row: (row['location_id'], row['timestamp'], row['id']))
+    features = build_features(rows)
+    ids, location_ids = features["id"], features["location_id"]
+    next_ids = np.zeros(len(ids), dtype=np.int64)
+    next_ids[:-1] = np.where(location_ids[1:] == location_ids[:-1], ids[1:], 0)
+
+    X = np.column_stack([features[name] for name in FEATURE_NAMES])
+    Y = np.column_stack([features["target_temp"], features["target_humidity"]])
+    usable = (next_ids > last_id) & np.isfinite(X).all(axis=1) & np.isfinite(Y).all(axis=1)
+    held_out = next_ids % HOLDOUT_EVERY == 0
+    train.update(X[usable & ~held_out], Y[usable & ~held_out])
+    holdout.update(X[usable & held_out], Y[usable & held_out])
+
+
+def _fit_candidate(train: SufficientStats, holdout: SufficientStats):
+    """Fit a candidate and score it and the live model on the holdout (runs on the ML executor).
+
+    Reading weather_service.model may load or bootstrap-train the live
+    model, which must not happen on the event loop.
+    """
+    intercept, coef, means = train.fit()
+    candidate = LinearWeatherModel(TRAIN_FEATURES, coef, intercept, means)
+    return candidate, holdout.rmse(candidate), holdout.rmse(weather_service.model)
+
+
+class WeatherTrainer:
+    """Incrementally retrains the weather model from collected readings.
+
+    Each run reads only readings added since the previous one (in batches of
+    TRAIN_BATCH_ROWS, plus the few preceding readings per location needed
+    for lag and rolling features), folds them into persisted sufficient
+    statistics and solves for a candidate. The candidate replaces the live
+    model only if it beats it on the accumulated holdout; accepted versions
+    are stored in weather_models and swapped into weather_service.
+    """
+
+    def __init__(self, interval: float = RETRAIN_INTERVAL_SECONDS, sync_interval: float = MODEL_SYNC_SECONDS):
+        self.interval = interval
+        self.sync_interval = sync_interval
+        self._task = None
+        self._sync_task = None
+        self._lock = asyncio.Lock()
+        self._stats = {
+            "runs": 0,
+            "rows_processed": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "last_run_seconds": 0.0,
+            "last_candidate_rmse": None,
+            "last_live_rmse": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.interval <= 0:
+            logger.info("Weather model retraining disabled (RETRAIN_INTERVAL_SECONDS <= 0)")
+            return
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Weather model training failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start_sync(self):
+        """Follow models trained by whichever worker runs the trainer."""
+        if self.sync_interval > 0 and (self._sync_task is None or self._sync_task.done()):
+            self._sync_task = asyncio.create_task(self._sync())
+
+    async def stop_sync(self):
+        task, self._sync_task = self._sync_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _sync(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                row = await database.fetch_one("SELECT MAX(version) AS version FROM weather_models")
+                if row['version'] is not None and row['version'] != weather_service.loaded_version:
+                    await self.load_latest()
+            except Exception as e:
+                logger.error(f"Weather model sync failed: {str(e)}")
+
+    async def load_latest(self) -> Optional[LinearWeatherModel]:
+        """Swap the newest stored model version into weather_service, if there is one."""
+        row = await database.fetch_one("SELECT * FROM weather_models ORDER BY version DESC LIMIT 1")
+        if row is None:
+            return None
+        model = LinearWeatherModel(
+            json.loads(row['feature_names']),
+            json.loads(row['coefficients']),
+            json.loads(row['intercept']),
+            json.loads(row['feature_means']),
+            version=row['version'],
+            info={
+                "created_at": row['created_at'],
+                "train_rows": row['train_rows'],
+                "holdout_rows": row['holdout_rows'],
+                "holdout_rmse": [row['holdout_rmse_temp'], row['holdout_rmse_humidity']],
+            },
+        )
+        weather_service.swap(model)
+        return model
+
+    async def run_once(self) -> Optional[int]:
+        """Process new readings and return the accepted model version, if any."""
+        async with self._lock:
+            return await self._train()
+
+    async def _train(self):
+        started = time.perf_counter()
+        self._stats["runs"] += 1
+        state = await database.fetch_one(
+            "SELECT last_record_id, state FROM weather_training_state WHERE name = 'weather'"
+        )
+        last_id = state['last_record_id']
+        saved = json.loads(state['state']) if state['state'] else None
+        train = SufficientStats.from_dict(saved["train"]) if saved else SufficientStats()
+        holdout = SufficientStats.from_dict(saved["holdout"]) if saved else SufficientStats()
+
+        processed = 0
+        while True:
+            rows = await database.fetch_rows(NEW_ROWS_QUERY, (last_id, TRAIN_BATCH_ROWS))
+            if not rows:
+                break
+            location_ids = sorted({row['location_id'] for row in rows})
+            # Readings just before the batch feed the first samples' lag/rolling features
+            context = await database.fetch_rows(
+                CONTEXT_QUERY.format(placeholders=", ".join("?" for _ in location_ids)),
+                (last_id, ROLLING_WINDOW, *location_ids)
+            )
+            await ml_executor.run(_accumulate, [*context, *rows], last_id, train, holdout)
+            last_id = rows[-1]['id']
+            processed += len(rows)
+            if len(rows) < TRAIN_BATCH_ROWS:
+                break
+
+        if processed == 0:
+            self._stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+            return None
+
+        candidate = None
+        if train.rows >= MIN_TRAIN_ROWS and holdout.rows >= MIN_HOLDOUT_ROWS:
+            candidate, candidate_rmse, live_rmse = await ml_executor.run(_fit_candidate, train, holdout)
+            self._stats["last_candidate_rmse"] = candidate_rmse
+            self._stats["last_live_rmse"] = live_rmse
+            if candidate_rmse is None:
+                # Nothing to validate against; treat as no candidate
+                candidate = None
+            elif live_rmse is not None and sum(candidate_rmse) > sum(live_rmse):
+                self._stats["rejected"] += 1
+                candidate = None
+
+        version = None
+        async with database.pool.writer() as db:
+            await db.execute(
+                "UPDATE weather_training_state SET last_record_id = ?, state = ? WHERE name = 'weather'",
+                (last_id, json.dumps({"train": train.to_dict(), "holdout": holdout.to_dict()}))
+            )
+            if candidate is not None:
+                cursor = await db.execute(
+                    """
+                    INSERT INTO weather_models (feature_names, coefficients, intercept, feature_means,
+                                                train_rows, holdout_rows, holdout_rmse_temp, holdout_rmse_humidity)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (json.dumps(candidate.feature_names), json.dumps(candidate.coef.tolist()),
+                     json.dumps(candidate.intercept.tolist()), json.dumps(candidate.feature_means.tolist()),
+                     train.rows, holdout.rows, *candidate_rmse)
+                )
+                version = cursor.lastrowid
+
+        self._stats["rows_processed"] += processed
+        if version is not None:
+            self._stats["accepted"] += 1
+            await self.load_latest()
+            logger.info(f"Weather model v{version} accepted (holdout RMSE {self._stats['last_candidate_rmse']})")
+        self._stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+        return version
+
+    def stats(self) -> dict:
+        # Scraped by /metrics: report what is loaded, never load or train it here
+        model = weather_service.loaded_model
+        return {
+            **self._stats,
+            "running": self.running,
+            "model_version": model.version if model is not None else None,
+            "model_features": list(model.feature_names) if model is not None else [],
+            "model_info": model.info if model is not None else {},
+        }
+
+
+weather_trainer = WeatherTrainer()
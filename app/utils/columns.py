@@ -0,0 +1,51 @@
+"""Columnar encodings of pollution records for chart clients.
+
+Rows arrive as plain tuples straight from the cursor and are transposed
+once into one NumPy array per field, so no per-row dict, Row or Pydantic
+object is ever built. Measurements are float32 (missing values are NaN,
+sent as JSON null), ids are int64 and timestamps are int64 Unix seconds
+(UTC).
+"""
+import io
+from typing import Dict, Sequence
+import numpy as np
+import orjson
+
+COLUMN_DTYPES = {
+    "id": np.int64, "location_id": np.int64, "aqi": np.float32, "pm25": np.float32, "pm10": np.float32,
+    "co": np.float32, "no2": np.float32, "temperature": np.float32, "humidity": np.float32,
+}
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def to_arrays(rows: Sequence[tuple], fields: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Transpose tuples (in `fields` order) into one array per field."""
+    # One 2-D object array built in C, then a typed cast per column
+    table = np.array(rows, dtype=object).reshape(len(rows), len(fields))
+    arrays = {}
+    for index, field in enumerate(fields):
+        if field == "timestamp":
+            arrays[field] = table[:, index].astype("datetime64[s]").astype(np.int64)
+        else:
+            # None becomes NaN for float columns
+            arrays[field] = table[:, index].astype(COLUMN_DTYPES[field])
+    return arrays
+
+
+def to_json(arrays: Dict[str, np.ndarray]) -> bytes:
+    return orjson.dumps(arrays, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def to_arrow_ipc(arrays: Dict[str, np.ndarray]) -> bytes:
+    """Arrow IPC stream of the arrays; numeric buffers are handed to Arrow without copying."""
+    import pyarrow as pa
+
+    table = pa.table({
+        field: pa.array(values.astype("datetime64[s]")) if field == "timestamp" else pa.array(values)
+        for field, values in arrays.items()
+    })
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
@@ -0,0 +1,300 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A small registry of counters, gauges and histograms, kept dependency-free
+and cheap enough for per-request and per-query use: label values are
+resolved to a child once (`metric.labels(...)`) and an observation is a
+bisect plus a few additions, under a lock unless the histogram is only
+ever observed from the event loop thread (`loop_only=True`). Existing
+`stats()` dicts are exported as gauges at scrape time through
+register_stats().
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; spans sub-millisecond DB reads up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for these label values (create once, keep the reference on hot paths)."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[Tuple[str, str, object]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [(f"{self.name}_total", _labels(self.labelnames, values), child.value)
+                for values, child in list(self._children.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def samples(self):
+        return [(self.name, _labels(self.labelnames, values), child.value)
+                for values, child in list(self._children.items())]
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Non-cumulative per bucket, plus the +Inf overflow slot
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _LoopBuckets(_Buckets):
+    __slots__ = ()
+
+    def observe(self, value: float):
+        # Observed and scraped on the event loop thread only: no lock needed
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, loop_only: bool = False):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.loop_only = loop_only
+
+    def _child(self):
+        return _LoopBuckets(self.buckets) if self.loop_only else _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        samples = []
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labelnames + ("le",), values + (_number(float(bound)),))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _labels(self.labelnames, values)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Timer:
+    """Context manager observing elapsed seconds into a histogram child."""
+
+    __slots__ = ("child", "started")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: List[Tuple[str, Callable[[], dict]]] = []
+
+    def _register(self, metric: _Metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS, loop_only: bool = False) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets, loop_only))
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict]):
+        """Export the numeric top-level entries of a stats() dict as `<prefix>_<key>` gauges."""
+        self._stats.append((prefix, stats))
+
+    def _render_stats(self) -> List[str]:
+        lines = []
+        for prefix, stats in self._stats:
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return lines
+
+    def render(self) -> str:
+        parts = [metric.render() for metric in self._metrics.values()]
+        parts += self._render_stats()
+        return "\n".join(parts) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"),
+    loop_only=True,
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests being handled")
+
+_perf_counter = time.perf_counter
+_bisect_left = bisect.bisect_left
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by method, route template and status.
+
+    Routes are labelled by their template (`/locations/{location_id}`), never
+    the raw path, so label cardinality stays bounded; requests served by a
+    mount (the static frontend) are "mount" and anything else "unmatched".
+    Kept to a couple of microseconds per request: the send wrapper is a plain
+    function, children are cached per (method, template, status) and
+    everything it touches is only used from the event loop thread, so no lock.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = HTTP_IN_FLIGHT.labels()
+        self._children = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            return send(message)
+
+        in_flight = self._in_flight
+        in_flight.value += 1
+        started = _perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = _perf_counter() - started
+            in_flight.value -= 1
+            route = scope.get("route")
+            # Unmatched requests key on whether a mount served them
+            key = (scope["method"], route.path if route is not None else "endpoint" in scope, status)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._child(scope, route, status)
+            # _LoopBuckets.observe, inlined: this runs on every request
+            child.counts[_bisect_left(child.bounds, elapsed)] += 1
+            child.sum += elapsed
+
+    @staticmethod
+    def _child(scope, route, status: int):
+        if route is not None:
+            template = route.path or "/"
+        else:
+            template = "mount" if "endpoint" in scope else "unmatched"
+        return HTTP_REQUEST_SECONDS.labels(scope["method"], template, str(status))
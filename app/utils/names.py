@@ -0,0 +1,39 @@
+import unicodedata
+from typing import Set
+
+
+def _fold(ch: str) -> str:
+    # Latin letters lose their accents, as in the FTS index (remove_diacritics 2);
+    # other scripts keep their combining marks, which are part of the word there
+    base = "".join(part for part in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(part))
+    if base and base.isascii():
+        return "".join(part if part.isalnum() else " " for part in base)
+    # Letters, digits and marks are word characters; anything else separates words
+    return ch if unicodedata.category(ch)[0] in "LNM" else " "
+
+
+def normalize_name(value: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a place name ("São Paulo, BR" -> "sao paulo br").
+
+    Names in other scripts keep their letters ("北京" -> "北京", "Москва" -> "москва").
+    """
+    if not value:
+        return ""
+    return " ".join("".join(_fold(ch) for ch in unicodedata.normalize("NFC", value)).casefold().split())
+
+
+def name_aliases(*names: str) -> Set[str]:
+    """Normalized aliases for a place: each full name plus its first comma-separated part.
+
+    WAQI reports cities as "Mumbai, India" or "Anand Vihar, Delhi, India", so
+    "Mumbai, India" also yields "mumbai".
+    """
+    aliases = set()
+    for name in names:
+        if not name:
+            continue
+        for candidate in (name, name.split(",")[0]):
+            alias = normalize_name(candidate)
+            if alias:
+                aliases.add(alias)
+    return aliases
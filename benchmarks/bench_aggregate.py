@@ -0,0 +1,111 @@
+"""Year-long aggregate from the rollup tables versus GROUP BY over raw history.
+
+Seeds --days of readings every --interval-minutes for one location, rolls
+them up once, then times GET /pollution/aggregate (daily buckets) against
+the equivalent query on pollution_records.
+
+    python -m benchmarks.bench_aggregate --days 365 --interval-minutes 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_agg_"), "bench.db"))
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import pollution
+from app.db import database, init_db
+from app.services.rollup_service import rollup_service
+
+RAW_DAILY_QUERY = """
+    SELECT strftime('%Y-%m-%d', timestamp) AS day, COUNT(*), AVG(aqi), MIN(aqi), MAX(aqi),
+           AVG(pm25), MIN(pm25), MAX(pm25), AVG(pm10), MIN(pm10), MAX(pm10)
+    FROM pollution_records
+    WHERE location_id = ? AND timestamp >= ? AND timestamp <= ?
+    GROUP BY day ORDER BY day
+"""
+
+
+def seed(days, interval_minutes):
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute("INSERT INTO locations (name, city, country) VALUES ('Bench', 'Bench', 'Bench')")
+    start = datetime(2025, 1, 1)
+    rows = []
+    for step in range(days * 24 * 60 // interval_minutes):
+        aqi = random.randint(10, 300)
+        ts = (start + timedelta(minutes=step * interval_minutes)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((1, aqi, aqi * 0.4, aqi * 0.7, ts))
+    conn.executemany(
+        "INSERT INTO pollution_records (location_id, aqi, pm25, pm10, timestamp) VALUES (?, ?, ?, ?, ?)", rows
+    )
+    conn.commit()
+    conn.close()
+    end = start + timedelta(days=days)
+    return len(rows), start, end
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def run(days, interval_minutes, repeat):
+    init_db.init_db()
+    rows, start, end = seed(days, interval_minutes)
+    await database.pool.open()
+
+    started = time.perf_counter()
+    await rollup_service.catch_up()
+    rollup_seconds = time.perf_counter() - started
+
+    app = FastAPI()
+    app.include_router(pollution.router)
+    params = {"location_id": 1, "bucket": "day", "from": start.isoformat(), "to": end.isoformat()}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            resp = await client.get("/pollution/aggregate", params=params)
+            samples.append((time.perf_counter() - t0) * 1000)
+        points = len(resp.json()["points"])
+    await database.pool.close()
+
+    conn = sqlite3.connect(database.DB_PATH)
+    raw_args = (1, start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S"))
+    raw_ms = timed(lambda: conn.execute(RAW_DAILY_QUERY, raw_args).fetchall(), repeat)
+    conn.close()
+
+    return {
+        "benchmark": "aggregate",
+        "raw_rows": rows,
+        "points": points,
+        "initial_rollup_s": round(rollup_seconds, 3),
+        "rollup_endpoint_ms": round(statistics.median(samples), 2),
+        "raw_group_by_ms": round(raw_ms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval-minutes", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.days, args.interval_minutes, args.repeat))))
+
+
+if __name__ == "__main__":
+    main()
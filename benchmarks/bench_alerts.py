@@ -0,0 +1,81 @@
+"""Per-reading cost of alert rule evaluation on the insert path.
+
+Loads --rules rules spread over --locations locations (plus --wildcard
+rules covering every location, mixing "above" and "rise" conditions with
+rolling windows), then evaluates --readings readings in batches the way
+IngestService does after each commit, and reports microseconds per reading
+and per rule check.
+
+    python -m benchmarks.bench_alerts --rules 1000 --locations 200 --readings 200000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.services.alert_service import AlertEngine, QueueSink
+
+
+def rule(rule_id, location_id, rng):
+    condition = rng.choice(("above", "rise"))
+    threshold = rng.uniform(80, 200) if condition == "above" else rng.uniform(5, 40)
+    return {
+        "id": rule_id, "name": f"rule {rule_id}", "location_id": location_id,
+        "metric": rng.choice(("aqi", "pm25")), "condition": condition,
+        "threshold": threshold, "clear_threshold": threshold * 0.9,
+        "window_size": rng.choice((1, 3, 12)), "cooldown_seconds": 0.0, "sink": "bench", "target": None,
+    }
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    engine = AlertEngine(sync_interval=0)
+    sink = QueueSink(maxsize=args.readings)
+    engine.register_sink("bench", sink)
+    rules = [rule(i + 1, 1 + i % args.locations, rng) for i in range(args.rules)]
+    rules += [rule(args.rules + i + 1, None, rng) for i in range(args.wildcard)]
+    engine.set_rules(rules)
+
+    aqi = {location_id: 60.0 for location_id in range(1, args.locations + 1)}
+    rows = []
+    for record_id in range(1, args.readings + 1):
+        location_id = rng.randint(1, args.locations)
+        aqi[location_id] = max(0.0, aqi[location_id] + rng.gauss(0, 15))
+        rows.append({
+            "id": record_id, "location_id": location_id, "aqi": int(aqi[location_id]),
+            "pm25": aqi[location_id] * 0.4, "timestamp": "2025-01-01 00:00:00",
+        })
+
+    started = time.perf_counter()
+    for first in range(0, len(rows), args.batch):
+        engine.evaluate(rows[first:first + args.batch])
+    elapsed = time.perf_counter() - started
+
+    stats = engine.stats()
+    print(json.dumps({
+        "benchmark": "alerts",
+        "rules": len(rules),
+        "readings": args.readings,
+        "rule_checks": stats["rule_checks"],
+        "fired": stats["fired"],
+        "resolved": stats["resolved"],
+        "us_per_reading": round(elapsed / args.readings * 1e6, 2),
+        "us_per_rule_check": round(elapsed / max(1, stats["rule_checks"]) * 1e6, 3),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--wildcard", type=int, default=2)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
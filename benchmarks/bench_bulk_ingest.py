@@ -0,0 +1,82 @@
+"""Sustained ingest throughput of POST /pollution/bulk.
+
+Runs against a throwaway SQLite file, never data/pollution_monitor.db.
+
+    python -m benchmarks.bench_bulk_ingest --rows 200000 --batch 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_ingest_"), "bench.db"))
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import locations, pollution
+from app.db import database, init_db
+
+
+def make_batch(size, location_ids):
+    lines = []
+    for _ in range(size):
+        lines.append(json.dumps({
+            "location_id": random.choice(location_ids),
+            "aqi": random.randint(0, 500),
+            "pm25": round(random.uniform(0, 300), 1),
+            "pm10": round(random.uniform(0, 400), 1),
+            "co": round(random.uniform(0, 10), 2),
+            "no2": round(random.uniform(0, 200), 1),
+        }))
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def run(total_rows, batch_size, location_count):
+    init_db.init_db()
+    app = FastAPI()
+    app.include_router(locations.router)
+    app.include_router(pollution.router)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        location_ids = []
+        for i in range(location_count):
+            resp = await client.post("/locations/", json={"name": f"Station {i}", "city": f"City {i}", "country": "Bench"})
+            location_ids.append(resp.json()["id"])
+
+        batches = [make_batch(batch_size, location_ids) for _ in range(max(1, total_rows // batch_size))]
+        headers = {"content-type": "application/x-ndjson"}
+
+        inserted = 0
+        started = time.perf_counter()
+        for body in batches:
+            resp = await client.post("/pollution/bulk", content=body, headers=headers)
+            resp.raise_for_status()
+            inserted += resp.json()["inserted"]
+        elapsed = time.perf_counter() - started
+
+    await database.pool.close()
+    return {
+        "benchmark": "bulk_ingest",
+        "rows": inserted,
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(inserted / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--locations", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.rows, args.batch, args.locations))))
+
+
+if __name__ == "__main__":
+    main()
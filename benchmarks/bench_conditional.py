@@ -0,0 +1,95 @@
+"""Cost of a repeat poll with and without a matching ETag.
+
+Seeds --locations locations and --readings readings, then times GET
+/locations/ and GET /pollution/?limit=1000 through the ASGI app as full
+200 responses and as conditional requests answered 304 from the in-memory
+resource versions, counting the database reads each one makes.
+
+    python -m benchmarks.bench_conditional --locations 5000 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_etag_"), "bench.db"))
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import locations, pollution
+from app.db import database, init_db
+from app.services.resource_versions import resource_versions
+
+ROUTES = {
+    "locations": ("/locations/", {}),
+    "pollution": ("/pollution/", {"limit": 1000}),
+}
+
+
+def seed(location_count, readings):
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.executemany("INSERT INTO locations (name, city, country, latitude, longitude) VALUES (?, ?, 'XX', ?, ?)",
+                     [(f"Station {i}", f"City {i}", i % 90, i % 180) for i in range(location_count)])
+    conn.executemany("INSERT INTO pollution_records (location_id, aqi, pm25) VALUES (?, ?, ?)",
+                     [(1 + i % location_count, 50 + i % 200, 20.0 + i % 80) for i in range(readings)])
+    conn.commit()
+    conn.close()
+
+
+async def poll(client, path, params, headers, requests):
+    samples = []
+    reads = database.pool.stats()["reader_acquires"]
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path, params=params, headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+    return response, statistics.median(samples), (database.pool.stats()["reader_acquires"] - reads) / requests
+
+
+async def run(args):
+    init_db.init_db()
+    seed(args.locations, args.readings)
+    await database.pool.open()
+    await resource_versions.load()
+
+    app = FastAPI()
+    app.include_router(locations.router)
+    app.include_router(pollution.router)
+    report = {"benchmark": "conditional", "location_count": args.locations, "reading_count": args.readings}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name, (path, params) in ROUTES.items():
+                full, full_ms, full_reads = await poll(client, path, params, {}, args.requests)
+                cached, cached_ms, cached_reads = await poll(
+                    client, path, params, {"If-None-Match": full.headers["etag"]}, args.requests
+                )
+                assert full.status_code == 200 and cached.status_code == 304
+                report[name] = {
+                    "full_ms": round(full_ms, 3),
+                    "full_bytes": len(full.content),
+                    "full_db_reads": full_reads,
+                    "not_modified_ms": round(cached_ms, 3),
+                    "not_modified_db_reads": cached_reads,
+                    "speedup": round(full_ms / cached_ms, 1),
+                }
+    finally:
+        await database.pool.close()
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=5000)
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Event-loop responsiveness while slow Gemini calls are in flight.
+
+Replaces the Gemini model with a fake whose generate_content blocks for
+--genai-latency seconds, starts --concurrency /ai/analyze requests, and
+measures /api/health latency while they run. With the GenAI executor the
+health check stays flat; run with --inline to see the blocking baseline.
+
+    python -m benchmarks.bench_event_loop --concurrency 20 --genai-latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_loop_"), "bench.db"))
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import ai, locations, pollution
+from app.db import database, init_db
+from app.services import genai_service as genai_module
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowModel:
+    """Stands in for genai.GenerativeModel with a blocking call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(self.latency)
+        response = FakeResponse("Simulated analysis.")
+        return [response] if stream else response
+
+
+class InlineExecutor:
+    """Runs the blocking call on the event loop thread itself."""
+
+    async def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def build_app():
+    # Same routers as app.main, without its file logging and static mount
+    app = FastAPI()
+    app.include_router(locations.router)
+    app.include_router(pollution.router)
+    app.include_router(ai.router)
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(concurrency, latency, inline):
+    init_db.init_db()
+    genai_module.api_key = "benchmark"
+    genai_module.genai_service._model = SlowModel(latency)
+    # Every request must reach the (fake) model
+    genai_module.genai_cache.ttl = 0
+    if inline:
+        # Baseline: call the SDK directly on the event loop, like before the executor
+        genai_module.genai_executor = InlineExecutor()
+
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # One location per request so single-flight doesn't merge them into one call
+        location_ids = []
+        for i in range(concurrency):
+            resp = await client.post("/locations/", json={"name": f"Bench {i}", "city": "Bench", "country": "Bench"})
+            location_ids.append(resp.json()["id"])
+            await client.post("/pollution/", json={"location_id": location_ids[-1], "aqi": 180, "pm25": 90.0, "pm10": 120.0})
+
+        health_latencies = []
+        done = asyncio.Event()
+
+        async def probe():
+            # Latency is measured from when the probe was due, so time spent
+            # waiting for a blocked event loop is counted too
+            due = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                await client.get("/api/health")
+                health_latencies.append((time.perf_counter() - due) * 1000)
+                due = max(due + 0.01, time.perf_counter())
+
+        prober = asyncio.create_task(probe())
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        await asyncio.gather(*(client.get(f"/ai/analyze/{location_id}") for location_id in location_ids))
+        analyze_seconds = time.perf_counter() - started
+        done.set()
+        await prober
+
+    await database.pool.close()
+    return {
+        "benchmark": "event_loop",
+        "mode": "inline" if inline else "executor",
+        "concurrent_analyze": concurrency,
+        "genai_latency_s": latency,
+        "analyze_wall_s": round(analyze_seconds, 3),
+        "health_samples": len(health_latencies),
+        "health_p50_ms": round(statistics.median(health_latencies), 2),
+        "health_p99_ms": round(percentile(health_latencies, 99), 2),
+        "health_max_ms": round(max(health_latencies), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--genai-latency", type=float, default=1.0)
+    parser.add_argument("--inline", action="store_true", help="block the loop like the pre-executor code")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.concurrency, args.genai_latency, args.inline))))
+
+
+if __name__ == "__main__":
+    main()
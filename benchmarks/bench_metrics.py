@@ -0,0 +1,172 @@
+"""Per-request cost of the metrics middleware, per-query timing and logging.
+
+Drives apps directly over ASGI (no HTTP client, no sockets), with and
+without MetricsMiddleware. The middleware is measured around a bare ASGI
+app that matches a route the way Starlette's router does, so the couple
+of microseconds it costs aren't lost in routing noise. The DB pool's
+per-query timing and one queued log record are timed on their own, and
+a real GET /locations/{location_id} (locations router, pooled SQLite
+read) is timed for scale.
+
+The total for a request (middleware plus --queries timed queries;
+successful requests log nothing) is reported two ways: against the
+200 µs a request has at 5k req/s on one worker, and as a share of the
+real request measured on the same machine. The second is what holds at
+any rate: a machine slower than 200 µs per request needs more workers
+for 5k req/s, and its metrics cost grows in the same proportion. The two
+agree where a request costs exactly the 200 µs slot.
+
+    python -m benchmarks.bench_metrics --requests 50000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_metrics_"), "bench.db"))
+os.environ.setdefault("LOG_FILE", "")
+
+from fastapi import FastAPI
+from starlette.responses import Response
+from starlette.routing import Route
+
+from app.api import locations
+from app.db import database, init_db
+from app.services.resource_versions import resource_versions
+from app.utils.log_config import _QueueHandler
+from app.utils.metrics import MetricsMiddleware, registry
+
+BUDGET_US = 1_000_000 / 5000
+BUDGET_PCT = 1.0
+
+
+async def endpoint(request):
+    return Response(b"ok")
+
+
+ROUTE = Route("/locations/{location_id}", endpoint)
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"ok"}
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = ROUTE
+    await send(START)
+    await send(BODY)
+
+
+async def drive(app, requests, path="/locations/7"):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def middleware_us(requests, rounds):
+    metered = MetricsMiddleware(bare_app)
+    # Warm up the label cache before timing
+    await drive(bare_app, 1000)
+    await drive(metered, 1000)
+    # Interleaved rounds, median of the paired differences, so machine noise
+    # doesn't land on one side
+    added = []
+    for _ in range(rounds):
+        base = await drive(bare_app, requests)
+        added.append(await drive(metered, requests) - base)
+    return max(statistics.median(added), 0.0)
+
+
+def query_timing_us(requests):
+    """What ConnectionPool.reader() adds per query: one clock read and one observation."""
+    held = registry.histogram("bench_query_seconds", "Benchmark query", loop_only=True).labels()
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(requests):
+            # The clock read on acquire was already there for pool stats
+            held.observe(time.perf_counter() - started)
+        best = min(best, time.perf_counter() - started)
+    return best / requests * 1e6
+
+
+def log_record_us(requests):
+    """Cost on the calling thread of one record through the queue handler."""
+    logger = logging.getLogger("bench_metrics")
+    logger.propagate = False
+    logger.handlers = [_QueueHandler(queue.SimpleQueue())]
+    logger.setLevel(logging.INFO)
+    started = time.perf_counter()
+    for i in range(requests):
+        logger.info("Stored reading for location %s", i, extra={"location_id": i})
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def real_request_us(requests, rounds):
+    init_db.init_db()
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.executemany("INSERT INTO locations (name, city, country, latitude, longitude) VALUES (?, ?, 'XX', ?, ?)",
+                     [(f"Station {i}", f"City {i}", i % 90, i % 180) for i in range(100)])
+    conn.commit()
+    conn.close()
+    await database.pool.open()
+    await resource_versions.load()
+    app = FastAPI()
+    app.include_router(locations.router)
+    try:
+        await drive(app, 100)
+        return statistics.median([await drive(app, requests) for _ in range(rounds)])
+    finally:
+        await database.pool.close()
+
+
+async def run(args):
+    middleware = await middleware_us(args.requests, args.rounds)
+    query = query_timing_us(args.requests)
+    request = await real_request_us(max(args.requests // 50, 200), args.rounds)
+    total = middleware + args.queries * query
+    print(json.dumps({
+        "benchmark": "metrics",
+        "requests": args.requests,
+        "middleware_overhead_us": round(middleware, 2),
+        "query_timing_us": round(query, 2),
+        "queries_per_request": args.queries,
+        "log_record_us": round(log_record_us(args.requests), 2),
+        "log_records_per_request": 0,
+        "total_overhead_us": round(total, 2),
+        "budget_us_at_5k_rps": BUDGET_US,
+        "overhead_pct_of_budget": round(total / BUDGET_US * 100, 2),
+        "request_us": round(request, 1),
+        "overhead_pct_of_request": round(total / request * 100, 2),
+        "within_budget": total / request * 100 < BUDGET_PCT,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=9)
+    parser.add_argument("--queries", type=int, default=1, help="timed DB queries per request (reads make one)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Per-row WeatherMLService.predict versus vectorized predict_batch.
+
+    python -m benchmarks.bench_predict_batch --rows 10000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.services.ml_service import weather_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    aqi = rng.integers(0, 500, args.rows)
+    pm25 = rng.uniform(0, 300, args.rows)
+    month, hour = 6, 12
+
+    started = time.perf_counter()
+    loop_results = [weather_service.predict(int(a), float(p), month, hour) for a, p in zip(aqi, pm25)]
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = weather_service.predict_batch(aqi, pm25, month, hour)
+    batch_seconds = time.perf_counter() - started
+
+    # Both paths must agree
+    assert [r["condition"] for r in loop_results] == batch["condition"].tolist()
+    assert np.allclose([r["predicted_temp"] for r in loop_results], batch["predicted_temp"])
+
+    print(json.dumps({
+        "benchmark": "predict_batch",
+        "rows": args.rows,
+        "loop_us_per_row": round(loop_seconds / args.rows * 1e6, 3),
+        "batch_us_per_row": round(batch_seconds / args.rows * 1e6, 4),
+        "speedup": round(loop_seconds / batch_seconds, 1),
+    }))
+
+
+if __name__ == "__main__":
+    main()
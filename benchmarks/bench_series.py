@@ -0,0 +1,139 @@
+"""Chart series as columnar arrays versus JSON record objects.
+
+Seeds --points readings for one location, then compares:
+  * serialization CPU for the whole series: the JSON page path (Row ->
+    dict -> PollutionRecord -> JSON) against plain tuples -> NumPy ->
+    orjson, and -> Arrow IPC;
+  * over the ASGI app with gzip: fetching the series as JSON pages of 1000
+    records against one format=columns / format=arrow request, in time
+    and bytes on the wire.
+
+    python -m benchmarks.bench_series --points 100000
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_series_"), "bench.db"))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import TypeAdapter
+from typing import List
+
+from app.api import pollution
+from app.db import database, init_db, schemas
+from app.utils import columns
+
+SERIES_QUERY = f"SELECT {pollution.RECORD_COLUMNS} FROM pollution_records WHERE location_id = ? ORDER BY timestamp DESC, id DESC"
+
+
+def seed(points):
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute("INSERT INTO locations (name, city, country) VALUES ('Bench', 'Bench', 'Bench')")
+    start = datetime(2025, 1, 1)
+    rows = []
+    for step in range(points):
+        aqi = random.randint(10, 300)
+        ts = (start + timedelta(minutes=step * 5)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((1, aqi, aqi * 0.4, aqi * 0.7, 0.3, 12.0, 20 + aqi % 10, 40 + aqi % 30, ts))
+    conn.executemany(
+        "INSERT INTO pollution_records (location_id, aqi, pm25, pm10, co, no2, temperature, humidity, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def best_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return min(samples), result
+
+
+async def serialization(repeat):
+    rows = await database.fetch_rows(SERIES_QUERY, (1,))
+    tuples = await database.fetch_tuples(SERIES_QUERY, (1,))
+    adapter = TypeAdapter(List[schemas.PollutionRecord])
+    records_ms, records = best_ms(lambda: adapter.dump_json(adapter.validate_python([dict(row) for row in rows])), repeat)
+    columns_ms, payload = best_ms(lambda: columns.to_json(columns.to_arrays(tuples, pollution.RECORD_FIELDS)), repeat)
+    arrow_ms, arrow = best_ms(lambda: columns.to_arrow_ipc(columns.to_arrays(tuples, pollution.RECORD_FIELDS)), repeat)
+    return {
+        "records_serialize_ms": round(records_ms, 1),
+        "columns_serialize_ms": round(columns_ms, 1),
+        "arrow_serialize_ms": round(arrow_ms, 1),
+        "records_bytes": len(records),
+        "columns_bytes": len(payload),
+        "arrow_bytes": len(arrow),
+        "records_gzip_bytes": len(gzip.compress(records)),
+        "columns_gzip_bytes": len(gzip.compress(payload)),
+    }
+
+
+async def over_http(points):
+    app = FastAPI()
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=3)
+    app.include_router(pollution.router)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # JSON pages, following X-Next-Cursor like a client would
+        started, wire, fetched, cursor = time.perf_counter(), 0, 0, None
+        while True:
+            params = {"location_id": 1, "limit": pollution.MAX_PAGE_SIZE, **({"cursor": cursor} if cursor else {})}
+            async with client.stream("GET", "/pollution/", params=params) as response:
+                body = b"".join([chunk async for chunk in response.aiter_raw()])
+            wire += len(body)
+            fetched += len(json.loads(gzip.decompress(body)))
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        results["json_pages_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        results["json_pages_wire_bytes"] = wire
+        assert fetched == points
+
+        for fmt in ("columns", "arrow"):
+            started = time.perf_counter()
+            async with client.stream("GET", "/pollution/", params={"location_id": 1, "format": fmt}) as response:
+                body = b"".join([chunk async for chunk in response.aiter_raw()])
+            results[f"{fmt}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            results[f"{fmt}_wire_bytes"] = len(body)
+    return results
+
+
+async def run(args):
+    init_db.init_db()
+    seed(args.points)
+    await database.pool.open()
+    try:
+        report = {"benchmark": "series", "points": args.points}
+        report.update(await serialization(args.repeat))
+        report.update(await over_http(args.points))
+        report["serialize_speedup"] = round(report["records_serialize_ms"] / report["columns_serialize_ms"], 1)
+        report["wire_reduction"] = round(report["json_pages_wire_bytes"] / report["columns_wire_bytes"], 1)
+        print(json.dumps(report))
+    finally:
+        await database.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
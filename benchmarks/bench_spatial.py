@@ -0,0 +1,78 @@
+"""Nearest-location lookups: SpatialIndex versus a brute-force scan.
+
+Builds an index over --locations random points, then times k-nearest and
+radius queries against a full haversine scan of every coordinate (what a
+lookup without an index has to do), and the old `city LIKE` lookup on a
+locations table of the same size.
+
+    python -m benchmarks.bench_spatial --locations 100000 --queries 1000
+"""
+import argparse
+import json
+import sqlite3
+import statistics
+import time
+
+import numpy as np
+
+from app.services.spatial_index import SpatialIndex, haversine_km
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return round(statistics.median(samples), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--radius-km", type=float, default=25.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(-60, 70, args.locations)
+    lons = rng.uniform(-180, 180, args.locations)
+    points = {i + 1: (float(lat), float(lon)) for i, (lat, lon) in enumerate(zip(lats, lons))}
+
+    started = time.perf_counter()
+    index = SpatialIndex(points)
+    build_seconds = time.perf_counter() - started
+
+    queries = [(float(lat), float(lon)) for lat, lon in zip(rng.uniform(-60, 70, args.queries),
+                                                          rng.uniform(-180, 180, args.queries))]
+
+    def brute_nearest(lat, lon):
+        distances = haversine_km(lat, lon, lats, lons)
+        return np.argpartition(distances, args.k)[:args.k]
+
+    # Both paths must agree
+    for lat, lon in queries[:20]:
+        expected = {int(i) + 1 for i in brute_nearest(lat, lon)}
+        assert expected == {location_id for location_id, _ in index.nearest(lat, lon, args.k)}
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE locations (id INTEGER PRIMARY KEY, city TEXT, latitude REAL, longitude REAL)")
+    conn.executemany("INSERT INTO locations VALUES (?, ?, ?, ?)",
+                     [(i, f"City {i}", lat, lon) for i, (lat, lon) in points.items()])
+    like_queries = [(f"%City {rng.integers(1, args.locations)}%",) for _ in range(min(args.queries, 50))]
+
+    print(json.dumps({
+        "benchmark": "spatial",
+        "locations": args.locations,
+        "build_s": round(build_seconds, 3),
+        "index_nearest_us": timed(lambda lat, lon: index.nearest(lat, lon, args.k), queries),
+        "index_within_us": timed(lambda lat, lon: index.within(lat, lon, args.radius_km), queries),
+        "brute_force_nearest_us": timed(brute_nearest, queries[:100]),
+        "sql_like_us": timed(lambda q: conn.execute("SELECT * FROM locations WHERE city LIKE ?", (q,)).fetchone(),
+                             like_queries),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cold-start cost: `import app.main` time and time to the first 200 from /api/health.
+
+Each run starts a fresh interpreter against a throwaway database (migrated
+beforehand, so schema setup isn't counted): once with `-X importtime` to
+total the import of app.main and list the slowest imports, and once as a
+uvicorn server polled until /api/health answers 200. Medians over --runs.
+Exits non-zero if either median exceeds its budget, so it can guard
+against startup regressions in CI.
+
+    python -m benchmarks.bench_startup --runs 5 --max-import-ms 2000 --max-ready-ms 4000
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_env():
+    # Servers run from a scratch directory (so the repo's app.log is untouched)
+    # that links in the static frontend app.main mounts
+    directory = tempfile.mkdtemp(prefix="bench_startup_")
+    os.symlink(os.path.join(ROOT, "frontend"), os.path.join(directory, "frontend"))
+    env = dict(
+        os.environ,
+        DB_PATH=os.path.join(directory, "bench.db"),
+        ARCHIVE_DIR=os.path.join(directory, "archive"),
+        # Keep background jobs and upstream calls out of the measurement
+        REFRESH_INTERVAL_SECONDS="0",
+        RETENTION_DAYS="0",
+        RETRAIN_INTERVAL_SECONDS="0",
+        PYTHONPATH=ROOT,
+    )
+    subprocess.run([sys.executable, "-c", "from app.db import init_db; init_db.init_db()"],
+                   cwd=directory, env=env, check=True, capture_output=True)
+    return directory, env
+
+
+def import_times(cwd, env):
+    """(total ms for app.main, {module: cumulative ms}) from one -X importtime run."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            cwd=cwd, env=env, check=True, capture_output=True, text=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules["app.main"], modules
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_200(cwd, env, timeout=60.0):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client() as client:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with code {server.returncode}")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/api/health", timeout=1.0).status_code == 200:
+                        return (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"no 200 from /api/health within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest app-level imports to report")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    cwd, env = bench_env()
+    imports, ready, modules = [], [], {}
+    for _ in range(args.runs):
+        total, modules = import_times(cwd, env)
+        imports.append(total)
+        ready.append(time_to_first_200(cwd, env))
+
+    # App modules and top-level third-party packages, by cumulative import time
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)
+    top = [(name, round(ms, 1)) for name, ms in slowest
+           if name != "app.main" and (name.startswith("app.") or "." not in name)]
+
+    report = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "import_app_main_ms": round(statistics.median(imports), 1),
+        "time_to_first_200_ms": round(statistics.median(ready), 1),
+        "slowest_imports_ms": dict(top[:args.top]),
+    }
+    print(json.dumps(report))
+
+    failures = []
+    if args.max_import_ms is not None and report["import_app_main_ms"] > args.max_import_ms:
+        failures.append(f"import app.main took {report['import_app_main_ms']} ms (budget {args.max_import_ms})")
+    if args.max_ready_ms is not None and report["time_to_first_200_ms"] > args.max_ready_ms:
+        failures.append(f"first 200 took {report['time_to_first_200_ms']} ms (budget {args.max_ready_ms})")
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Fan-out cost of the reading stream bus with thousands of subscribers.
+
+Subscribes --subscribers consumers (each following one of --locations
+locations, plus --wildcard following everything), publishes --readings
+readings in batches like IngestService does, and measures publish time
+and how long until every consumer has drained its mailbox. A --slow
+fraction of consumers never read, to show that they cost bounded memory
+and don't hold up the others.
+
+    python -m benchmarks.bench_stream --subscribers 5000 --readings 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.pubsub import ReadingBus
+
+
+def reading(record_id, location_id):
+    return {
+        "id": record_id, "location_id": location_id, "aqi": 40 + record_id % 200, "pm25": 12.5, "pm10": 30.0,
+        "co": None, "no2": None, "temperature": 24.0, "humidity": 55.0, "timestamp": "2025-01-01 00:00:00",
+    }
+
+
+async def run(args):
+    bus = ReadingBus(poll_interval=0, max_subscribers=args.subscribers + args.wildcard)
+    received = 0
+    fast, slow = [], []
+    for i in range(args.subscribers):
+        subscription = bus.subscribe([1 + i % args.locations])
+        (slow if i < args.subscribers * args.slow else fast).append(subscription)
+    fast.extend(bus.subscribe() for _ in range(args.wildcard))
+
+    async def consume(subscription):
+        nonlocal received
+        while True:
+            payloads = await subscription.get()
+            received += len(payloads)
+
+    consumers = [asyncio.create_task(consume(subscription)) for subscription in fast]
+    await asyncio.sleep(0)
+
+    publish_seconds = 0.0
+    started = time.perf_counter()
+    for first in range(1, args.readings + 1, args.batch):
+        batch = [reading(i, 1 + i % args.locations) for i in range(first, min(first + args.batch, args.readings + 1))]
+        t = time.perf_counter()
+        bus.publish(batch)
+        publish_seconds += time.perf_counter() - t
+        # Let consumers run between batches, as they would between requests
+        await asyncio.sleep(0)
+    while any(subscription._pending for subscription in fast):
+        await asyncio.sleep(0)
+    drained_seconds = time.perf_counter() - started
+
+    for task in consumers:
+        task.cancel()
+    print(json.dumps({
+        "benchmark": "stream",
+        "subscribers": args.subscribers + args.wildcard,
+        "readings": args.readings,
+        "offers": bus.stats()["offered"],
+        "delivered": received,
+        "publish_us_per_reading": round(publish_seconds / args.readings * 1e6, 1),
+        "drain_s": round(drained_seconds, 3),
+        "slow_consumers": len(slow),
+        "slow_max_pending": max((len(s._pending) for s in slow), default=0),
+        "slow_conflated": sum(s.conflated for s in slow),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--wildcard", type=int, default=10)
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--readings", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--slow", type=float, default=0.1, help="fraction of consumers that never read")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Load test and micro-benchmarks for the whole API, as one comparable JSON report.
+
+Seeds a throwaway database with --locations locations and --readings
+readings each, replaces WAQI and Gemini with in-process fakes that answer
+after --waqi-latency / --genai-latency seconds, starts the real app
+(app.main, lifespan and middleware included, background jobs off) and
+drives every route of the locations, pollution and ai routers over ASGI
+with --concurrency concurrent clients, reporting throughput and
+p50/p95/p99 per route. Micro-benchmarks time WeatherMLService.predict,
+the database helpers and response serialization. The same --seed gives
+the same data and request mix, so reports from two commits can be
+compared with --compare (exits 1 when a route's p95 or a micro-benchmark
+is slower than the baseline by more than --tolerance).
+
+    python -m benchmarks.bench_suite --output baseline.json
+    python -m benchmarks.bench_suite --compare baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+_directory = tempfile.mkdtemp(prefix="bench_suite_")
+os.environ.setdefault("DB_PATH", os.path.join(_directory, "bench.db"))
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(_directory, "archive"))
+# Keep the repo's app.log untouched and background jobs out of the measurement
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("REFRESH_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RETENTION_DAYS", "0")
+os.environ.setdefault("RETRAIN_INTERVAL_SECONDS", "0")
+
+import httpx
+from pydantic import TypeAdapter
+
+from app.api.pollution import RECORD_COLUMNS, RECORD_FIELDS
+from app.db import database, init_db, schemas
+from app.main import app
+from app.services import genai_service as genai_module
+from app.services.external_pollution import external_pollution_service
+from app.services.ml_service import weather_service
+from app.utils import columns
+from benchmarks.bench_event_loop import FakeResponse, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Long-lived streams are not request/response; see bench_stream
+SKIPPED = {
+    "GET /pollution/stream": "long-lived SSE stream, see bench_stream",
+    "WS /pollution/stream": "long-lived WebSocket, see bench_stream",
+}
+
+
+class FakeGemini:
+    """Stands in for genai.GenerativeModel; blocks its (executor) thread like the SDK."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        time.sleep(self.latency)
+        if generation_config:
+            text = json.dumps({"analysis": "Simulated analysis.", "advice": "Simulated advice."})
+        else:
+            text = "Simulated response. " * 20
+        if not stream:
+            return FakeResponse(text)
+        return [FakeResponse(text[i:i + 64]) for i in range(0, len(text), 64)]
+
+
+def fake_waqi(latency, seed):
+    """httpx transport answering /feed/<city>/ and /feed/geo:<lat>;<lon>/ like WAQI."""
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        station = request.url.path.strip("/").split("/", 1)[1]
+        rng = random.Random(f"{seed}:{station}")
+        if station.startswith("geo:"):
+            lat, lon = (float(value) for value in station[4:].split(";"))
+            name = f"Station {lat:.3f},{lon:.3f}"
+        else:
+            lat, lon, name = rng.uniform(-60, 60), rng.uniform(-180, 180), station
+        aqi = rng.randint(10, 300)
+        return httpx.Response(200, json={"status": "ok", "data": {
+            "aqi": aqi,
+            "city": {"name": name, "geo": [lat, lon]},
+            "iaqi": {"pm25": {"v": aqi * 0.4}, "pm10": {"v": aqi * 0.7}, "co": {"v": 0.5}, "no2": {"v": 12.0},
+                     "t": {"v": rng.uniform(-5, 35)}, "h": {"v": rng.uniform(20, 90)}},
+            "time": {"iso": datetime.utcnow().isoformat()},
+        }})
+
+    return httpx.MockTransport(handler)
+
+
+def seed_data(location_count, readings, interval_minutes, seed):
+    rng = random.Random(seed)
+    locations = [(f"Station {i}", f"City {i}", "XX", rng.uniform(-60, 60), rng.uniform(-180, 180))
+                 for i in range(location_count)]
+    start = datetime.utcnow() - timedelta(minutes=readings * interval_minutes)
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.executemany("INSERT INTO locations (name, city, country, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
+                     locations)
+
+    def rows():
+        for step in range(readings):
+            ts = (start + timedelta(minutes=step * interval_minutes)).strftime("%Y-%m-%d %H:%M:%S")
+            for location_id in range(1, location_count + 1):
+                aqi = rng.randint(10, 300)
+                yield location_id, aqi, aqi * 0.4, aqi * 0.7, 0.5, 12.0, ts
+
+    conn.executemany("INSERT INTO pollution_records (location_id, aqi, pm25, pm10, co, no2, timestamp) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    conn.commit()
+    conn.close()
+    return [(i + 1, city, lat, lon) for i, (_, city, _, lat, lon) in enumerate(locations)]
+
+
+def route_requests(locations, args):
+    """{route: factory(index) -> (method, url, request kwargs)} for every request/response route."""
+    rng = random.Random(args.seed)
+    created = []
+
+    def pick():
+        return rng.choice(locations)
+
+    def record(location_id):
+        aqi = rng.randint(10, 300)
+        return {"location_id": location_id, "aqi": aqi, "pm25": aqi * 0.4, "pm10": aqi * 0.7, "co": 0.5, "no2": 12.0}
+
+    def create_location(i):
+        return "POST", "/locations/", {"json": {"name": f"Load {i}", "city": f"Load City {i}", "country": "XX",
+                                                "latitude": rng.uniform(-60, 60), "longitude": rng.uniform(-180, 180)}}
+
+    def delete_location(i):
+        # Removes what the POST /locations/ route created
+        return "DELETE", f"/locations/{created.pop()}", {}
+
+    requests = {
+        "POST /locations/": create_location,
+        "GET /locations/": lambda i: ("GET", "/locations/", {}),
+        "GET /locations/search": lambda i: ("GET", "/locations/search", {"params": {"q": pick()[1]}}),
+        "GET /locations/nearest": lambda i: ("GET", "/locations/nearest", {"params": {"lat": pick()[2], "lon": pick()[3]}}),
+        "GET /locations/within": lambda i: ("GET", "/locations/within",
+                                            {"params": {"lat": pick()[2], "lon": pick()[3], "radius_km": 500}}),
+        "GET /locations/{location_id}": lambda i: ("GET", f"/locations/{pick()[0]}", {}),
+        "DELETE /locations/{location_id}": delete_location,
+        "POST /pollution/": lambda i: ("POST", "/pollution/", {"json": record(pick()[0])}),
+        "POST /pollution/bulk": lambda i: ("POST", "/pollution/bulk",
+                                           {"json": [record(pick()[0]) for _ in range(args.bulk_size)]}),
+        "GET /pollution/latest": lambda i: ("GET", "/pollution/latest", {}),
+        "GET /pollution/aggregate": lambda i: ("GET", "/pollution/aggregate",
+                                               {"params": {"location_id": pick()[0], "bucket": "day"}}),
+        "GET /pollution/": lambda i: ("GET", "/pollution/", {"params": {"location_id": pick()[0], "limit": 100}}),
+        "GET /pollution/?format=columns": lambda i: ("GET", "/pollution/",
+                                                     {"params": {"location_id": pick()[0], "format": "columns"}}),
+        "POST /pollution/fetch-by-city/{city_name}": lambda i: ("POST", f"/pollution/fetch-by-city/{pick()[1]}", {}),
+        "POST /pollution/fetch-by-geo": lambda i: ("POST", "/pollution/fetch-by-geo",
+                                                   {"params": {"lat": pick()[2], "lon": pick()[3]}}),
+        "POST /pollution/fetch-real/{location_id}": lambda i: ("POST", f"/pollution/fetch-real/{pick()[0]}", {}),
+        "POST /ai/predict_weather/batch": lambda i: ("POST", "/ai/predict_weather/batch",
+                                                     {"json": {"location_ids": [pick()[0] for _ in range(20)]}}),
+        "POST /ai/predict_weather/{location_id}": lambda i: ("POST", f"/ai/predict_weather/{pick()[0]}", {}),
+        "GET /ai/analyze/{location_id}": lambda i: ("GET", f"/ai/analyze/{pick()[0]}", {}),
+        "GET /ai/analyze/{location_id}?stream=true": lambda i: ("GET", f"/ai/analyze/{pick()[0]}",
+                                                                {"params": {"stream": "true"}}),
+        "GET /ai/advice/{location_id}": lambda i: ("GET", f"/ai/advice/{pick()[0]}", {}),
+        "GET /ai/dashboard/{location_id}": lambda i: ("GET", f"/ai/dashboard/{pick()[0]}", {}),
+    }
+    return requests, created
+
+
+async def load(client, factory, requests, concurrency, on_response=None):
+    latencies = []
+    if not requests:
+        return None
+    statuses = Counter()
+    indices = iter(range(requests))
+
+    async def worker():
+        # Workers share one iterator, so request i is always built i-th
+        for index in indices:
+            method, url, kwargs = factory(index)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] += 1
+            if on_response is not None:
+                on_response(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+async def timed(fn, repeat):
+    """Median microseconds per call of the coroutine function `fn`."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return {"median_us": round(statistics.median(samples), 2), "repeat": repeat}
+
+
+async def micro_benchmarks(args):
+    async def sync(fn):
+        fn()
+
+    weather_service.warm()
+    rng = random.Random(args.seed)
+    aqi = [rng.randint(10, 300) for _ in range(args.series_points)]
+    pm25 = [value * 0.4 for value in aqi]
+    history = f"SELECT {RECORD_COLUMNS} FROM pollution_records WHERE location_id = ? ORDER BY timestamp DESC LIMIT ?"
+    params = (1, args.series_points)
+    rows = await database.fetch_rows(history, params)
+    tuples = await database.fetch_tuples(history, params)
+    dicts = [dict(row) for row in rows]
+    records = TypeAdapter(List[schemas.PollutionRecord])
+
+    results = {
+        "ml.predict": await timed(lambda: sync(lambda: weather_service.predict(120, 48.0, 6, 14)), args.micro_repeat),
+        "ml.predict_batch": await timed(
+            lambda: sync(lambda: weather_service.predict_batch(aqi=aqi, pm25=pm25, month=6, hour=14)), 20
+        ),
+        "db.fetch_one": await timed(lambda: database.fetch_one("SELECT * FROM locations WHERE id = ?", (1,)),
+                                    args.micro_repeat),
+        "db.fetch_rows.latest_readings": await timed(lambda: database.fetch_rows("SELECT * FROM latest_readings"), 50),
+        "db.fetch_rows.history": await timed(lambda: database.fetch_rows(history, params), 20),
+        "db.fetch_tuples.history": await timed(lambda: database.fetch_tuples(history, params), 20),
+        "db.execute_query.insert": await timed(lambda: database.execute_query(
+            "INSERT INTO pollution_records (location_id, aqi, pm25) VALUES (?, ?, ?)", (1, 100, 40.0)
+        ), args.micro_repeat),
+        "serialize.pydantic_json": await timed(
+            lambda: sync(lambda: records.dump_json(records.validate_python(dicts))), 20
+        ),
+        "serialize.columns_orjson": await timed(
+            lambda: sync(lambda: columns.to_json(columns.to_arrays(tuples, RECORD_FIELDS))), 20
+        ),
+    }
+    results["ml.predict_batch"]["rows"] = len(aqi)
+    for name in ("db.fetch_rows.history", "db.fetch_tuples.history", "serialize.pydantic_json",
+                 "serialize.columns_orjson"):
+        results[name]["rows"] = len(rows)
+    return results
+
+
+def compare(report, baseline, tolerance):
+    """Routes whose p95 and micro-benchmarks whose median grew by more than `tolerance`."""
+    regressions = []
+    pairs = [(f"routes.{name}.p95_ms", result["p95_ms"], baseline.get("routes", {}).get(name, {}).get("p95_ms"))
+             for name, result in report["routes"].items()]
+    pairs += [(f"micro.{name}.median_us", result["median_us"],
+               baseline.get("micro", {}).get(name, {}).get("median_us"))
+              for name, result in report["micro"].items()]
+    for metric, current, previous in pairs:
+        if previous and current > previous * (1 + tolerance):
+            regressions.append({"metric": metric, "baseline": previous, "current": current,
+                                "change_pct": round((current / previous - 1) * 100, 1)})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    init_db.init_db()
+    locations = seed_data(args.locations, args.readings, args.interval_minutes, args.seed)
+
+    genai_module.api_key = "benchmark"
+    genai_module.genai_service._model = FakeGemini(args.genai_latency)
+    if not args.upstream_cache:
+        # Every AI / fetch request reaches the fakes (concurrent duplicates still coalesce)
+        genai_module.genai_cache.ttl = 0
+        external_pollution_service.cache_ttl = 0
+
+    report = {
+        "benchmark": "suite",
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "routes": {},
+        "skipped": SKIPPED,
+    }
+    async with app.router.lifespan_context(app):
+        external_pollution_service.token = "benchmark"
+        await external_pollution_service.aclose()
+        external_pollution_service._client = httpx.AsyncClient(transport=fake_waqi(args.waqi_latency, args.seed))
+
+        requests, created = route_requests(locations, args)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, factory in requests.items():
+                if args.routes and not any(part in name for part in args.routes):
+                    continue
+                on_response = None
+                if name == "POST /locations/":
+                    on_response = lambda response: created.append(response.json()["id"])
+                # Reads are cheap; writes, upstream fetches and AI calls get fewer requests
+                reads = name.startswith("GET") and not name.startswith("GET /ai/")
+                count = args.requests if reads else args.write_requests
+                # Lazy imports, index builds and connection setup stay out of the percentiles
+                warmup = min(args.warmup, len(created) if name.startswith("DELETE") else count)
+                await load(client, factory, warmup, args.concurrency, on_response)
+                if name.startswith("DELETE"):
+                    count = len(created)
+                if count:
+                    report["routes"][name] = await load(client, factory, count, args.concurrency, on_response)
+        report["micro"] = await micro_benchmarks(args)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("commit")
+        report["regressions"] = compare(report, baseline, args.tolerance)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=500, help="readings per location")
+    parser.add_argument("--interval-minutes", type=int, default=60)
+    parser.add_argument("--requests", type=int, default=500, help="requests per read route")
+    parser.add_argument("--write-requests", type=int, default=100,
+                        help="requests per write, upstream-fetch and AI route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route first")
+    parser.add_argument("--bulk-size", type=int, default=100)
+    parser.add_argument("--waqi-latency", type=float, default=0.05)
+    parser.add_argument("--genai-latency", type=float, default=0.2)
+    parser.add_argument("--upstream-cache", action="store_true", help="keep the WAQI and GenAI caches on")
+    parser.add_argument("--series-points", type=int, default=5000)
+    parser.add_argument("--micro-repeat", type=int, default=500)
+    parser.add_argument("--routes", nargs="*", help="only routes whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+    # Migration and startup messages go to stderr; stdout is only the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Read throughput of `python -m app.server` with 1 versus N worker processes.
+
+Seeds --locations locations with readings into a throwaway database, then
+for each worker count starts the production server and drives
+GET /pollution/latest with --concurrency keep-alive clients for --seconds,
+reporting requests per second. On a machine with N free cores the N-worker
+figure should be close to N times the single-worker one.
+
+    python -m benchmarks.bench_workers --workers 4 --concurrency 64 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_startup import bench_env, free_port
+
+
+def seed(db_path, locations):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO locations (name, city, country) VALUES (?, ?, 'XX')",
+                     [(f"Station {i}", f"City {i}") for i in range(locations)])
+    conn.executemany("INSERT INTO pollution_records (location_id, aqi, pm25) VALUES (?, ?, ?)",
+                     [(i + 1, 50 + i % 200, 20.0 + i % 80) for i in range(locations)])
+    conn.commit()
+    conn.close()
+
+
+async def drive(base_url, concurrency, seconds):
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def client_loop(client):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            response = await client.get("/pollution/latest")
+            response.raise_for_status()
+            done += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        return done / (time.perf_counter() - started)
+
+
+def measure(cwd, env, workers, concurrency, seconds):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(600):
+            try:
+                if httpx.get(f"{base_url}/api/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        # Let every worker finish its lifespan before measuring
+        time.sleep(1 + workers * 0.5)
+        return asyncio.run(drive(base_url, concurrency, seconds))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--locations", type=int, default=50)
+    args = parser.parse_args()
+
+    cwd, env = bench_env()
+    seed(env["DB_PATH"], args.locations)
+
+    single = measure(cwd, env, 1, args.concurrency, args.seconds)
+    multi = measure(cwd, env, args.workers, args.concurrency, args.seconds)
+    print(json.dumps({
+        "benchmark": "workers",
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "single_worker_rps": round(single, 1),
+        "multi_worker_rps": round(multi, 1),
+        "scaling": round(multi / single, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 const API_BASE = "http://127.0.0.1:8000"; // Change if deployed
 
 let currentSelectedLocation = null;
+let readingStream = null;
 
 // ===============================
 // INITIALIZE
@@ -132,37 +133,65 @@ async function loadDashboard(locationId) {
     if (!locationId) return;
 
     currentSelectedLocation = locationId;
+    subscribeReadings(locationId);
+
+    const adviceBox = document.getElementById('ai-advice-content');
+    const analysisBox = document.getElementById('genai-analysis-text');
+
+    adviceBox.innerHTML =
+        '<i data-lucide="loader" class="animate-spin" size="16"></i> AI is analyzing...';
+    analysisBox.textContent = "Analyzing trends...";
+    lucide.createIcons();
 
     try {
-        // 1️⃣ Pollution
-        const resp = await fetch(`${API_BASE}/pollution/?location_id=${locationId}`);
-        const records = await resp.json();
+        // Latest reading, weather prediction and AI insights in one request
+        const resp = await fetch(`${API_BASE}/ai/dashboard/${locationId}`);
 
-        if (records.length === 0) {
+        if (resp.status === 404) {
             resetDashboardView();
             return;
         }
+        if (!resp.ok) throw new Error("Failed to load dashboard");
 
-        const latest = records[0];
-        updateStatsView(latest);
-
-        // 2️⃣ Weather Prediction (Single Call)
-        const weatherResp = await fetch(`${API_BASE}/ai/predict_weather/${locationId}`, {
-            method: 'POST'
-        });
+        const data = await resp.json();
 
-        const weather = await weatherResp.json();
-        updateWeatherView(weather);
+        updateStatsView(data.latest);
+        updateWeatherView(data.weather);
 
-        // 3️⃣ AI Analysis + Advice
-        fetchAIInsights(locationId);
+        analysisBox.textContent =
+            data.analysis.length > 150 ? data.analysis.substring(0, 150) + "..." : data.analysis;
+        adviceBox.innerHTML =
+            data.advice.replace(/\n/g, '<br>');
 
     } catch (e) {
         console.error("Dashboard load error:", e);
+        adviceBox.textContent =
+            "AI services unavailable. Check Gemini API key.";
+        analysisBox.textContent =
+            "AI analysis currently unavailable.";
     }
 }
 
 
+// ===============================
+// LIVE READINGS
+// ===============================
+// New readings for the selected location are pushed by the server
+// (/pollution/stream), so the stats panel updates without polling.
+function subscribeReadings(locationId) {
+    if (readingStream) readingStream.close();
+
+    readingStream = new EventSource(`${API_BASE}/pollution/stream?location_id=${locationId}`);
+    readingStream.onmessage = (event) => {
+        const record = JSON.parse(event.data);
+        if (String(record.location_id) === String(currentSelectedLocation)) {
+            updateStatsView(record);
+        }
+    };
+    // EventSource reconnects on its own after network errors
+}
+
+
 // ===============================
 // UPDATE UI
 // ===============================
@@ -203,25 +232,57 @@ async function fetchAIInsights(locationId) {
     analysisBox.textContent = "Analyzing trends...";
     lucide.createIcons();
 
-    try {
-        const analysisResp = await fetch(`${API_BASE}/ai/analyze/${locationId}`);
-        const analysisData = await analysisResp.json();
+    // Both panels stream in parallel and fill in as text arrives
+    await Promise.all([
+        streamAIText(
+            `${API_BASE}/ai/analyze/${locationId}?stream=true`,
+            (text) => {
+                analysisBox.textContent =
+                    text.length > 150 ? text.substring(0, 150) + "..." : text;
+            },
+            () => {
+                analysisBox.textContent =
+                    "AI analysis currently unavailable.";
+            }
+        ),
+        streamAIText(
+            `${API_BASE}/ai/advice/${locationId}?stream=true`,
+            (text) => {
+                adviceBox.innerHTML =
+                    text.replace(/\n/g, '<br>');
+            },
+            () => {
+                adviceBox.textContent =
+                    "AI services unavailable. Check Gemini API key.";
+            }
+        )
+    ]);
+}
 
-        analysisBox.textContent =
-            analysisData.analysis.substring(0, 150) + "...";
 
-        const adviceResp = await fetch(`${API_BASE}/ai/advice/${locationId}`);
-        const adviceData = await adviceResp.json();
+// Consume a Server-Sent Events stream of text chunks from /ai/*?stream=true.
+// Calls onText with the full text received so far; resolves when done.
+function streamAIText(url, onText, onError) {
+    return new Promise((resolve) => {
+        const source = new EventSource(url);
+        let text = "";
 
-        adviceBox.innerHTML =
-            adviceData.advice.replace(/\n/g, '<br>');
+        source.onmessage = (event) => {
+            text += JSON.parse(event.data);
+            onText(text);
+        };
 
-    } catch (e) {
-        adviceBox.textContent =
-            "AI services unavailable. Check Gemini API key.";
-        analysisBox.textContent =
-            "AI analysis currently unavailable.";
-    }
+        source.addEventListener('done', () => {
+            source.close();
+            resolve(text);
+        });
+
+        source.onerror = () => {
+            source.close();
+            if (!text) onError();
+            resolve(text);
+        };
+    });
 }
 
 
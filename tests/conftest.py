@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before any app module is imported,
+# so tests never touch data/pollution_monitor.db or app.log
+_directory = tempfile.mkdtemp(prefix="pollution_tests_")
+os.environ.setdefault("DB_PATH", os.path.join(_directory, "test.db"))
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(_directory, "archive"))
+os.environ.setdefault("LOG_FILE", "")
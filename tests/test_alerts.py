@@ -0,0 +1,91 @@
+"""Alert evaluation across worker processes sharing one database."""
+import asyncio
+
+import pytest
+
+from app.db import database, init_db
+from app.services.alert_service import AlertEngine, QueueSink
+from app.services.leader import LeaderElection
+
+INSERT_READING = "INSERT INTO pollution_records (location_id, aqi) VALUES (?, ?) RETURNING *"
+
+
+class Worker:
+    """One worker's alert engine and leader election; `ingest` is its insert path."""
+
+    def __init__(self, lock_path, location_id):
+        self.location_id = location_id
+        self.engine = AlertEngine(sync_interval=0, poll_interval=3600)
+        self.sink = QueueSink()
+        self.engine.register_sink("queue", self.sink)
+        self.election = LeaderElection(lock_path, retry_interval=3600)
+
+    async def ingest(self, aqi):
+        async with database.pool.writer() as db:
+            async with db.execute(INSERT_READING, (self.location_id, aqi)) as cursor:
+                rows = await cursor.fetchall()
+        self.engine.publish(rows)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated():
+    init_db.init_db()
+
+
+def drain(sink):
+    alerts = []
+    while not sink.queue.empty():
+        alerts.append(sink.queue.get_nowait())
+    return alerts
+
+
+def test_two_workers_raise_each_alert_once(tmp_path):
+    async def scenario():
+        await database.pool.open()
+        location = await database.execute_query(
+            "INSERT INTO locations (name, city, country, latitude, longitude) VALUES ('Alert Town', 'Alert Town', 'XX', 1, 2)"
+        )
+        rule_id = await database.execute_query(
+            "INSERT INTO alert_rules (name, location_id, metric, condition, threshold, clear_threshold, "
+            "window_size, cooldown_seconds, sink) VALUES ('high aqi', ?, 'aqi', 'above', 100, 50, 2, 3600, 'queue')",
+            (location,)
+        )
+        workers = [Worker(str(tmp_path / "leader.lock"), location) for _ in range(2)]
+        for worker in workers:
+            worker.election.start(worker.engine)
+        leader, follower = workers if workers[0].election.is_leader else workers[::-1]
+        assert not follower.election.is_leader
+        await leader.engine.run_once()
+
+        try:
+            # A window of two spans both workers' readings: neither worker
+            # alone ever sees two high readings in a row
+            await leader.ingest(150)
+            await follower.ingest(150)
+            await leader.ingest(140)
+            await leader.engine.run_once()
+            # Resolves, then fires again within the cooldown: recorded, not sent
+            await follower.ingest(10)
+            await follower.ingest(10)
+            await leader.ingest(200)
+            await follower.ingest(200)
+            await leader.engine.run_once()
+
+            alerts = drain(leader.sink)
+            assert [(alert["rule_id"], alert["state"]) for alert in alerts] == [
+                (rule_id, "firing"), (rule_id, "resolved"),
+            ]
+            assert drain(follower.sink) == []
+            stats = leader.engine.stats()
+            assert stats["fired"] == 2 and stats["suppressed"] == 1
+            assert follower.engine.stats()["readings_evaluated"] == 0
+
+            # Either worker answers /alerts/recent from the shared history
+            recent = await follower.engine.recent(10)
+            assert [alert["state"] for alert in recent] == ["resolved", "firing"]
+        finally:
+            for worker in workers:
+                await worker.election.stop()
+            await database.pool.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+"""Keyset pages read back from the Parquet archive."""
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.dataset
+
+from app.services.archive_service import RECORD_FIELDS, ArchiveService
+
+PAGE = 500
+# Three months for two locations, 1,800 rows: several pages, each page
+# boundary inside a month
+MONTHS = ("2024-01", "2024-02", "2024-03")
+PER_MONTH = 300
+
+
+def record(record_id, location_id, timestamp):
+    return (record_id, location_id, 50, 10.0, 20.0, 0.3, 12.0, 18.5, 60.0, timestamp)
+
+
+@pytest.fixture(scope="module")
+def archive(tmp_path_factory):
+    service = ArchiveService(root=str(tmp_path_factory.mktemp("archive")))
+    records = []
+    for month in MONTHS:
+        for i in range(PER_MONTH):
+            # Pairs of rows share a timestamp so ties are broken by id
+            timestamp = f"{month}-{1 + i // 12:02d} {(i // 2) % 6:02d}:00:00"
+            for location_id in (1, 2):
+                records.append(record(len(records) + 1, location_id, timestamp))
+    # Written in two batches, as two archive runs would
+    service._write_batch(records[:len(records) // 2])
+    service._write_batch(records[len(records) // 2:])
+    return service, [dict(zip(RECORD_FIELDS, row)) for row in records]
+
+
+def newest_first(rows):
+    return sorted(rows, key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+
+
+def page_through(service, location_id=None, since=None, until=None):
+    pages, after = [], None
+    while True:
+        rows = service._read(location_id, since, until, after, PAGE)
+        pages.append(rows)
+        if len(rows) < PAGE:
+            return pages
+        after = (rows[-1]["timestamp"], rows[-1]["id"])
+
+
+@pytest.mark.parametrize("location_id", [None, 1])
+def test_pages_cover_the_archive_in_order(archive, location_id):
+    service, records = archive
+    expected = newest_first(row for row in records if location_id in (None, row["location_id"]))
+
+    pages = page_through(service, location_id)
+
+    assert len(pages) > 1
+    assert [row for page in pages for row in page] == expected
+
+
+def test_range_bounds_apply_across_months(archive):
+    service, records = archive
+    since, until = "2024-01-20 00:00:00", "2024-02-10 00:00:00"
+    expected = newest_first(row for row in records if since <= row["timestamp"] <= until)
+
+    pages = page_through(service, since=since, until=until)
+
+    assert [row for page in pages for row in page] == expected
+
+
+def test_a_page_only_scans_the_months_it_reaches(archive, monkeypatch):
+    service, records = archive
+    scanned = []
+    dataset = pyarrow.dataset.dataset
+
+    def counting_dataset(source, *args, **kwargs):
+        scanned.append(source)
+        return dataset(source, *args, **kwargs)
+
+    monkeypatch.setattr(pyarrow.dataset, "dataset", counting_dataset)
+
+    rows = service._read(None, None, None, None, PAGE)
+    assert len(rows) == PAGE and len(scanned) == 1
+
+    # A cursor in February never opens March
+    scanned.clear()
+    service._read(None, None, None, ("2024-02-15 00:00:00", 10 ** 9), PAGE)
+    assert all("month=2024-03" not in path for source in scanned for path in source)
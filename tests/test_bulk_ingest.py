@@ -0,0 +1,97 @@
+"""POST /pollution/bulk limits and validation."""
+import asyncio
+import json
+import sqlite3
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import pollution
+from app.db import database, init_db
+from app.services import ingest_service as ingest_module
+from app.services.location_registry import location_registry
+from app.services.resource_versions import resource_versions
+
+NDJSON = {"content-type": "application/x-ndjson"}
+
+
+@pytest.fixture(scope="module")
+def location_id():
+    init_db.init_db()
+    conn = sqlite3.connect(database.DB_PATH)
+    location_id = conn.execute(
+        "INSERT INTO locations (name, city, country, latitude, longitude) VALUES ('Bulk', 'Bulk', 'XX', 5, 6)"
+    ).lastrowid
+    conn.commit()
+    conn.close()
+    return location_id
+
+
+def post(content, headers=None):
+    app = FastAPI()
+    app.include_router(pollution.router)
+
+    async def send():
+        await database.pool.open()
+        await resource_versions.load()
+        location_registry.invalidate()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/pollution/bulk", content=content, headers=headers or {})
+        finally:
+            await database.pool.close()
+
+    return asyncio.run(send())
+
+
+def lines(location_id, count):
+    return "".join(json.dumps({"location_id": location_id, "aqi": 40 + i}) + "\n" for i in range(count))
+
+
+def test_ndjson_is_ingested_line_by_line(location_id):
+    body = lines(location_id, 3) + "not json\n" + json.dumps({"location_id": location_id, "aqi": 1})
+
+    response = post(body.encode(), NDJSON)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 4
+    assert [error["index"] for error in result["errors"]] == [3]
+
+
+def test_ndjson_over_the_row_limit_is_refused(location_id, monkeypatch):
+    monkeypatch.setattr(pollution, "MAX_BULK_ROWS", 5)
+
+    response = post(lines(location_id, 6).encode(), NDJSON)
+
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("headers", [NDJSON, {"content-type": "application/json"}])
+def test_body_over_the_byte_limit_is_refused(location_id, monkeypatch, headers):
+    monkeypatch.setattr(pollution, "MAX_BULK_BYTES", 200)
+    body = lines(location_id, 20).encode()
+
+    # Declared length, then chunked with no Content-Length
+    assert post(body, headers).status_code == 413
+
+    async def chunks():
+        for start in range(0, len(body), 64):
+            yield body[start:start + 64]
+
+    assert post(chunks(), headers).status_code == 413
+
+
+def test_unknown_ids_are_looked_up_in_chunks(location_id, monkeypatch):
+    monkeypatch.setattr(ingest_module, "LOOKUP_CHUNK_SIZE", 7)
+    unknown = list(range(10 ** 6, 10 ** 6 + 20))
+    items = [{"location_id": value, "aqi": 10} for value in [*unknown, location_id]]
+
+    response = post(json.dumps(items).encode(), {"content-type": "application/json"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 1
+    assert [error["index"] for error in result["errors"]] == list(range(len(unknown)))
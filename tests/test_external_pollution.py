@@ -0,0 +1,152 @@
+"""WAQI client behaviour against an in-process stub (httpx.MockTransport)."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import external_pollution
+from app.services.external_pollution import ExternalPollutionService
+
+FEED = {
+    "status": "ok",
+    "data": {
+        "aqi": 42,
+        "iaqi": {"pm25": {"v": 12.0}, "t": {"v": 21.5}, "h": {"v": 60}},
+        "city": {"name": "Paris", "geo": [48.85, 2.35]},
+        "time": {"iso": "2026-01-01T12:00:00+01:00"},
+    },
+}
+
+
+class Upstream:
+    """Stub WAQI server: answers with `responses` in turn (the last one repeats) and counts calls."""
+
+    def __init__(self, *responses, delay: float = 0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.url.path)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        response = self.responses[min(len(self.calls), len(self.responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def service(upstream: Upstream, cache_ttl: float = 900) -> ExternalPollutionService:
+    client = ExternalPollutionService(base_url="http://waqi.test", token="test-token", cache_ttl=cache_ttl)
+    # start() keeps an injected client
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    return client
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(external_pollution, "WAQI_BACKOFF_BASE", 0)
+
+
+def ok():
+    return httpx.Response(200, json=FEED)
+
+
+def test_retries_server_errors_then_succeeds():
+    upstream = Upstream(httpx.Response(503), httpx.Response(502), ok())
+    client = service(upstream)
+
+    result = asyncio.run(client.fetch_pollution_by_city("Paris"))
+
+    assert result["aqi"] == 42 and result["city"] == "Paris"
+    assert len(upstream.calls) == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_retries_timeouts_and_rate_limits():
+    upstream = Upstream(httpx.ReadTimeout("timed out"), httpx.Response(429), ok())
+    client = service(upstream)
+
+    result = asyncio.run(client.fetch_real_time_pollution(48.85, 2.35))
+
+    assert result["aqi"] == 42
+    assert len(upstream.calls) == 3
+
+
+def test_gives_up_after_max_retries():
+    upstream = Upstream(httpx.Response(500))
+    client = service(upstream)
+
+    result = asyncio.run(client.fetch_pollution_by_city("Paris"))
+
+    assert result == {"error": "API Error: HTTP 500"}
+    assert len(upstream.calls) == external_pollution.WAQI_MAX_RETRIES + 1
+    # Failures are not cached
+    asyncio.run(client.fetch_pollution_by_city("Paris"))
+    assert len(upstream.calls) == 2 * (external_pollution.WAQI_MAX_RETRIES + 1)
+
+
+def test_client_errors_are_not_retried():
+    upstream = Upstream(httpx.Response(404, json={"status": "error", "data": "Unknown station"}))
+    client = service(upstream)
+
+    result = asyncio.run(client.fetch_pollution_by_city("Nowhere"))
+
+    assert result == {"error": "API Error: Unknown station"}
+    assert len(upstream.calls) == 1
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    upstream = Upstream(ok(), delay=0.05)
+    client = service(upstream)
+
+    async def fetch_all():
+        # Same city in different spellings maps to one cache key
+        names = ["Paris", "paris", " PARIS ", "Paris", "paris"]
+        return await asyncio.gather(*(client.fetch_pollution_by_city(name) for name in names))
+
+    results = asyncio.run(fetch_all())
+
+    assert len(upstream.calls) == 1
+    assert all(result["aqi"] == 42 for result in results)
+    assert client.stats()["coalesced"] == 4
+    # Each caller gets its own copy
+    results[0]["aqi"] = 0
+    assert results[1]["aqi"] == 42
+
+
+def test_cache_hit_then_expiry():
+    upstream = Upstream(ok())
+    client = service(upstream, cache_ttl=0.2)
+
+    async def scenario():
+        first = await client.fetch_pollution_by_city("Paris")
+        second = await client.fetch_pollution_by_city("Paris")
+        calls_while_fresh = len(upstream.calls)
+        await asyncio.sleep(0.25)
+        await client.fetch_pollution_by_city("Paris")
+        return first, second, calls_while_fresh
+
+    first, second, calls_while_fresh = asyncio.run(scenario())
+
+    assert first == second
+    assert calls_while_fresh == 1
+    assert len(upstream.calls) == 2
+    assert client.stats()["cache_hits"] == 1
+
+
+def test_geo_lookups_request_the_rounded_point_they_are_cached_under():
+    upstream = Upstream(ok(), delay=0.05)
+    client = service(upstream)
+
+    async def fetch_all():
+        # Same ~100 m cell, whichever caller comes first
+        return await asyncio.gather(
+            client.fetch_real_time_pollution(48.85661, 2.35222),
+            client.fetch_real_time_pollution(48.85699, 2.35201),
+        )
+
+    asyncio.run(fetch_all())
+    asyncio.run(client.fetch_real_time_pollution(48.8568, 2.3521))
+
+    assert upstream.calls == ["/feed/geo:48.857;2.352/"]
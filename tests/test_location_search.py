@@ -0,0 +1,87 @@
+"""Location search and alias resolution over Latin and non-Latin names."""
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.api.locations import search_locations
+from app.db import database, init_db
+from app.services.location_registry import location_registry
+from app.services.resource_versions import resource_versions
+from app.utils.names import name_aliases, normalize_name
+
+LOCATIONS = [
+    ("São Paulo", "São Paulo", "Brazil", -23.55, -46.63),
+    ("北京", "北京", "China", 39.90, 116.41),
+    ("दिल्ली", "दिल्ली", "India", 28.61, 77.21),
+    ("Москва", "Москва", "Russia", 55.76, 37.62),
+]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("São Paulo, BR", "sao paulo br"),
+    ("  Hà Nội!! ", "ha noi"),
+    ("Anand Vihar, Delhi, India", "anand vihar delhi india"),
+    ("北京", "北京"),
+    ("दिल्ली", "दिल्ली"),
+    ("МОСКВА", "москва"),
+    ("Straße", "strasse"),
+    ("!!!", ""),
+])
+def test_normalize_name(value, expected):
+    assert normalize_name(value) == expected
+
+
+def test_non_latin_names_get_aliases():
+    assert name_aliases("北京, China") == {"北京 china", "北京"}
+
+
+@pytest.fixture(scope="module")
+def location_ids():
+    init_db.init_db()
+    conn = sqlite3.connect(database.DB_PATH)
+    ids = {}
+    for row in LOCATIONS:
+        cursor = conn.execute(
+            "INSERT INTO locations (name, city, country, latitude, longitude) VALUES (?, ?, ?, ?, ?)", row
+        )
+        ids[row[0]] = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def run(coroutine):
+    async def with_pool():
+        await database.pool.open()
+        await resource_versions.load()
+        location_registry.invalidate()
+        try:
+            return await coroutine
+        finally:
+            await database.pool.close()
+
+    return asyncio.run(with_pool())
+
+
+@pytest.mark.parametrize("q, name", [
+    ("sao", "São Paulo"),
+    ("São Paulo", "São Paulo"),
+    ("北京", "北京"),
+    ("दिल्ली", "दिल्ली"),
+    ("दिल", "दिल्ली"),
+    ("москва", "Москва"),
+])
+def test_search_matches_latin_and_non_latin_names(location_ids, q, name):
+    rows = run(search_locations(q=q, limit=20))
+
+    assert [row["id"] for row in rows] == [location_ids[name]]
+
+
+def test_search_without_words_finds_nothing(location_ids):
+    assert run(search_locations(q="!!!", limit=20)) == []
+
+
+@pytest.mark.parametrize("name", ["北京", "दिल्ली", "Москва"])
+def test_non_latin_names_resolve(location_ids, name):
+    assert run(location_registry.resolve(name)) == location_ids[name]
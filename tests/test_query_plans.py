@@ -0,0 +1,111 @@
+"""Every read query the routers and background jobs issue is answered from an index.
+
+The SQL comes from the routers' and services' own builders and constants,
+so a query that changes in app/ is checked as it now is. Plans are taken
+with EXPLAIN QUERY PLAN on a freshly migrated database.
+"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from app.api.ai import LATEST_FEATURES_QUERY, LATEST_STATE_QUERY, _batch_features_query
+from app.api.alerts import RULE_QUERY
+from app.api.locations import LOCATION_QUERY, SEARCH_QUERY, _by_ids_query
+from app.api.pollution import LATEST_QUERY, _history_page_query
+from app.db.init_db import migrate
+from app.services.alert_service import RULES_QUERY
+from app.services.archive_service import BATCH_QUERY
+from app.services.rollup_service import HIST_POINTS_QUERY, HIST_QUERY, POINTS_QUERY, ROLLUP_QUERY
+from app.services.weather_features import CONTEXT_QUERY, ROLLING_WINDOW
+from app.services.weather_trainer import NEW_ROWS_QUERY
+
+SINCE = datetime(2024, 1, 1)
+UNTIL = datetime(2024, 2, 1)
+AFTER = ("2024-01-15 00:00:00", 42)
+
+HISTORY_PAGES = {
+    "location": (7, None, None, None, 100),
+    "location range": (7, SINCE, UNTIL, None, 100),
+    "location range after cursor": (7, SINCE, UNTIL, AFTER, 100),
+    "location after cursor": (7, None, None, AFTER, 100),
+    "all locations": (None, None, None, None, 100),
+    "all locations since": (None, SINCE, None, None, 100),
+    "all locations until": (None, None, UNTIL, None, 100),
+    "all locations range after cursor": (None, SINCE, UNTIL, AFTER, 100),
+}
+
+INDEXED = {
+    **{f"GET /pollution/ ({name})": _history_page_query(*args) for name, args in HISTORY_PAGES.items()},
+    "GET /locations/{id}": (LOCATION_QUERY, (7,)),
+    "GET /locations/search": (SEARCH_QUERY, ('"lond"*', 20)),
+    "GET /locations/search (fuzzy fallback)": (_by_ids_query(3), (1, 2, 3)),
+    "GET /locations/nearest": (_by_ids_query(1), (1,)),
+    "POST /ai/predict_weather/{id}": (LATEST_FEATURES_QUERY, (7,)),
+    "POST /ai/predict_weather/batch (selected)": _batch_features_query([1, 2, 3]),
+    "AI location state": (LATEST_STATE_QUERY, (7,)),
+    "AI model context": (CONTEXT_QUERY.format(placeholders="?, ?"), (2 ** 62, ROLLING_WINDOW, 1, 2)),
+    "GET /pollution/aggregate": (POINTS_QUERY, (7, "hour", "2024-01-01 00:00:00", "2024-02-01 00:00:00")),
+    "GET /pollution/aggregate (AQI histogram)": (
+        HIST_POINTS_QUERY, (7, "hour", "2024-01-01 00:00:00", "2024-02-01 00:00:00")
+    ),
+    "GET /alerts/rules/{id}": (RULE_QUERY, (7,)),
+    "Archive batch": (BATCH_QUERY, ("2024-01-01 00:00:00", 5000)),
+    "Weather trainer new rows": (NEW_ROWS_QUERY, (1000, 5000)),
+}
+
+# Rollup folds read only the rows above the watermark; grouping that handful
+# of fresh rows is left to a temp b-tree
+ROLLUP_FOLDS = {
+    "Rollup fold": (ROLLUP_QUERY, ("hour", "%Y-%m-%d %H:00:00", 1000, 1100)),
+    "Rollup fold (AQI histogram)": (HIST_QUERY, ("hour", "%Y-%m-%d %H:00:00", 1000, 1100)),
+}
+
+# Endpoints that return one row per location by design: the locations-sized
+# table may be scanned, in rowid order, but anything joined must be searched
+FULL_LISTINGS = {
+    "GET /pollution/latest": (LATEST_QUERY, (), "l"),
+    "POST /ai/predict_weather/batch (all)": (*_batch_features_query(), "latest_readings"),
+    "GET /alerts/rules": (RULES_QUERY, (), "alert_rules"),
+}
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    conn = sqlite3.connect(tmp_path_factory.mktemp("plans") / "plans.db", isolation_level=None)
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def plan(conn, query, params):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def is_bare_scan(detail):
+    # "SCAN t USING [COVERING] INDEX ..." walks an index in order and an FTS
+    # match is "SCAN t VIRTUAL TABLE INDEX ..."; a bare "SCAN t" reads the table
+    return detail.startswith("SCAN") and "USING" not in detail and "VIRTUAL TABLE INDEX" not in detail
+
+
+@pytest.mark.parametrize("name", INDEXED)
+def test_query_uses_an_index(conn, name):
+    query, params = INDEXED[name]
+    details = plan(conn, query, params)
+    assert not [d for d in details if is_bare_scan(d) or "TEMP B-TREE" in d], details
+
+
+@pytest.mark.parametrize("name", FULL_LISTINGS)
+def test_full_listing_scans_only_its_table(conn, name):
+    query, params, table = FULL_LISTINGS[name]
+    details = plan(conn, query, params)
+    assert [d for d in details if is_bare_scan(d)] == [f"SCAN {table}"], details
+    assert not [d for d in details if "TEMP B-TREE" in d], details
+
+
+@pytest.mark.parametrize("name", ROLLUP_FOLDS)
+def test_rollup_fold_searches_new_rows_by_id(conn, name):
+    query, params = ROLLUP_FOLDS[name]
+    details = plan(conn, query, params)
+    assert not [d for d in details if is_bare_scan(d)], details
+    assert any("INTEGER PRIMARY KEY (rowid>? AND rowid<?)" in d for d in details), details
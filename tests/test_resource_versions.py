@@ -0,0 +1,52 @@
+"""Conditional GET validators from resource versions."""
+from datetime import datetime, timedelta, timezone
+
+from app.services.resource_versions import ResourceVersions
+
+
+def this_second():
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def stamp(moment):
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def ims(headers):
+    return {"if-modified-since": headers["Last-Modified"]}
+
+
+def test_second_write_in_the_same_second_is_never_not_modified():
+    versions = ResourceVersions(sync_interval=1)
+    now = this_second()
+    versions.applied("pollution", (5, stamp(now)))
+    first = versions.headers("pollution")
+    # The second can still take more writes: validate by ETag only
+    assert "Last-Modified" not in first
+
+    versions.applied("pollution", (6, stamp(now)))
+    second = versions.headers("pollution")
+    assert first["ETag"] != second["ETag"]
+    assert not versions.is_fresh({"if-none-match": first["ETag"]}, second)
+    assert not versions.is_fresh({"if-modified-since": now.strftime("%a, %d %b %Y %H:%M:%S GMT")}, second)
+
+
+def test_if_modified_since_once_the_second_is_over():
+    versions = ResourceVersions(sync_interval=1)
+    written = this_second() - timedelta(seconds=10)
+    versions.applied("pollution", (5, stamp(written)))
+    headers = versions.headers("pollution")
+
+    assert versions.is_fresh(ims(headers), headers)
+    # Any later write lands in a later second
+    versions.applied("pollution", (6, stamp(this_second())))
+    assert not versions.is_fresh(ims(headers), versions.headers("pollution"))
+
+
+def test_last_modified_waits_a_sync_interval_for_other_workers():
+    versions = ResourceVersions(sync_interval=5)
+    versions.applied("pollution", (5, stamp(this_second() - timedelta(seconds=3))))
+    assert "Last-Modified" not in versions.headers("pollution")
+
+    versions.applied("pollution", (6, stamp(this_second() - timedelta(seconds=7))))
+    assert "Last-Modified" in versions.headers("pollution")
@@ -0,0 +1,52 @@
+"""Incremental weather model training."""
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+from app.db import database, init_db
+from app.services import weather_trainer
+from app.services.weather_trainer import WeatherTrainer
+
+
+def add_readings(count):
+    conn = sqlite3.connect(database.DB_PATH)
+    location_id = conn.execute(
+        "INSERT INTO locations (name, city, country, latitude, longitude) VALUES ('Trainer', 'Trainer', 'XX', 3, 4)"
+    ).lastrowid
+    start = datetime(2024, 6, 1)
+    conn.executemany(
+        "INSERT INTO pollution_records (location_id, aqi, pm25, temperature, humidity, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(location_id, 40 + i % 30, 10.0 + i % 7, 15.0 + i % 10, 50.0 + i % 20,
+          (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S")) for i in range(count)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_empty_holdout_advances_without_a_candidate(monkeypatch):
+    # MIN_HOLDOUT_ROWS=0 is clamped at import; force the unclamped case anyway
+    monkeypatch.setattr(weather_trainer, "MIN_HOLDOUT_ROWS", 0)
+    monkeypatch.setattr(weather_trainer, "MIN_TRAIN_ROWS", 10)
+    monkeypatch.setattr(weather_trainer, "HOLDOUT_EVERY", 10 ** 12)
+    init_db.init_db()
+    add_readings(60)
+    trainer = WeatherTrainer(interval=0, sync_interval=0)
+
+    async def train():
+        await database.pool.open()
+        try:
+            version = await trainer.run_once()
+            state = await database.fetch_one(
+                "SELECT last_record_id FROM weather_training_state WHERE name = 'weather'"
+            )
+            newest = await database.fetch_one("SELECT MAX(id) AS id FROM pollution_records")
+            return version, state['last_record_id'], newest['id']
+        finally:
+            await database.pool.close()
+
+    version, trained_through, newest = asyncio.run(train())
+
+    assert version is None
+    assert trained_through == newest
+    assert trainer.stats()["last_candidate_rmse"] is None